@@ -0,0 +1,312 @@
+# app/backends.py
+
+"""
+Pluggable inference backends.
+
+Every backend is a Detector: frames go through the shared LetterboxBatcher,
+the backend runs the NCHW batch, and boxes come back in source-frame
+coordinates as (xyxy, conf, cls) arrays per frame.
+
+  - torch:    the ultralytics/PyTorch model (CUDA when available)
+  - onnx:     ONNX Runtime on CPU
+  - openvino: OpenVINO on CPU
+
+ONNX/OpenVINO models are exported once per .pt file and cached under
+MODEL_CACHE_DIR, keyed by the file's SHA-256 (plus image size and INT8
+calibration set). INT8 static quantization uses the frames found in a
+calibration folder.
+"""
+
+import os
+import glob
+import shutil
+import hashlib
+import logging
+import importlib.util
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+import torch
+
+from app.metrics import MODEL_SECONDS
+from app.preprocess import LetterboxBatcher
+
+BACKENDS     = ("torch", "onnx", "openvino")
+CONF_THRES   = 0.25     # mesmos defaults do ultralytics
+IOU_THRES    = 0.7
+MAX_DET      = 300
+MAX_WH       = 7680     # deslocamento por classe no NMS
+CALIB_MAX    = 300      # frames usados na calibração INT8
+CALIB_EXTS   = (".jpg", ".jpeg", ".png", ".bmp")
+
+Detections = tuple[np.ndarray, np.ndarray, np.ndarray]     # xyxy (K,4) int, conf (K,), cls (K,)
+
+# ------------------------------------------------------------------
+# Detector base
+# ------------------------------------------------------------------
+class Detector:
+    backend = ""
+
+    def __init__(self, path: str, imgsz: int, max_batch: int, device: str = "cpu", half: bool = False):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]     # rótulo nas métricas
+        self.imgsz = imgsz
+        self.letterbox = LetterboxBatcher(imgsz, max_batch, device, half)
+        # o LetterboxBatcher reaproveita um único tensor de entrada: uma chamada por vez
+        # (scheduler ao vivo, warmup, batch no próprio processo, cascata de várias câmeras)
+        self._lock = threading.Lock()
+
+    def _forward(self, batch: torch.Tensor) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Returns per-image (xyxy, conf, cls) in letterbox coordinates."""
+        raise NotImplementedError
+
+    def detect(self, frames_bgr: list[np.ndarray]) -> list[Detections]:
+        if not frames_bgr:
+            return []
+        with self._lock:
+            with MODEL_SECONDS.time(self.name, "preprocess"):
+                batch, metas = self.letterbox(frames_bgr)
+            with MODEL_SECONDS.time(self.name, "infer"):
+                raw = self._forward(batch)
+        with MODEL_SECONDS.time(self.name, "postprocess"):
+            return [(meta.to_source(xyxy), conf, cls) for (xyxy, conf, cls), meta in zip(raw, metas)]
+
+    def nbytes(self) -> int:
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+class TorchDetector(Detector):
+    backend = "torch"
+
+    def __init__(self, model, path: str, imgsz: int, max_batch: int, device: str, half: bool):
+        super().__init__(path, imgsz, max_batch, device, half)
+        self.model = model      # ultralytics.YOLO
+        self.device = device
+        self.half = half
+
+    @torch.inference_mode()
+    def _forward(self, batch):
+        preds = self.model.predict(batch, device=self.device, imgsz=self.imgsz, half=self.half, verbose=False)
+        out = []
+        for r in preds:
+            b = r.boxes
+            out.append((b.xyxy.cpu().numpy(), b.conf.cpu().numpy(), b.cls.cpu().numpy().astype(np.int32)))
+        return out
+
+    def nbytes(self) -> int:
+        module = self.model.model
+        return sum(t.numel() * t.element_size() for t in (*module.parameters(), *module.buffers()))
+
+def decode_yolo(raw: np.ndarray, conf_thres: float = CONF_THRES, iou_thres: float = IOU_THRES,
+                max_det: int = MAX_DET) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Raw YOLOv8 head output (N, 4 + nc, anchors), xywh in input pixels, to
+    per-image (xyxy, conf, cls) after class-aware NMS.
+    """
+    out = []
+    for p in raw:
+        scores = p[4:]                                  # (nc, A)
+        cls = scores.argmax(0)
+        conf = scores[cls, np.arange(scores.shape[1])]
+        keep = conf > conf_thres
+        if not keep.any():
+            out.append((np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32)))
+            continue
+        xywh, conf, cls = p[:4, keep].T, conf[keep], cls[keep]
+        # caixas deslocadas por classe => um único NMS faz a supressão por classe
+        shifted = xywh.copy()
+        shifted[:, :2] -= shifted[:, 2:] / 2
+        shifted[:, :2] += cls[:, None] * MAX_WH
+        idx = cv2.dnn.NMSBoxes(shifted.tolist(), conf.tolist(), conf_thres, iou_thres)
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)[:max_det]
+        xyxy = np.empty((len(idx), 4), np.float32)
+        xyxy[:, :2] = xywh[idx, :2] - xywh[idx, 2:] / 2
+        xyxy[:, 2:] = xywh[idx, :2] + xywh[idx, 2:] / 2
+        out.append((xyxy, conf[idx].astype(np.float32), cls[idx].astype(np.int32)))
+    return out
+
+class OnnxDetector(Detector):
+    backend = "onnx"
+
+    def __init__(self, onnx_path: str, imgsz: int, max_batch: int, intra_threads: int, inter_threads: int):
+        import onnxruntime as ort
+
+        super().__init__(onnx_path, imgsz, max_batch)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_threads:
+            opts.intra_op_num_threads = intra_threads
+        if inter_threads:
+            opts.inter_op_num_threads = inter_threads
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _forward(self, batch):
+        raw = self.session.run(None, {self.input_name: batch.numpy()})[0]
+        return decode_yolo(raw)
+
+class OpenVinoDetector(Detector):
+    backend = "openvino"
+
+    def __init__(self, xml_path: str, imgsz: int, max_batch: int, intra_threads: int, inter_threads: int):
+        import openvino as ov
+
+        super().__init__(xml_path, imgsz, max_batch)
+        config = {"PERFORMANCE_HINT": "THROUGHPUT" if max_batch > 1 else "LATENCY"}
+        if intra_threads:
+            config["INFERENCE_NUM_THREADS"] = intra_threads
+        if inter_threads:
+            config["NUM_STREAMS"] = inter_threads
+        self.compiled = ov.Core().compile_model(xml_path, "CPU", config)
+        self.request = self.compiled.create_infer_request()
+
+    def _forward(self, batch):
+        raw = self.request.infer({0: batch.numpy()})[self.compiled.output(0)]
+        return decode_yolo(raw)
+
+    def nbytes(self) -> int:
+        bin_path = os.path.splitext(self.path)[0] + ".bin"
+        return super().nbytes() + (os.path.getsize(bin_path) if os.path.isfile(bin_path) else 0)
+
+# ------------------------------------------------------------------
+# Exportação + cache
+# ------------------------------------------------------------------
+def file_sha256(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def calibration_files(calib_dir: str) -> list[str]:
+    files = sorted(
+        p for p in glob.glob(os.path.join(calib_dir, "**", "*"), recursive=True)
+        if p.lower().endswith(CALIB_EXTS)
+    )
+    return files[:CALIB_MAX]
+
+def _calib_key(files: list[str]) -> str:
+    h = hashlib.sha256()
+    for p in files:
+        h.update(f"{os.path.basename(p)}:{os.path.getsize(p)}".encode())
+    return h.hexdigest()[:8]
+
+def _calibration_batches(files: list[str], imgsz: int):
+    lb = LetterboxBatcher(imgsz, 1)
+    for p in files:
+        img = cv2.imread(p)
+        if img is None:
+            continue
+        batch, _ = lb([img])
+        yield batch.numpy().copy()
+
+def cache_dir_for(pt_path: str, fmt: str, imgsz: int, cache_root: str, calib_files: Optional[list[str]]) -> str:
+    key = f"{file_sha256(pt_path)[:16]}-{fmt}-{imgsz}"
+    if calib_files:
+        key += f"-int8-{_calib_key(calib_files)}"
+    return os.path.join(cache_root, key)
+
+def _export(pt_path: str, fmt: str, imgsz: int, dest_dir: str) -> str:
+    """Exports with ultralytics and moves the artifact into `dest_dir`; returns the model file."""
+    from ultralytics import YOLO
+
+    exported = YOLO(pt_path).export(format=fmt, imgsz=imgsz, dynamic=True, half=False, verbose=False)
+    os.makedirs(dest_dir, exist_ok=True)
+    if fmt == "onnx":
+        target = os.path.join(dest_dir, "model.onnx")
+        shutil.move(exported, target)
+        return target
+    target = os.path.join(dest_dir, "openvino")
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.move(exported.rstrip("/\\"), target)
+    return glob.glob(os.path.join(target, "*.xml"))[0]
+
+def _quantize_onnx(fp32_path: str, int8_path: str, files: list[str], imgsz: int):
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static,
+    )
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            import onnxruntime as ort
+            name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            self._it = ({name: b} for b in _calibration_batches(files, imgsz))
+
+        def get_next(self):
+            return next(self._it, None)
+
+    quantize_static(
+        fp32_path, int8_path, _Reader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+def _quantize_openvino(xml_path: str, int8_xml: str, files: list[str], imgsz: int):
+    import nncf
+    import openvino as ov
+
+    model = ov.Core().read_model(xml_path)
+    dataset = nncf.Dataset(list(_calibration_batches(files, imgsz)))
+    quantized = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED, subset_size=len(files))
+    ov.save_model(quantized, int8_xml)
+
+def export_cached(pt_path: str, fmt: str, imgsz: int, cache_root: str, calib_dir: str = "") -> str:
+    """Path of the exported (and optionally INT8) model, exporting only on cache miss."""
+    files = calibration_files(calib_dir) if calib_dir else []
+    if calib_dir and not files:
+        logging.warning("Pasta de calibração %s vazia; usando FP32", calib_dir)
+    if files and fmt == "openvino" and importlib.util.find_spec("nncf") is None:
+        # decidido antes da chave do cache: o FP32 fica em cache em vez de reexportar a cada início
+        logging.warning("INT8 no OpenVINO requer o pacote nncf (pip install nncf); usando FP32")
+        files = []
+    dest = cache_dir_for(pt_path, fmt, imgsz, cache_root, files)
+    suffix = ".onnx" if fmt == "onnx" else ".xml"
+    final = os.path.join(dest, ("model.int8" if files else "model") + suffix)
+    if os.path.exists(final):
+        return final
+
+    logging.info("Exportando %s para %s (cache %s)", os.path.basename(pt_path), fmt, dest)
+    fp32 = _export(pt_path, fmt, imgsz, dest)
+    if not files:
+        if fp32 != final:
+            os.replace(fp32, final)
+            if fmt == "openvino":
+                os.replace(os.path.splitext(fp32)[0] + ".bin", os.path.splitext(final)[0] + ".bin")
+        return final
+
+    logging.info("Quantizando INT8 com %d frames de %s", len(files), calib_dir)
+    if fmt == "onnx":
+        _quantize_onnx(fp32, final, files, imgsz)
+    else:
+        _quantize_openvino(fp32, final, files, imgsz)
+    return final
+
+# ------------------------------------------------------------------
+# Fábrica
+# ------------------------------------------------------------------
+def configure_threads(intra: int, inter: int):
+    """Torch thread pools; ONNX Runtime/OpenVINO take theirs per session."""
+    if intra:
+        torch.set_num_threads(intra)
+    if inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:    # só pode ser definido antes do 1º trabalho paralelo
+            logging.warning("torch inter-op threads já inicializadas; mantendo %d", torch.get_num_interop_threads())
+
+def load_detector(pt_path: str, backend: str, *, imgsz: int, max_batch: int, device: str, half: bool,
+                  cache_root: str, calib_dir: str = "", intra_threads: int = 0,
+                  inter_threads: int = 0, torch_loader=None) -> Detector:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "torch":
+        return TorchDetector(torch_loader(pt_path), pt_path, imgsz, max_batch, device, half)
+    path = export_cached(pt_path, backend, imgsz, cache_root, calib_dir)
+    cls = OnnxDetector if backend == "onnx" else OpenVinoDetector
+    det = cls(path, imgsz, max_batch, intra_threads, inter_threads)
+    det.name = os.path.splitext(os.path.basename(pt_path))[0]     # o arquivo exportado tem nome genérico
+    return det
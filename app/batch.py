@@ -0,0 +1,421 @@
+# app/batch.py
+
+"""
+Offline analysis of recorded footage.
+
+Runs MODEL1 over video files as fast as decode + inference allow (no
+real-time pacing): files are spread over worker processes, and each worker
+feeds every INFER_EVERY-th frame of its file to the detector in batches of
+BATCH_SIZE. Detections go through the same object tracker and per-track
+severity as the live loop, on the frames' media timestamps, and an incident
+is recorded whenever a level is raised, with the same cooldown and tracker
+reset as the live alert path.
+
+Each source produces one timeline next to the others in `out_dir`
+(mirroring the input directory layout), either JSONL or Parquet (needs
+`pyarrow`), with one row per tracked detection and per incident. A
+`<timeline>.done.json` sidecar holds the run summary and the key the result
+depends on (source size/mtime, MODEL1 hash, inference backend, options);
+files whose sidecar matches are skipped, so an interrupted run resumes
+where it stopped and a model update re-scores everything.
+
+    python -m app.batch /footage/2024-05 --out batch_output --workers 4
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import importlib.util
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional
+
+from app.capture import CAPTURE_BACKEND, CAPTURE_BACKENDS, make_capture
+
+BATCH_OUTPUT_DIR        = os.getenv("BATCH_OUTPUT_DIR", "batch_output")
+BATCH_WORKERS           = int(os.getenv("BATCH_WORKERS", "1"))
+BATCH_INCIDENT_INTERVAL = float(os.getenv("BATCH_INCIDENT_INTERVAL", "10"))   # s de mídia entre incidentes
+BATCH_FORMATS           = ("jsonl", "parquet")
+VIDEO_EXTS              = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".ts", ".webm")
+BATCH_INFER_EVERY       = int(os.getenv("INFER_EVERY", "1"))   # mesmo padrão de app.detection.INFER_EVERY
+PROGRESS_EVERY          = 8         # lotes entre avisos de progresso
+
+# ------------------------------------------------------------------
+# Arquivos e chave de retomada
+# ------------------------------------------------------------------
+def find_videos(paths: Iterable[str]) -> list[tuple[str, str]]:
+    """(source, path relative to its input root) for every video under `paths`, sorted."""
+    found = []
+    for root in paths:
+        if os.path.isfile(root):
+            found.append((root, os.path.basename(root)))
+            continue
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                if name.lower().endswith(VIDEO_EXTS):
+                    src = os.path.join(dirpath, name)
+                    found.append((src, os.path.relpath(src, root)))
+    return sorted(found)
+
+def timeline_path(rel: str, out_dir: str, fmt: str) -> str:
+    return os.path.join(out_dir, os.path.splitext(rel)[0] + "." + fmt)
+
+def model_key() -> str:
+    from app.backends import file_sha256
+    from app.config import MODEL1_PATH
+
+    return f"{file_sha256(MODEL1_PATH)[:16]}/{os.getenv('INFER_BACKEND', 'torch')}"
+
+def run_key(src: str, model: str, keyframes_only: bool, infer_every: int = 1) -> dict:
+    st = os.stat(src)
+    return {"size": st.st_size, "mtime": st.st_mtime, "model": model, "keyframes_only": keyframes_only,
+            "infer_every": infer_every}
+
+def load_summary(out: str) -> Optional[dict]:
+    try:
+        with open(out + ".done.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# ------------------------------------------------------------------
+# Timeline
+# ------------------------------------------------------------------
+class TimelineWriter:
+    """JSONL rows are streamed to `<out>.part`; Parquet is written at close. Renamed into place only on success."""
+
+    def __init__(self, out: str, fmt: str):
+        if fmt not in BATCH_FORMATS:
+            raise ValueError(f"Unknown timeline format {fmt!r}; expected one of {BATCH_FORMATS}")
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        self.out = out
+        self.fmt = fmt
+        self.tmp = out + ".part"
+        self._rows: list[dict] = []
+        self._file = open(self.tmp, "w") if fmt == "jsonl" else None
+
+    def write(self, row: dict):
+        if self._file is not None:
+            self._file.write(json.dumps(row) + "\n")
+        else:
+            self._rows.append(row)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.Table.from_pylist(self._rows), self.tmp)
+        os.replace(self.tmp, self.out)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+# ------------------------------------------------------------------
+# Análise de um arquivo
+# ------------------------------------------------------------------
+def analyze_file(src: str, out: str, fmt: str = "jsonl", backend: str = CAPTURE_BACKEND,
+                 keyframes_only: bool = False, infer_every: int = BATCH_INFER_EVERY,
+                 key: Optional[dict] = None, incident_interval: float = BATCH_INCIDENT_INTERVAL,
+                 progress: Optional[Callable[[str, int, float], None]] = None) -> dict:
+    """Decodes `src`, runs MODEL1 in batches and writes its timeline to `out`. Returns the summary."""
+    from app.detection import BATCH_SIZE, INFER_SIZE, _infer_model1
+    from app.severity import HYPER, TrackSeverity
+    from app.streams import SEVERITY_WINDOW
+    from app.tracking import ObjectTracker
+
+    cap = make_capture(src, backend, max_side=INFER_SIZE, keyframes_only=keyframes_only)
+    if not cap.open():
+        raise RuntimeError(f"Cannot open {src}: {cap.last_error}")
+
+    objects = ObjectTracker()
+    tracker = TrackSeverity(SEVERITY_WINDOW)
+    writer = TimelineWriter(out, fmt)
+    incidents = {"HIGH": 0, "MILD": 0}
+    frames = inferred = detections = 0
+    last_incident = -incident_interval
+    started = time.monotonic()
+
+    def _flush(batch: list, times: list):
+        nonlocal inferred, detections, last_incident
+        for (idx, t), dets in zip(times, _infer_model1(batch)):
+            inferred += 1
+            tracks = objects.update(dets, t)
+            detections += len(tracks)
+            tracker.add_tracks(tracks, t)
+            for d in tracks:
+                writer.write({"type": "detection", "frame": idx, "t": round(t, 3), "track_id": d["track_id"],
+                              "confidence": round(d["confidence"], 4), "box": list(d["box"])})
+            sev = tracker.severity(t)
+            if sev["level"] != "NONE" and t - last_incident >= incident_interval:
+                last_incident = t
+                incidents[sev["level"]] += 1
+                writer.write({"type": "incident", "frame": idx, "t": round(t, 3),
+                              "severity": sev["level"], "confidence": round(sev["max_confidence"], 4),
+                              "detections": sev["count"]})
+                tracker.reset()     # como no alerta ao vivo
+
+    try:
+        batch, times, n_batches = [], [], 0
+        while True:
+            ok, frame = cap.read()
+            if ok:
+                if frames % infer_every == 0:     # os demais só o tracker veria; offline não há preview
+                    batch.append(frame)
+                    times.append((frames, cap.position))
+                frames += 1
+            if batch and (not ok or len(batch) >= BATCH_SIZE):
+                _flush(batch, times)
+                batch, times = [], []
+                n_batches += 1
+                if progress is not None and n_batches % PROGRESS_EVERY == 0:
+                    progress(src, frames, cap.position)
+            if not ok:
+                break
+        elapsed = time.monotonic() - started
+        summary = {
+            "source": src,
+            "timeline": out,
+            "format": fmt,
+            "frames": frames,
+            "inferred": inferred,
+            "decoded": cap.decoded,
+            "duration": round(cap.position, 3),
+            "detections": detections,
+            "tracks": objects.created,
+            "incidents": incidents,
+            "elapsed": round(elapsed, 2),
+            "fps": round(frames / elapsed, 1) if elapsed else 0.0,
+            "hyper": HYPER,
+            "key": key,
+        }
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        cap.release()
+
+    with open(out + ".done.json.tmp", "w") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(out + ".done.json.tmp", out + ".done.json")
+    if progress is not None:
+        progress(src, frames, cap.position)
+    return summary
+
+# ------------------------------------------------------------------
+# Processos de trabalho
+# ------------------------------------------------------------------
+_progress_queue = None
+
+def _init_worker(progress_queue, intra_threads: int):
+    global _progress_queue
+    _progress_queue = progress_queue
+    # cada processo fica com a sua fatia dos núcleos; o pacote app já importou
+    # app.detection, então ajusta o torch agora e as sessões na carga do modelo
+    import app.detection as detection
+    from app.backends import configure_threads
+    if intra_threads and not detection.INTRA_THREADS:
+        detection.INTRA_THREADS = intra_threads
+        configure_threads(intra_threads, detection.INTER_THREADS)
+
+def _report(src: str, frames: int, position: float):
+    _progress_queue.put((src, frames, position))
+
+def _run_in_worker(kwargs: dict) -> dict:
+    return analyze_file(**kwargs, progress=_report)
+
+class BatchJob:
+    """
+    One offline run over a set of files/directories. `run()` blocks;
+    `start()` runs it on a background thread (used by the API). Progress
+    is available from `stats()` at any time.
+    """
+
+    def __init__(self, paths: Iterable[str], out_dir: str = BATCH_OUTPUT_DIR, fmt: str = "jsonl",
+                 workers: int = BATCH_WORKERS, backend: str = CAPTURE_BACKEND,
+                 keyframes_only: bool = False, force: bool = False, infer_every: int = BATCH_INFER_EVERY):
+        if fmt not in BATCH_FORMATS:
+            raise ValueError(f"Unknown timeline format {fmt!r}; expected one of {BATCH_FORMATS}")
+        if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("The parquet format requires the pyarrow package")
+        if backend not in CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend {backend!r}; expected one of {CAPTURE_BACKENDS}")
+        if infer_every < 1:
+            raise ValueError("infer_every must be >= 1")
+        self.paths = list(paths)
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.keyframes_only = keyframes_only
+        self.infer_every = infer_every
+        self.force = force
+        self.state = "pending"      # pending | running | done | failed
+        self.files: list[tuple[str, str]] = []
+        self.done: list[dict] = []
+        self.skipped: list[str] = []
+        self.failed: dict[str, str] = {}
+        self.current: dict[str, dict] = {}      # arquivo em andamento -> frames/posição
+        self._closed: set[str] = set()          # avisos de progresso atrasados são ignorados
+        self.started = 0.0
+        self.finished = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _pending(self) -> list[dict]:
+        model = model_key()
+        jobs = []
+        for src, rel in self.files:
+            out = timeline_path(rel, self.out_dir, self.fmt)
+            key = run_key(src, model, self.keyframes_only, self.infer_every)
+            prev = load_summary(out)
+            if not self.force and prev is not None and prev.get("key") == key and os.path.exists(out):
+                self.skipped.append(src)
+                continue
+            jobs.append({"src": src, "out": out, "fmt": self.fmt, "backend": self.backend,
+                         "keyframes_only": self.keyframes_only, "infer_every": self.infer_every, "key": key})
+        return jobs
+
+    def _progress(self, src: str, frames: int, position: float):
+        with self._lock:
+            if src in self._closed:
+                return
+            self.current[src] = {"frames": frames, "position": round(position, 1)}
+
+    def _finish(self, src: str, summary: Optional[dict] = None, error: str = ""):
+        with self._lock:
+            self._closed.add(src)
+            self.current.pop(src, None)
+            if summary is not None:
+                self.done.append(summary)
+            else:
+                self.failed[src] = error
+        if summary is not None:
+            logging.info("Batch: %s — %d frames em %.1fs (%.0f fps), incidentes %s",
+                         src, summary["frames"], summary["elapsed"], summary["fps"], summary["incidents"])
+        else:
+            logging.error("Batch: %s falhou: %s", src, error)
+        logging.info("Batch: %d/%d arquivos", len(self.done) + len(self.failed) + len(self.skipped), len(self.files))
+
+    def run(self) -> dict:
+        self.state, self.started = "running", time.time()
+        try:
+            self.files = find_videos(self.paths)
+            jobs = self._pending()
+            logging.info("Batch: %d arquivos, %d já processados, %d pendentes",
+                         len(self.files), len(self.skipped), len(jobs))
+            if self.workers == 1 or len(jobs) <= 1:
+                for job in jobs:
+                    try:
+                        self._finish(job["src"], analyze_file(**job, progress=self._progress))
+                    except Exception as e:
+                        self._finish(job["src"], error=str(e))
+            else:
+                self._run_pool(jobs)
+            self.state = "done"
+        except Exception:
+            self.state = "failed"
+            logging.exception("Batch falhou")
+        self.finished = time.time()
+        return self.stats()
+
+    def _run_pool(self, jobs: list[dict]):
+        # spawn: cada processo carrega o próprio modelo (nada de CUDA herdado via fork)
+        ctx = mp.get_context("spawn")
+        progress_queue = ctx.Queue()
+        intra = max(1, (os.cpu_count() or 1) // self.workers)
+        stop = threading.Event()
+
+        def _drain():
+            while not stop.is_set():
+                try:
+                    self._progress(*progress_queue.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+
+        drain = threading.Thread(target=_drain, name="batch-progress", daemon=True)
+        drain.start()
+        try:
+            with ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_init_worker,
+                                     initargs=(progress_queue, intra)) as pool:
+                futures = {pool.submit(_run_in_worker, job): job["src"] for job in jobs}
+                for fut in as_completed(futures):
+                    src = futures[fut]
+                    try:
+                        self._finish(src, fut.result())
+                    except Exception as e:
+                        self._finish(src, error=str(e))
+        finally:
+            stop.set()
+            drain.join()
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, name="batch-job", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = list(self.done)
+            current = dict(self.current)
+            failed = dict(self.failed)
+        end = self.finished or time.time()
+        frames = sum(s["frames"] for s in done) + sum(c["frames"] for c in current.values())
+        elapsed = end - self.started if self.started else 0.0
+        return {
+            "state": self.state,
+            "paths": self.paths,
+            "out_dir": self.out_dir,
+            "format": self.fmt,
+            "workers": self.workers,
+            "files": len(self.files),
+            "completed": len(done),
+            "skipped": len(self.skipped),
+            "failed": failed,
+            "in_progress": current,
+            "frames": frames,
+            "elapsed": round(elapsed, 1),
+            "fps": round(frames / elapsed, 1) if elapsed else 0.0,
+            "incidents": {
+                level: sum(s["incidents"][level] for s in done) for level in ("HIGH", "MILD")
+            },
+        }
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline MODEL1 analysis of recorded footage.")
+    parser.add_argument("paths", nargs="+", help="video files or directories (searched recursively)")
+    parser.add_argument("--out", default=BATCH_OUTPUT_DIR, help="timeline directory")
+    parser.add_argument("--format", default="jsonl", choices=BATCH_FORMATS)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="worker processes (one file each)")
+    parser.add_argument("--backend", default=CAPTURE_BACKEND, choices=CAPTURE_BACKENDS)
+    parser.add_argument("--keyframes-only", action="store_true", help="analyse keyframes only")
+    parser.add_argument("--infer-every", type=int, default=BATCH_INFER_EVERY,
+                        help="run MODEL1 on every Nth frame; the tracker bridges the rest")
+    parser.add_argument("--force", action="store_true", help="re-analyse files that are already done")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    try:
+        job = BatchJob(args.paths, args.out, args.format, args.workers, args.backend,
+                       args.keyframes_only, args.force, args.infer_every)
+    except ValueError as e:
+        parser.error(str(e))
+    stats = job.run()
+    print(json.dumps(stats, indent=2))
+    return 0 if stats["state"] == "done" and not stats["failed"] else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
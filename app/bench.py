@@ -0,0 +1,470 @@
+# app/bench.py
+
+"""
+Reproducible benchmark of the detection pipeline.
+
+    python -m app.bench [clips...] --out bench.json [--compare baseline.json]
+
+Measures, on the sample clips in `output/` (or seeded synthetic frames with
+`--synthetic`):
+
+- per-stage latency: decode, preprocess (letterbox), infer, postprocess,
+  severity (one stream, and `BANK_STREAMS` at once through
+  SeverityBank), tracking, JPEG/multipart encode, clip save;
+- MODEL1 throughput for every BATCH_SIZE x INFER_SIZE combination;
+- multi-stream scaling: N streams decoding and submitting through one
+  InferenceScheduler, as the live pipeline does;
+- the process memory high-water mark after each section.
+
+Latencies are reported as n/mean/p50/p90/max in milliseconds, after
+`--warmup` untimed runs. The frame set, seeds and parameters are recorded
+in the JSON together with the environment (versions, CPU count, backend,
+git commit). `--compare` flags every latency that grew or throughput that
+dropped by more than `--tolerance` and exits with status 1.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import platform
+import argparse
+import itertools
+import resource
+import tempfile
+import threading
+import subprocess
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+import torch
+
+from app.capture import CAPTURE_BACKEND, CAPTURE_BACKENDS, make_capture
+
+SAMPLE_GLOB     = os.path.join("output", "*.mp4")
+SYNTHETIC_SIZE  = (1280, 720)
+SEED            = 0
+BENCH_FRAMES    = 64
+BENCH_REPEAT    = 20
+BENCH_WARMUP    = 3
+BATCH_SIZES     = (1, 4, 8, 16)
+INFER_SIZES     = (320, 480, 640)
+STREAM_COUNTS   = (1, 2, 4)
+STREAM_SECONDS  = 5.0
+BANK_STREAMS    = 16
+TOLERANCE       = 0.15
+
+# ------------------------------------------------------------------
+# Medição
+# ------------------------------------------------------------------
+def summarize(samples_ms: list[float]) -> dict:
+    if not samples_ms:
+        return {"n": 0}
+    a = np.asarray(samples_ms)
+    return {
+        "n": len(a),
+        "mean": round(float(a.mean()), 3),
+        "p50": round(float(np.percentile(a, 50)), 3),
+        "p90": round(float(np.percentile(a, 90)), 3),
+        "max": round(float(a.max()), 3),
+    }
+
+def timeit(fn: Callable[[], object], repeat: int, warmup: int = BENCH_WARMUP) -> list[float]:
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+def maxrss_mb() -> float:
+    """Process high-water mark (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "infer_backend": os.getenv("INFER_BACKEND", "torch"),
+        "cuda": torch.cuda.is_available(),
+        "commit": commit,
+    }
+
+# ------------------------------------------------------------------
+# Frames de entrada
+# ------------------------------------------------------------------
+def synthetic_frames(n: int, size: tuple[int, int] = SYNTHETIC_SIZE, seed: int = SEED) -> list[np.ndarray]:
+    """Smooth random frames (upscaled noise), so JPEG/encode costs look like real footage, not white noise."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    return [
+        cv2.resize(rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8), (w, h),
+                   interpolation=cv2.INTER_LINEAR)
+        for _ in range(n)
+    ]
+
+def clip_frames(sources: list[str], n: int, backend: str = CAPTURE_BACKEND) -> list[np.ndarray]:
+    """First `n` frames, taken from the clips in order (looping over them if they're short)."""
+    frames: list[np.ndarray] = []
+    while len(frames) < n:
+        before = len(frames)
+        for src in sources:
+            cap = make_capture(src, backend)
+            if not cap.open():
+                continue
+            while len(frames) < n:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frames.append(frame)
+            cap.release()
+        if len(frames) == before:
+            raise RuntimeError(f"No frames could be decoded from {sources}")
+    return frames
+
+# ------------------------------------------------------------------
+# Estágios
+# ------------------------------------------------------------------
+def bench_decode(sources: list[str], n: int, backend: str) -> dict:
+    samples = []
+    for src in sources:
+        cap = make_capture(src, backend)
+        if not cap.open():
+            continue
+        while len(samples) < n:
+            t0 = time.perf_counter()
+            ok, _ = cap.read()
+            if not ok:
+                break
+            samples.append((time.perf_counter() - t0) * 1000)
+        cap.release()
+        if len(samples) >= n:
+            break
+    out = summarize(samples)
+    out["fps"] = round(1000 / out["mean"], 1) if samples else 0.0
+    return out
+
+def bench_encode(frames: list[np.ndarray], repeat: int) -> dict:
+    from app.preview import DEFAULT_QUALITY, ENCODER, encode_jpeg, multipart_part
+
+    it = itertools.cycle(frames)
+    fn = lambda: multipart_part(encode_jpeg(next(it), DEFAULT_QUALITY))
+    return {"encoder": ENCODER, **summarize(timeit(fn, max(repeat, len(frames))))}
+
+def bench_clip_save(frames: list[np.ndarray], repeat: int) -> dict:
+    from app.detection import BUFFER_LEN, FRAME_FPS, save_video_clip
+
+    buffer = [frames[i % len(frames)] for i in range(BUFFER_LEN)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.mp4")
+        samples = timeit(lambda: save_video_clip(buffer, path, FRAME_FPS), max(1, repeat // 4), warmup=1)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+    return {"frames": len(buffer), "bytes": size, **summarize(samples)}
+
+def bench_severity(n: int = 100_000) -> dict:
+    from app.severity import SeverityTracker
+
+    rng = np.random.default_rng(SEED)
+    confs = rng.random((n, 2)).tolist()
+    tracker = SeverityTracker(5)
+    t0 = time.perf_counter()
+    for i, c in enumerate(confs):
+        tracker.add_frame(c, i / 30)
+        tracker.severity(i / 30)
+    return {"frames": n, "us_per_frame": round((time.perf_counter() - t0) / n * 1e6, 3)}
+
+def bench_severity_bank(streams: int = BANK_STREAMS, n: int = 10_000) -> dict:
+    """SeverityBank.update for `streams` streams per call, on the same kind of frames as bench_severity."""
+    from app.severity import SeverityBank
+
+    rng = np.random.default_rng(SEED)
+    confs = rng.random((n, streams, 2))
+    counts, peaks = np.full(streams, 2), confs.max(axis=2)
+    bank = SeverityBank(streams, 5)
+    t0 = time.perf_counter()
+    for i in range(n):
+        bank.update(np.full(streams, i / 30), counts, peaks[i])
+    elapsed = time.perf_counter() - t0
+    return {"frames": n, "streams": streams, "capacity": bank.capacity,
+            "us_per_frame": round(elapsed / (n * streams) * 1e6, 3)}
+
+def bench_tracking(n: int = 20_000, objects: int = 4) -> dict:
+    """ObjectTracker.update + TrackSeverity per frame, `objects` boxes drifting with noise."""
+    from app.severity import TrackSeverity
+    from app.tracking import ObjectTracker
+
+    rng = np.random.default_rng(SEED)
+    start = rng.uniform(0, 1000, (objects, 2))
+    step = rng.normal(0, 2, (objects, 2))
+    frames = []
+    for i in range(n):
+        xy = start + step * i + rng.normal(0, 1.5, (objects, 2))
+        frames.append([
+            {"confidence": float(c), "box": (x, y, x + 80, y + 160), "class": 1}
+            for (x, y), c in zip(xy.tolist(), rng.uniform(0.2, 0.95, objects).tolist())
+        ])
+    tracker, severity = ObjectTracker(), TrackSeverity(5)
+    t0 = time.perf_counter()
+    for i, dets in enumerate(frames):
+        severity.add_tracks(tracker.update(dets, i / 30), i / 30)
+        severity.severity(i / 30)
+    return {"frames": n, "objects": objects, "tracks_created": tracker.created,
+            "us_per_frame": round((time.perf_counter() - t0) / n * 1e6, 3)}
+
+# ------------------------------------------------------------------
+# Inferência
+# ------------------------------------------------------------------
+def load_model1(imgsz: int, max_batch: int):
+    from app.backends import load_detector
+    from app.config import MODEL1_PATH
+    from app.detection import (DEVICE, HALF, INFER_BACKEND, INT8_CALIB_DIR, INTER_THREADS,
+                               INTRA_THREADS, MODEL_CACHE_DIR, _load_yolo)
+
+    return load_detector(
+        MODEL1_PATH, INFER_BACKEND, imgsz=imgsz, max_batch=max_batch,
+        device=DEVICE if INFER_BACKEND == "torch" else "cpu", half=HALF and INFER_BACKEND == "torch",
+        cache_root=MODEL_CACHE_DIR, calib_dir=INT8_CALIB_DIR,
+        intra_threads=INTRA_THREADS, inter_threads=INTER_THREADS, torch_loader=_load_yolo,
+    )
+
+def bench_batch(detector, frames: list[np.ndarray], batch: int, repeat: int, warmup: int) -> dict:
+    """Preprocess / infer / postprocess per batch, split the same way Detector.detect runs them."""
+    from app.detection import _model1_dets
+
+    chunks = [frames[i:i + batch] for i in range(0, len(frames) - batch + 1, batch)] or [frames[:batch]]
+    pre, inf, post = [], [], []
+    for r in range(warmup + repeat):
+        chunk = chunks[r % len(chunks)]
+        t0 = time.perf_counter()
+        tensor, metas = detector.letterbox(chunk)
+        t1 = time.perf_counter()
+        raw = detector._forward(tensor)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        t2 = time.perf_counter()
+        [_model1_dets(meta.to_source(xyxy), conf, cls) for (xyxy, conf, cls), meta in zip(raw, metas)]
+        t3 = time.perf_counter()
+        if r >= warmup:
+            pre.append((t1 - t0) * 1000)
+            inf.append((t2 - t1) * 1000)
+            post.append((t3 - t2) * 1000)
+    total = float(np.mean(pre) + np.mean(inf) + np.mean(post))
+    return {
+        "preprocess": summarize(pre),
+        "infer": summarize(inf),
+        "postprocess": summarize(post),
+        "fps": round(len(chunks[0]) * 1000 / total, 1),
+    }
+
+def bench_inference(frames: list[np.ndarray], sizes, batches, repeat: int, warmup: int) -> dict:
+    out = {}
+    for size in sizes:
+        detector = load_model1(size, max(batches))
+        out[str(size)] = {str(b): bench_batch(detector, frames, b, repeat, warmup) for b in batches}
+        logging.info("Bench: INFER_SIZE=%d %s", size,
+                     {b: r["fps"] for b, r in out[str(size)].items()})
+        del detector
+    return out
+
+def bench_streams(sources: list[str], frames: list[np.ndarray], counts, seconds: float,
+                  imgsz: int, batch: int, backend: str) -> dict:
+    """N streams (decode -> scheduler.submit -> result) sharing one InferenceScheduler."""
+    from app.detection import BATCH_WAIT_MS, InferenceScheduler, _model1_dets
+
+    detector = load_model1(imgsz, batch)
+    infer = lambda fs: [_model1_dets(*d) for d in detector.detect(fs)]
+    infer([frames[0]])
+    out = {}
+    for n in counts:
+        scheduler = InferenceScheduler(infer, batch, BATCH_WAIT_MS)
+        stop = threading.Event()
+        done = [0] * n
+
+        def _stream(i: int):
+            cap = make_capture(sources[i % len(sources)], backend) if sources else None
+            if cap is not None and not cap.open():
+                cap = None
+            k = 0
+            while not stop.is_set():
+                if cap is not None:
+                    ok, frame = cap.read()
+                    if not ok:      # fim do clipe: recomeça
+                        cap.release()
+                        if not cap.open():
+                            break
+                        continue
+                else:
+                    frame, k = frames[k % len(frames)], k + 1
+                scheduler.submit(frame, f"bench{i}").result()
+                done[i] += 1
+            if cap is not None:
+                cap.release()
+
+        threads = [threading.Thread(target=_stream, args=(i,), daemon=True) for i in range(n)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        stats = scheduler.stats()
+        out[str(n)] = {
+            "fps": round(sum(done) / elapsed, 1),
+            "fps_per_stream": round(sum(done) / elapsed / n, 1),
+            "avg_batch": stats["avg_batch"],
+            "wait_ms": stats["wait_ms"]["avg"],
+        }
+        logging.info("Bench: %d streams -> %s", n, out[str(n)])
+    return out
+
+# ------------------------------------------------------------------
+# Execução e comparação
+# ------------------------------------------------------------------
+def run(sources: list[str], synthetic: bool = False, n_frames: int = BENCH_FRAMES,
+        repeat: int = BENCH_REPEAT, warmup: int = BENCH_WARMUP, batches=BATCH_SIZES,
+        sizes=INFER_SIZES, streams=STREAM_COUNTS, stream_seconds: float = STREAM_SECONDS,
+        backend: str = CAPTURE_BACKEND, skip_model: bool = False) -> dict:
+    np.random.seed(SEED)
+    torch.manual_seed(SEED)
+    from app.detection import BATCH_SIZE, INFER_SIZE
+
+    if synthetic or not sources:
+        sources, frames = [], synthetic_frames(n_frames)
+    else:
+        frames = clip_frames(sources, n_frames, backend)
+
+    result = {
+        "created": time.time(),
+        "environment": environment(),
+        "params": {
+            "sources": sources, "synthetic": not sources, "frames": len(frames),
+            "frame_size": list(frames[0].shape[1::-1]), "repeat": repeat, "warmup": warmup,
+            "batch_sizes": list(batches), "infer_sizes": list(sizes), "streams": list(streams),
+            "stream_seconds": stream_seconds, "capture_backend": backend, "seed": SEED,
+        },
+        "stages": {},
+        "memory_mb": {"start": maxrss_mb()},
+    }
+    stages, memory = result["stages"], result["memory_mb"]
+    if sources:
+        stages["decode"] = bench_decode(sources, n_frames, backend)
+    stages["encode"] = bench_encode(frames, repeat)
+    stages["clip_save"] = bench_clip_save(frames, repeat)
+    stages["severity"] = bench_severity()
+    stages["severity_bank"] = bench_severity_bank()
+    stages["tracking"] = bench_tracking()
+    memory["stages"] = maxrss_mb()
+
+    if not skip_model:
+        try:
+            result["inference"] = bench_inference(frames, sizes, batches, repeat, warmup)
+            memory["inference"] = maxrss_mb()
+            ref = result["inference"].get(str(INFER_SIZE), {}).get(str(BATCH_SIZE))
+            if ref is not None:
+                stages.update(preprocess=ref["preprocess"], infer=ref["infer"], postprocess=ref["postprocess"])
+            result["streams"] = bench_streams(sources, frames, streams, stream_seconds,
+                                              INFER_SIZE, BATCH_SIZE, backend)
+            memory["streams"] = maxrss_mb()
+        except Exception as e:
+            logging.exception("Bench: inferência indisponível")
+            result["inference_error"] = str(e)
+    if torch.cuda.is_available():
+        memory["cuda_peak"] = round(torch.cuda.max_memory_allocated() / 2**20, 1)
+    return result
+
+def _metrics(result: dict) -> dict[str, tuple[float, bool]]:
+    """Flat {name: (value, higher_is_better)} for comparison."""
+    out = {}
+    for name, s in result.get("stages", {}).items():
+        if "p50" in s:
+            out[f"stages.{name}.p50"] = (s["p50"], False)
+        elif "us_per_frame" in s:
+            out[f"stages.{name}.us_per_frame"] = (s["us_per_frame"], False)
+    for size, by_batch in result.get("inference", {}).items():
+        for b, r in by_batch.items():
+            out[f"inference.{size}.{b}.fps"] = (r["fps"], True)
+    for n, r in result.get("streams", {}).items():
+        out[f"streams.{n}.fps"] = (r["fps"], True)
+    for name, mb in result.get("memory_mb", {}).items():
+        out[f"memory_mb.{name}"] = (mb, False)
+    return out
+
+def compare(current: dict, baseline: dict, tolerance: float = TOLERANCE) -> list[dict]:
+    """Metrics that got worse than the baseline by more than `tolerance` (relative)."""
+    base = _metrics(baseline)
+    regressions = []
+    for name, (value, higher_better) in _metrics(current).items():
+        if name not in base or not base[name][0]:
+            continue
+        change = (value - base[name][0]) / base[name][0]
+        if (-change if higher_better else change) > tolerance:
+            regressions.append({"metric": name, "baseline": base[name][0], "current": value,
+                                "change": round(change, 3)})
+    return regressions
+
+def _ints(text: str) -> tuple[int, ...]:
+    return tuple(int(x) for x in text.split(",") if x)
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline stages.")
+    parser.add_argument("clips", nargs="*", help=f"input clips (default: {SAMPLE_GLOB})")
+    parser.add_argument("--synthetic", action="store_true", help="use seeded synthetic frames instead of clips")
+    parser.add_argument("--frames", type=int, default=BENCH_FRAMES)
+    parser.add_argument("--repeat", type=int, default=BENCH_REPEAT)
+    parser.add_argument("--warmup", type=int, default=BENCH_WARMUP)
+    parser.add_argument("--batch-sizes", type=_ints, default=BATCH_SIZES)
+    parser.add_argument("--infer-sizes", type=_ints, default=INFER_SIZES)
+    parser.add_argument("--streams", type=_ints, default=STREAM_COUNTS)
+    parser.add_argument("--stream-seconds", type=float, default=STREAM_SECONDS)
+    parser.add_argument("--backend", default=CAPTURE_BACKEND, choices=CAPTURE_BACKENDS)
+    parser.add_argument("--skip-model", action="store_true", help="only the stages that need no model")
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    sources = args.clips or sorted(glob.glob(SAMPLE_GLOB))
+    result = run(sources, args.synthetic, args.frames, args.repeat, args.warmup, args.batch_sizes,
+                 args.infer_sizes, args.streams, args.stream_seconds, args.backend, args.skip_model)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            logging.warning("Parâmetros diferentes do baseline; a comparação pode não ser válida")
+        result["regressions"] = compare(result, baseline, args.tolerance)
+        for r in result["regressions"]:
+            logging.warning("Regressão: %s %s -> %s (%+.0f%%)", r["metric"], r["baseline"],
+                            r["current"], r["change"] * 100)
+        status = 1 if result["regressions"] else 0
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+# app/capture.py
+
+"""
+Video capture backends.
+
+A capture source exposes the part of the cv2.VideoCapture interface the
+pipeline relies on (`read(image)`, `fps`, `release()`), plus:
+
+- "opencv": FFmpeg backend with hardware decode requested when the build
+  supports it and an explicit decoder thread count.
+- "pyav": PyAV with frame/slice-threaded decode. With `keyframes_only`
+  the codec skips every non-key frame, so nothing else is decoded.
+
+`max_side` downscales each frame while it's converted to BGR, so the rest
+of the pipeline never handles full-resolution frames. Live sources
+(RTSP/HTTP) reopen with exponential backoff when the connection drops;
+file sources end at EOF.
+"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+CAPTURE_BACKENDS = ("opencv", "pyav")
+CAPTURE_BACKEND  = os.getenv("CAPTURE_BACKEND", "opencv")
+DECODE_THREADS   = int(os.getenv("DECODE_THREADS", "0"))   # 0 = automático
+BACKOFF_START    = 0.5      # s até a 1ª tentativa de reconexão
+BACKOFF_MAX      = 30.0
+
+def target_size(width: int, height: int, max_side: int) -> tuple[int, int]:
+    """(w, h) with the longer side capped at `max_side`, rounded to even numbers for the encoders."""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    s = max_side / max(width, height)
+    return max(2, int(width * s) & ~1), max(2, int(height * s) & ~1)
+
+class CaptureSource:
+    backend = ""
+
+    def __init__(self, source: str, max_side: int = 0, keyframes_only: bool = False,
+                 threads: int = DECODE_THREADS):
+        self.source = source
+        self.max_side = max_side
+        self.keyframes_only = keyframes_only
+        self.threads = threads
+        self.live = not os.path.isfile(source)
+        self.fps = 30
+        self.size = (0, 0)          # (w, h) entregue ao pipeline
+        self.native = (0, 0)        # (w, h) do stream
+        self.position = 0.0         # timestamp de mídia do último frame (s), contínuo entre reconexões
+        self._offset = 0.0
+        self.decoded = 0
+        self.opens = 0
+        self.reconnects = 0
+        self.last_error = ""
+        self._stop = threading.Event()
+        self._delay = BACKOFF_START
+
+    # Implementados pelos backends -------------------------------------
+    def _open(self) -> bool:
+        raise NotImplementedError
+
+    def _read(self, image: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    def open(self, stop: Optional[threading.Event] = None) -> bool:
+        """Opens the source; live sources keep retrying with backoff until `stop` is set."""
+        if stop is not None:
+            self._stop = stop
+        while not self._stop.is_set():
+            try:
+                if self._open():
+                    self.opens += 1
+                    return True
+                self.last_error = "open failed"
+            except Exception as e:
+                self.last_error = str(e)
+            self._close()
+            if not self.live or not self._backoff():
+                return False
+        return False
+
+    def _backoff(self) -> bool:
+        logging.warning("Fonte %s indisponível (%s); nova tentativa em %.1fs",
+                        self.source, self.last_error, self._delay)
+        if self._stop.wait(self._delay):
+            return False
+        self._delay = min(self._delay * 2, BACKOFF_MAX)
+        return True
+
+    def read(self, image: Optional[np.ndarray] = None) -> tuple[bool, Optional[np.ndarray]]:
+        """
+        Next BGR frame, written into `image` when its shape matches. On a live
+        source a failed read reconnects (with backoff) instead of ending the stream.
+        """
+        while True:
+            try:
+                frame = self._read(image)
+            except Exception as e:
+                frame, self.last_error = None, str(e)
+            if frame is not None:
+                self._delay = BACKOFF_START
+                return True, frame
+            self._close()
+            if not self.live or not self._backoff():
+                return False, None
+            self.reconnects += 1
+            logging.warning("Reconectando %s (tentativa %d)", self.source, self.reconnects)
+            if not self.open():
+                return False, None
+            self._offset = self.position + 1.0 / self.fps   # o relógio do stream reinicia em 0
+
+    def release(self):
+        self._close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "live": self.live,
+            "fps": self.fps,
+            "size": list(self.size),
+            "native": list(self.native),
+            "keyframes_only": self.keyframes_only,
+            "decoded": self.decoded,
+            "opens": self.opens,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
+class OpenCVCapture(CaptureSource):
+    """
+    cv2 FFmpeg backend. OpenCV cannot tell the decoder to skip frames, so
+    `keyframes_only` here still decodes everything and only delivers about
+    one frame per second (`grab()` without `retrieve()`); use "pyav" to skip
+    the decode itself.
+    """
+    backend = "opencv"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._full: Optional[np.ndarray] = None     # frame nativo antes do resize
+        self.hw_accel = 0
+
+    def _open(self) -> bool:
+        params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+                  cv2.CAP_PROP_N_THREADS, self.threads]
+        self._cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG, params)
+        if not self._cap.isOpened():
+            return False
+        self.fps = int(self._cap.get(cv2.CAP_PROP_FPS)) or 30
+        self.native = (int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.size = target_size(*self.native, self.max_side)
+        self.hw_accel = int(self._cap.get(cv2.CAP_PROP_HW_ACCELERATION))
+        return True
+
+    def _read(self, image):
+        if self.keyframes_only:
+            for _ in range(self.fps - 1):
+                if not self._cap.grab():
+                    return None
+                self.decoded += 1
+        if self.size == self.native:
+            ok, frame = self._cap.read(image)
+        else:
+            ok, self._full = self._cap.read(self._full)
+            frame = None
+            if ok:
+                dst = image if image is not None and image.shape[:2] == self.size[::-1] else None
+                frame = cv2.resize(self._full, self.size, dst=dst, interpolation=cv2.INTER_AREA)
+        if not ok:
+            return None
+        self.decoded += 1
+        pos_ms = self._cap.get(cv2.CAP_PROP_POS_MSEC)
+        self.position = self._offset + (pos_ms / 1000 if pos_ms > 0 else (self.decoded - 1) / self.fps)
+        return frame
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def stats(self) -> dict:
+        return {**super().stats(), "hw_accel": self.hw_accel}
+
+class PyAVCapture(CaptureSource):
+    backend = "pyav"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._container = None
+        self._frames = None
+
+    def _open(self) -> bool:
+        import av
+
+        options = {"rtsp_transport": "tcp"} if self.source.startswith("rtsp") else {}
+        self._container = av.open(self.source, options=options, timeout=10.0)
+        stream = self._container.streams.video[0]
+        stream.thread_type = "AUTO"             # frame + slice threading
+        stream.codec_context.thread_count = self.threads
+        if self.keyframes_only:
+            stream.codec_context.skip_frame = "NONKEY"
+        self.fps = int(stream.average_rate or 0) or 30
+        self.native = (stream.codec_context.width, stream.codec_context.height)
+        self.size = target_size(*self.native, self.max_side)
+        self._frames = self._container.decode(stream)
+        return True
+
+    def _read(self, image):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        self.decoded += 1
+        self.position = self._offset + (frame.time if frame.time is not None else self.decoded / self.fps)
+        w, h = self.size
+        arr = frame.reformat(width=w, height=h, format="bgr24").to_ndarray()
+        if image is not None and image.shape == arr.shape:
+            np.copyto(image, arr)
+            return image
+        return arr
+
+    def _close(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = self._frames = None
+
+def make_capture(source: str, backend: str = CAPTURE_BACKEND, **kwargs) -> CaptureSource:
+    """Unopened capture source; the stream loop calls `open(stop)` on it."""
+    if backend not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend {backend!r}; expected one of {CAPTURE_BACKENDS}")
+    cls = OpenCVCapture if backend == "opencv" else PyAVCapture
+    return cls(source, **kwargs)
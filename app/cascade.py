@@ -0,0 +1,103 @@
+# app/cascade.py
+
+"""
+MODEL2/MODEL3 escalation.
+
+The live loop only runs MODEL1. Each MODEL1 hit is cropped to its boxes
+(plus a margin) right away, so the crops don't depend on buffers that get
+reused; once a stream's severity leaves NONE, the recent crops are sent to
+MODEL2 ("Lethal Objects") and MODEL3 ("Violence") in one batch each, on a
+worker thread of their own. The results are attached to the alert message
+and the incident.
+"""
+
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+from app.detection import run_models_batch
+
+CASCADE_MODELS   = ("model2", "model3")
+CASCADE_FRAMES   = 8        # hits do MODEL1 mantidos por stream
+CASCADE_INTERVAL = 5.0      # s entre cascatas enquanto o stream seguir elevado
+CASCADE_TIMEOUT  = 15.0     # s que o alerta espera pela cascata
+ROI_MARGIN       = 0.15
+ROI_MIN_SIDE     = 32
+MAX_RESULTS      = 10       # detecções por modelo anexadas ao incidente
+
+def crop_rois(frame: np.ndarray, boxes: list[tuple], margin: float = ROI_MARGIN):
+    """Yields (crop, (x_off, y_off)) for each MODEL1 box, padded by `margin`."""
+    h, w = frame.shape[:2]
+    for x1, y1, x2, y2 in boxes:
+        mx, my = int((x2 - x1) * margin), int((y2 - y1) * margin)
+        x1, y1 = max(0, x1 - mx), max(0, y1 - my)
+        x2, y2 = min(w, x2 + mx), min(h, y2 + my)
+        if x2 - x1 < ROI_MIN_SIDE or y2 - y1 < ROI_MIN_SIDE:
+            continue
+        yield frame[y1:y2, x1:x2], (x1, y1)
+
+def hit_rois(frame: np.ndarray, boxes: list[tuple]) -> list[tuple[np.ndarray, tuple]]:
+    """Owned copies of the ROIs of one MODEL1 hit, as kept in `StreamState.recent_hits`."""
+    return [(crop.copy(), off) for crop, off in crop_rois(frame, boxes)]
+
+def _merge(per_roi: list[list[dict]], offsets: list[tuple]) -> list[dict]:
+    dets = []
+    for roi_dets, (ox, oy) in zip(per_roi, offsets):
+        for d in roi_dets:
+            x1, y1, x2, y2 = d["box"]
+            dets.append({**d, "box": (x1 + ox, y1 + oy, x2 + ox, y2 + oy)})
+    dets.sort(key=lambda d: d["confidence"], reverse=True)
+    return dets[:MAX_RESULTS]
+
+class CascadeWorker:
+    """One background thread; each job returns {"model2": [...], "model3": [...]}."""
+
+    def __init__(self):
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.rois = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="cascade", daemon=True)
+                self._thread.start()
+
+    def submit(self, hits: list[list[tuple[np.ndarray, tuple]]]) -> Future:
+        """`hits` = one `hit_rois()` list per recent MODEL1 hit."""
+        self._ensure_worker()
+        fut: Future = Future()
+        self._jobs.put((hits, fut))
+        return fut
+
+    def _loop(self):
+        while True:
+            hits, fut = self._jobs.get()
+            try:
+                fut.set_result(self._run(hits))
+            except Exception as e:
+                logging.exception("Cascata MODEL2/MODEL3 falhou")
+                fut.set_exception(e)
+
+    def _run(self, hits) -> dict:
+        crops, offsets = [], []
+        for rois in hits:
+            for crop, off in rois:
+                crops.append(crop)
+                offsets.append(off)
+        self.runs += 1
+        self.rois += len(crops)
+        if not crops:
+            return {name: [] for name in CASCADE_MODELS}
+        return {name: _merge(run_models_batch(name, crops), offsets) for name in CASCADE_MODELS}
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "rois": self.rois, "pending": self._jobs.qsize()}
+
+cascade_worker = CascadeWorker()
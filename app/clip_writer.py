@@ -0,0 +1,218 @@
+# app/clip_writer.py
+
+"""
+Background clip persistence so alerts never freeze the frame loop.
+
+ClipWriter takes a lazy snapshot of the pre-event buffer (read frame by
+frame from the FrameRing, no restacking) and encodes it on its own thread.
+
+SegmentRecorder is the optional "segments" mode: it keeps the last few
+seconds pre-encoded as short rolling files, so saving a clip is a file
+concat instead of a re-encode.
+"""
+
+import os
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Iterable, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from app.detection import save_video_clip, BUFFER_SECONDS
+from app.metrics import STAGE_SECONDS
+
+CLIP_MODES = ("buffer", "segments")
+SEGMENT_SECONDS = 2
+CONTROL_POLL = 0.2      # s sem frames até olhar os pedidos de clipe/encerramento
+FOURCC = "mp4v"
+
+class ClipWriter:
+    """Single background encoder; jobs run in submission order."""
+
+    def __init__(self):
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="clip-writer", daemon=True)
+                self._thread.start()
+
+    def submit_job(self, fn: Callable[[], Optional[str]]) -> Future:
+        self._ensure_worker()
+        fut: Future = Future()
+        self._jobs.put((fn, fut))
+        return fut
+
+    def submit(self, frames: Iterable[np.ndarray], out_path: str, fps: int) -> Future:
+        """`frames` is a lazy snapshot (e.g. `FrameRing.snapshot()`), read as the clip is encoded."""
+        return self.submit_job(lambda: save_video_clip(frames, out_path, fps))
+
+    def _loop(self):
+        while True:
+            fn, fut = self._jobs.get()
+            try:
+                with STAGE_SECONDS.time("clip_save"):
+                    path = fn()
+            except Exception as e:
+                logging.exception("Clip writer job failed")
+                self.failed += 1
+                fut.set_exception(e)
+                continue
+            if path:
+                self.written += 1
+            else:
+                self.failed += 1
+            fut.set_result(path)
+
+    def stats(self) -> dict:
+        return {"pending": self._jobs.qsize(), "written": self.written, "failed": self.failed}
+
+clip_writer = ClipWriter()
+
+def concat_segments(paths: Sequence[str], out_path: str, fps: int) -> Optional[str]:
+    """Stream-copy concat via ffmpeg when available, re-encode fallback otherwise."""
+    paths = [p for p in paths if os.path.exists(p) and os.path.getsize(p) > 0]
+    if not paths:
+        logging.warning("Nenhum segmento disponível para %s", out_path)
+        return None
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as lst:
+            lst.writelines(f"file '{os.path.abspath(p)}'\n" for p in paths)
+        try:
+            proc = subprocess.run(
+                [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", lst.name, "-c", "copy", out_path],
+                capture_output=True, timeout=60,
+            )
+            if proc.returncode == 0 and os.path.exists(out_path):
+                logging.info("Vídeo salvo (concat de %d segmentos)", len(paths))
+                return out_path
+            logging.warning("ffmpeg concat falhou: %s", proc.stderr.decode(errors="ignore").strip())
+        finally:
+            os.unlink(lst.name)
+
+    def _frames():
+        for p in paths:
+            cap = cv2.VideoCapture(p)
+            while True:
+                ok, f = cap.read()
+                if not ok:
+                    break
+                yield f
+            cap.release()
+
+    return save_video_clip(_frames(), out_path, fps)
+
+class SegmentRecorder:
+    """
+    Encodes a stream continuously into `SEGMENT_SECONDS` files and keeps
+    just enough of them to cover the pre-event window. Frames are handed
+    over without blocking; if the encoder falls behind, new frames are
+    dropped and counted. Save/close requests go on a separate unbounded
+    queue, so they never wait behind a full frame queue.
+    """
+
+    def __init__(self, stream_id: str, out_dir: str, fps: int,
+                 segment_seconds: int = SEGMENT_SECONDS,
+                 keep_seconds: int = BUFFER_SECONDS * 2):
+        self.stream_id = stream_id
+        self.fps = fps
+        self.dir = os.path.join(out_dir, ".segments", stream_id)
+        shutil.rmtree(self.dir, ignore_errors=True)  # sobras de uma execução anterior
+        os.makedirs(self.dir, exist_ok=True)
+        self.frames_per_segment = max(1, fps * segment_seconds)
+        self.needed = max(1, -(-keep_seconds // segment_seconds))
+        # folga de 2 segmentos: o concat na fila do ClipWriter não perde arquivos para a rotação
+        self.segments: deque = deque(maxlen=self.needed + 2)
+        self._q: queue.Queue = queue.Queue(maxsize=fps * 2)
+        self._ctl: queue.SimpleQueue = queue.SimpleQueue()     # ("save", path, fut) | None
+        self._writer: Optional[cv2.VideoWriter] = None
+        self._current: Optional[str] = None
+        self._count = 0
+        self._seq = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._loop, name=f"segments:{stream_id}", daemon=True)
+        self._thread.start()
+
+    def write(self, frame: np.ndarray):
+        try:
+            self._q.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+
+    def save_clip(self, out_path: str) -> Future:
+        """Closes the current segment and concatenates the retained ones on the ClipWriter."""
+        fut: Future = Future()
+        self._ctl.put(("save", out_path, fut))
+        return fut
+
+    def close(self):
+        self._ctl.put(None)
+        self._thread.join(5)
+
+    def _rotate(self):
+        if self._writer is not None:
+            self._writer.release()
+            if len(self.segments) == self.segments.maxlen:
+                old = self.segments[0]
+                if os.path.exists(old):
+                    os.remove(old)
+            self.segments.append(self._current)
+        self._writer, self._current, self._count = None, None, 0
+
+    def _open(self, frame: np.ndarray):
+        h, w = frame.shape[:2]
+        self._seq += 1
+        self._current = os.path.join(self.dir, f"seg_{self._seq:08d}.mp4")
+        self._writer = cv2.VideoWriter(self._current, cv2.VideoWriter_fourcc(*FOURCC), self.fps, (w, h))
+
+    def _control(self) -> bool:
+        """Handles pending save/close requests; False once closed."""
+        while True:
+            try:
+                req = self._ctl.get_nowait()
+            except queue.Empty:
+                return True
+            if req is None:
+                self._rotate()
+                return False
+            _, out_path, fut = req
+            self._rotate()
+            paths = list(self.segments)[-self.needed:]
+            job = clip_writer.submit_job(
+                lambda paths=paths, out_path=out_path: concat_segments(paths, out_path, self.fps)
+            )
+            job.add_done_callback(lambda j, fut=fut: _chain(j, fut))
+
+    def _loop(self):
+        while self._control():
+            try:
+                item = self._q.get(timeout=CONTROL_POLL)
+            except queue.Empty:
+                continue
+            if self._writer is None:
+                self._open(item)
+            self._writer.write(item)
+            self._count += 1
+            if self._count >= self.frames_per_segment:
+                self._rotate()
+
+def _chain(src: Future, dst: Future):
+    if src.exception() is not None:
+        dst.set_exception(src.exception())
+    else:
+        dst.set_result(src.result())
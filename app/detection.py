@@ -1,12 +1,16 @@
 # app/detection.py – versão turbo 🏎️
-import os, time, logging, cv2, numpy as np, torch
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+import os, time, queue, logging, threading, cv2, numpy as np, torch
+from concurrent.futures import Future
+from typing import Iterable
 from ultralytics import YOLO
 
-from app.millis_call import make_emergency_call
-from app.telegram_alert import send_telegram_video
+from app.dispatch import dispatcher
+from app.incident import Incident
+from app.severity import HYPER, SeverityTracker
 from app.config import MODEL1_PATH, MODEL2_PATH, MODEL3_PATH
+from app.metrics import Histogram
+from app.model_registry import ModelRegistry
+from app.backends import Detector, configure_threads, load_detector
 
 # ------------------------------------------------------------------
 # Configuração global
@@ -29,208 +33,258 @@ BUFFER_LEN  = FRAME_FPS * BUFFER_SEC
 
 # Turbo‑parâmetros
 INFER_SIZE  = 640                  # lado maior após resize
-BATCH_SIZE  = 1                    # frames por inferência
+BATCH_SIZE  = 16                   # máx. frames por inferência (somando todas as câmeras)
+BATCH_WAIT_MS = 5                  # espera máx. do 1º frame antes de disparar o lote
+MODEL_IDLE_TTL = 300               # s sem uso até descarregar MODEL2/MODEL3
+INFER_EVERY = int(os.getenv("INFER_EVERY", "1"))   # MODEL1 a cada K frames; o tracker cobre os demais
 
-HYPER = dict(
-    mild_threshold          = 0.80,
-    detection_count_thresh  = 20,
-    mild_consecutive_thresh = 5,
-)
+# Backend de inferência: torch (ultralytics) | onnx (ONNX Runtime CPU) | openvino
+INFER_BACKEND   = os.getenv("INFER_BACKEND", "torch")
+INT8_CALIB_DIR  = os.getenv("INT8_CALIB_DIR", "")        # pasta de frames p/ quantização INT8 (onnx/openvino)
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", ".model_cache")
+INTRA_THREADS   = int(os.getenv("INFER_INTRA_THREADS", "0"))   # 0 = padrão do runtime
+INTER_THREADS   = int(os.getenv("INFER_INTER_THREADS", "0"))
 
 # ------------------------------------------------------------------
 # Carregamento dos modelos
 # ------------------------------------------------------------------
-def _load_model(path: str) -> YOLO:
+def _load_yolo(path: str) -> YOLO:
     m = YOLO(path).to(DEVICE)
     if HALF:
         m.half()
     m.fuse()
     m.eval()
-    logging.info("Modelo %s pronto (%s)", os.path.basename(path), DEVICE)
     return m
 
-MODEL1, MODEL2, MODEL3 = map(_load_model, (MODEL1_PATH, MODEL2_PATH, MODEL3_PATH))
+configure_threads(INTRA_THREADS, INTER_THREADS)
 
-# ------------------------------------------------------------------
-# Resize rápido mantendo proporção
-# ------------------------------------------------------------------
-def _resize_keep_ratio(img: np.ndarray, max_side: int = INFER_SIZE) -> np.ndarray:
-    h, w = img.shape[:2]
-    scale = max_side / max(h, w)
-    if scale < 1.0:  # só encolhe
-        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_LINEAR)
-    return img
+def _load_model(path: str) -> Detector:
+    det = load_detector(
+        path, INFER_BACKEND,
+        imgsz=INFER_SIZE, max_batch=BATCH_SIZE if path == MODEL1_PATH else 1,
+        device=DEVICE if INFER_BACKEND == "torch" else "cpu", half=HALF and INFER_BACKEND == "torch",
+        cache_root=MODEL_CACHE_DIR, calib_dir=INT8_CALIB_DIR,
+        intra_threads=INTRA_THREADS, inter_threads=INTER_THREADS,
+        torch_loader=_load_yolo,
+    )
+    logging.info("Modelo %s pronto (%s/%s)", os.path.basename(path), det.backend, DEVICE if det.backend == "torch" else "cpu")
+    return det
+
+def _release_memory():
+    if DEVICE == "cuda":
+        torch.cuda.empty_cache()
+
+# Carregados sob demanda: importar este módulo não carrega nada.
+# MODEL1 fica sempre residente; MODEL2/3 saem da memória após MODEL_IDLE_TTL s sem uso.
+models = ModelRegistry(_load_model, on_unload=_release_memory)
+models.register("model1", MODEL1_PATH)
+models.register("model2", MODEL2_PATH, idle_ttl=MODEL_IDLE_TTL)
+models.register("model3", MODEL3_PATH, idle_ttl=MODEL_IDLE_TTL)
+
+def _exercise(name: str, model: Detector):
+    model.detect([np.zeros((INFER_SIZE, INFER_SIZE, 3), dtype=np.uint8)])
+
+def warmup_models(names=("model1",)):
+    """Carrega e aquece os modelos em background; o servidor já aceita conexões."""
+    models.start_reaper()
+    return models.warmup(names, _exercise)
 
 # ------------------------------------------------------------------
 # Inferência em lote (só MODEL1)
 # ------------------------------------------------------------------
-_frame_batch: list[np.ndarray] = []
-_pending_results: deque = deque()
+def _model1_dets(xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray) -> list[dict]:
+    """Detecções de um frame (saída do Detector) como dicts, só a classe violência."""
+    if not len(conf):
+        return []
+    return [
+        {
+            "confidence": c,
+            "box": tuple(box),
+            "class": int(k),
+        }
+        for box, c, k in zip(xyxy.tolist(), conf.tolist(), cls.tolist())
+        if k == 1  # só violência
+    ]
 
-@torch.inference_mode()
 def _infer_model1(frames_bgr: list[np.ndarray]) -> list[list[dict]]:
-    """Roda MODEL1 em lote, devolvendo detecções por frame."""
+    """
+    Roda MODEL1 em lote, devolvendo detecções por frame em coordenadas
+    do frame original. O lote vai ao backend já como tensor NCHW
+    normalizado (ver app/preprocess.py), seja torch, ONNX ou OpenVINO.
+    """
     if not frames_bgr:
         return []
-
-    imgs = [_resize_keep_ratio(f)[..., ::-1] for f in frames_bgr]  # BGR→RGB
-    preds = MODEL1.predict(imgs, device=DEVICE, imgsz=INFER_SIZE, half=HALF, verbose=False)
-
-    out = []
-    for r in preds:
-        if not len(r.boxes):
-            out.append([])
-            continue
-        b = r.boxes
-        boxes = b.xyxy.cpu().int().tolist()
-        confs = b.conf.cpu().tolist()
-        clss  = b.cls.cpu().int().tolist()
-        out.append(
-            [
-                {
-                    "confidence": c,
-                    "box": tuple(xyxy),
-                    "class": int(cls),
-                }
-                for xyxy, c, cls in zip(boxes, confs, clss)
-                if cls == 1  # só violência
-            ]
-        )
-    return out
+    return [_model1_dets(*dets) for dets in models.get("model1").detect(frames_bgr)]
 
 # ------------------------------------------------------------------
-# API principal
+# Agendador central: junta frames de todas as câmeras num único lote
 # ------------------------------------------------------------------
-def run_all_models(frame: np.ndarray) -> dict:
+class InferenceScheduler:
     """
-    Acumula frames e executa MODEL1 em lote.
-    Retorna detecções do frame atual.
-    MODEL2 e MODEL3 deixam de ser chamados aqui para poupar GPU.
+    Cada câmera chama `submit(frame, stream_id)` da sua própria thread; o
+    worker agrupa os frames num único MODEL1.predict e devolve a cada
+    Future as detecções do seu frame.
+
+    Batching dinâmico: o lote é disparado quando atinge `max_batch` frames
+    ou quando o frame mais antigo já esperou `max_wait_ms` — o que vier
+    primeiro. Ambos podem ser alterados em tempo de execução.
     """
-    global _frame_batch, _pending_results
 
-    _frame_batch.append(frame.copy())
-    if len(_frame_batch) == BATCH_SIZE:
-        _pending_results.extend(_infer_model1(_frame_batch))
-        _frame_batch.clear()
+    def __init__(self, infer_fn, max_batch: int = BATCH_SIZE, max_wait_ms: float = BATCH_WAIT_MS):
+        self.infer_fn    = infer_fn
+        self.max_batch   = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.frames_by_stream: dict[str, int] = {}
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms_hist    = Histogram([1, 2, 5, 10, 20, 50, 100, 250])
+        self.fps_hist        = Histogram([5, 10, 25, 50, 100, 250, 500, 1000])
+
+    def configure(self, max_batch: int | None = None, max_wait_ms: float | None = None):
+        if max_batch is not None:
+            if max_batch < 1:
+                raise ValueError("max_batch must be >= 1")
+            self.max_batch = max_batch
+        if max_wait_ms is not None:
+            if max_wait_ms < 0:
+                raise ValueError("max_wait_ms must be >= 0")
+            self.max_wait_ms = max_wait_ms
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="infer-scheduler", daemon=True)
+                self._thread.start()
+
+    def submit(self, frame: np.ndarray, stream_id: str = "default") -> Future:
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((stream_id, frame, fut, time.perf_counter()))
+        return fut
 
-    if not _pending_results:
-        return {"model1": [], "model2": [], "model3": []}
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = batch[0][3] + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
 
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            t0 = time.perf_counter()
+            try:
+                results = self.infer_fn([f for _, f, _, _ in batch])
+            except Exception as e:
+                logging.exception("Falha na inferência em lote")
+                for _, _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - t0
+            self.batches += 1
+            self.frames  += len(batch)
+            self.batch_size_hist.observe(len(batch))
+            self.wait_ms_hist.observe((t0 - batch[0][3]) * 1000)
+            if elapsed > 0:
+                self.fps_hist.observe(len(batch) / elapsed)
+            for (sid, _, fut, _), dets in zip(batch, results):
+                self.frames_by_stream[sid] = self.frames_by_stream.get(sid, 0) + 1
+                fut.set_result(dets)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch": round(self.frames / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+            "frames_by_stream": dict(self.frames_by_stream),
+            "batch_size": self.batch_size_hist.snapshot(),
+            "wait_ms": self.wait_ms_hist.snapshot(),
+            "throughput_fps": self.fps_hist.snapshot(),
+        }
+
+scheduler = InferenceScheduler(_infer_model1)
+
+# ------------------------------------------------------------------
+# API principal
+# ------------------------------------------------------------------
+def run_all_models(frame: np.ndarray, stream_id: str = "default") -> dict:
+    """
+    Envia o frame ao agendador central e espera as detecções dele.
+    Como a chamada só retorna após a inferência, o frame não é copiado.
+    MODEL2 e MODEL3 deixam de ser chamados aqui para poupar GPU.
+    """
     return {
-        "model1": _pending_results.popleft(),
+        "model1": scheduler.submit(frame, stream_id).result(),
         "model2": [],
         "model3": [],
     }
 
 # Funções avulsas caso queira rodar MODEL2/3 sob demanda
-@torch.inference_mode()
 def run_model2(frame: np.ndarray):
-    return _run_generic(MODEL2, frame)
+    return _run_generic(models.get("model2"), frame)
 
-@torch.inference_mode()
 def run_model3(frame: np.ndarray):
-    return _run_generic(MODEL3, frame)
-
-def _run_generic(model: YOLO, frame: np.ndarray):
-    r = model(
-        _resize_keep_ratio(frame)[..., ::-1],
-        imgsz=INFER_SIZE,
-        half=HALF,
-        device=DEVICE,
-        verbose=False,
-    )[0]
-    if not len(r.boxes):
-        return []
-    b = r.boxes
+    return _run_generic(models.get("model3"), frame)
+
+def _run_generic(model: Detector, frame: np.ndarray):
+    return _run_generic_batch(model, [frame])[0]
+
+def _run_generic_batch(model: Detector, frames_bgr: list[np.ndarray]) -> list[list[dict]]:
+    """Um único lote para vários frames/ROIs BGR; caixas nas coordenadas de cada entrada."""
     return [
-        {
-            "confidence": float(c),
-            "box": tuple(map(int, xyxy)),
-            "class": int(cls),
-        }
-        for xyxy, c, cls in zip(
-            b.xyxy.cpu().tolist(), b.conf.cpu().tolist(), b.cls.cpu().tolist()
-        )
+        [
+            {
+                "confidence": float(c),
+                "box": tuple(map(int, box)),
+                "class": int(k),
+            }
+            for box, c, k in zip(xyxy.tolist(), conf.tolist(), cls.tolist())
+        ]
+        for xyxy, conf, cls in model.detect(frames_bgr)
     ]
 
-# ------------------------------------------------------------------
-# Rastreador de severidade
-# ------------------------------------------------------------------
-class SeverityTracker:
-    def __init__(self, window_sec: int):
-        self.win         = window_sec
-        self.dets        = deque(maxlen=HYPER["detection_count_thresh"] * 2)
-        self.mild_streak = 0
-
-    def add(self, conf: float):
-        t = time.time()
-        self.dets.append((t, conf))
-        self._cleanup(t)
-
-    def _cleanup(self, now: float):
-        while self.dets and now - self.dets[0][0] > self.win:
-            self.dets.popleft()
-
-    def severity(self) -> dict:
-        now = time.time()
-        self._cleanup(now)
-        count    = len(self.dets)
-        max_conf = max((c for _, c in self.dets), default=0.0)
-
-        level = "NONE"
-        if count >= HYPER["detection_count_thresh"]:
-            level = "HIGH" if max_conf >= HYPER["mild_threshold"] else "MILD"
-
-        if level == "MILD":
-            self.mild_streak += 1
-            if self.mild_streak >= HYPER["mild_consecutive_thresh"]:
-                level, self.mild_streak = "HIGH", 0
-        elif level == "HIGH":
-            self.mild_streak = 0
-        else:
-            self.mild_streak = 0
-
-        return {"level": level, "count": count, "max_confidence": max_conf}
+def run_models_batch(name: str, frames_bgr: list[np.ndarray]) -> list[list[dict]]:
+    """MODEL2/MODEL3 em lote (usado pela cascata)."""
+    return _run_generic_batch(models.get(name), frames_bgr)
 
 # ------------------------------------------------------------------
 # Funções de alerta
 # ------------------------------------------------------------------
-def _enrich_message(base: str, extra: dict) -> str:
-    parts = [base]
-    for key, title in (("model2", "Lethal Objects"), ("model3", "Violence")):
-        if extra.get(key):
-            lines = [
-                f" - conf={d['confidence']:.2f}, cls={d['class']}, box={d['box']}"
-                for d in extra[key]
-            ]
-            parts.append(f"\n{title}:\n" + "\n".join(lines))
-    return "".join(parts)
-
-def process_alerts(saved_path: str, msg: str, extra: dict, do_call: bool):
-    enriched = _enrich_message(msg, extra)
-    meta = send_telegram_video(saved_path, enriched)
-    if do_call and meta:
-        torch.cuda.current_stream().synchronize()
-        ThreadPoolExecutor(1).submit(make_emergency_call, meta)
-
-def process_review_alert(saved_path: str, msg: str, extra: dict):
-    send_telegram_video(saved_path, _enrich_message(msg, extra))
+def process_alerts(incident: Incident, do_call: bool):
+    """Queues the HIGH alert (and the emergency call) on the async dispatcher."""
+    payload = incident.to_dict()
+    dispatcher.submit("telegram", "HIGH", payload)
+    if do_call:
+        dispatcher.submit("call", "HIGH", payload)
+
+def process_review_alert(incident: Incident):
+    dispatcher.submit("telegram", "MILD", incident.to_dict())
 
 # ------------------------------------------------------------------
-# Salvamento de vídeo em lote
+# Salvamento de vídeo (sem np.stack: frames vão direto ao encoder)
 # ------------------------------------------------------------------
-def save_video_clip(buffer: deque, out_path: str, fps: int = FRAME_FPS):
-    if not buffer:
+def save_video_clip(buffer: Iterable[np.ndarray], out_path: str, fps: int = FRAME_FPS):
+    vw = None
+    for f in buffer:
+        if vw is None:
+            h, w = f.shape[:2]
+            vw = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        vw.write(f)
+    if vw is None:
         logging.warning("Buffer vazio, nada a salvar.")
         return None
-    frames = np.stack(buffer)
-    h, w = frames.shape[1:3]
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    vw = cv2.VideoWriter(out_path, fourcc, fps, (w, h))
-    for f in frames:
-        vw.write(f)
     vw.release()
     ok = os.path.exists(out_path) and os.path.getsize(out_path) > 0
     logging.info("Vídeo %s", "salvo" if ok else "falhou")
-    return out_path if ok else None
\ No newline at end of file
+    return out_path if ok else None
@@ -0,0 +1,407 @@
+# app/dispatch.py
+
+"""
+Asynchronous alert dispatch.
+
+One asyncio loop on a background thread delivers every outgoing alert.
+Each channel (Telegram, Millis call) has:
+
+- its own aiohttp session, so TLS connections are pooled and reused;
+- a bounded priority queue (HIGH before MILD, FIFO within a level). When
+  it's full, a higher-priority job evicts the newest lowest-priority one;
+- a token-bucket rate limit;
+- retry with exponential backoff for network errors, 429 and 5xx.
+
+Every job is written to `outbox/<id>.json` before it's queued and removed
+once delivered, so pending alerts are re-queued on the next start. Jobs
+that run out of attempts (or are evicted) are moved to `outbox/dead/`.
+
+Provider URLs come from TELEGRAM_API_URL / MILLIS_API_URL, so the
+dispatcher can be pointed at a local mock server.
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import aiohttp
+
+from app.config import TELEGRAM_CHAT_ID
+from app.incident import Incident
+from app.metrics import ALERT_SECONDS
+from app.millis_call import MILLIS_API_URL, build_call_request, call_headers
+from app.telegram_alert import is_valid_video, telegram_url
+
+OUTBOX_DIR      = os.getenv("ALERT_OUTBOX_DIR", ".outbox")
+QUEUE_SIZE      = 100       # jobs pendentes por canal
+MAX_ATTEMPTS    = 6
+BACKOFF_BASE    = 1.0       # s; dobra a cada tentativa
+BACKOFF_MAX     = 60.0
+POOL_SIZE       = 4         # conexões por provedor
+KEEPALIVE_SEC   = 60
+
+PRIORITY = {"HIGH": 0, "MILD": 1}
+
+class DispatchError(Exception):
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After value (delta-seconds or HTTP-date,
+    RFC 9110) or Telegram's `parameters.retry_after`; None if it doesn't parse.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(0.0, seconds) if math.isfinite(seconds) else None
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class JobQueue:
+    """Bounded priority queue ordered by (priority, seq)."""
+
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._heap: list[tuple[int, int, dict]] = []
+        self._seq = 0
+        self._cond = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    async def put(self, job: dict) -> Optional[dict]:
+        """Queues `job`; returns the job that didn't fit (evicted or `job` itself), if any."""
+        async with self._cond:
+            self._seq += 1
+            item = (job["priority"], self._seq, job)
+            dropped = None
+            if len(self._heap) >= self.maxsize:
+                worst = max(self._heap, key=lambda it: it[:2])
+                if item[:2] > worst[:2]:
+                    return job
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                dropped = worst[2]
+            heapq.heappush(self._heap, item)
+            self._cond.notify()
+            return dropped
+
+    async def get(self) -> dict:
+        async with self._cond:
+            while not self._heap:
+                await self._cond.wait()
+            return heapq.heappop(self._heap)[2]
+
+class Channel:
+    name = ""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.limiter = RateLimiter(rate, burst)
+        self.queue: Optional[JobQueue] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.sent = 0
+        self.retries = 0
+        self.dead = 0
+
+    async def open(self):
+        self.queue = JobQueue()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE_SEC),
+            timeout=aiohttp.ClientTimeout(total=60, connect=10),
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _post(self, url: str, **kwargs) -> Any:
+        await self.limiter.acquire()
+        async with self.session.post(url, **kwargs) as resp:
+            if resp.status < 400:
+                return await resp.json(content_type=None)
+            body = await resp.text()
+            retry_after = resp.headers.get("Retry-After")
+            if resp.status == 429:
+                try:
+                    retry_after = json.loads(body)["parameters"]["retry_after"]
+                except (ValueError, KeyError, TypeError):
+                    pass
+            raise DispatchError(
+                f"HTTP {resp.status}: {body[:200]}",
+                retryable=resp.status == 429 or resp.status >= 500,
+                retry_after=parse_retry_after(retry_after),
+            )
+
+    async def send(self, job: dict, checkpoint: Callable[[dict], None]):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.queue) if self.queue else 0,
+            "sent": self.sent,
+            "retries": self.retries,
+            "dead": self.dead,
+        }
+
+class TelegramChannel(Channel):
+    name = "telegram"
+
+    async def send(self, job, checkpoint):
+        incident = Incident.from_dict(job["payload"])
+        if job.get("step", 0) == 0:
+            await self._post(telegram_url("sendMessage"), data={"chat_id": TELEGRAM_CHAT_ID, "text": incident.telegram_text()})
+            job["step"] = 1     # uma nova tentativa não reenvia o texto
+            checkpoint(job)
+            logging.info("Telegram text message sent successfully.")
+        video = incident.clip
+        if is_valid_video(video):
+            with open(video, "rb") as f:
+                form = aiohttp.FormData()
+                form.add_field("chat_id", str(TELEGRAM_CHAT_ID))
+                form.add_field("video", f, filename="video.mp4", content_type="video/mp4")
+                await self._post(telegram_url("sendVideo"), data=form)
+            logging.info("Telegram video alert sent successfully.")
+        elif video:
+            logging.error("Error: Video file is invalid or empty: %s", video)
+
+class CallChannel(Channel):
+    name = "call"
+
+    async def send(self, job, checkpoint):
+        metadata = Incident.from_dict(job["payload"]).call_metadata()
+        resp = await self._post(MILLIS_API_URL, headers=call_headers(), json=build_call_request(metadata))
+        logging.info("Emergency call initiated successfully: %s", resp)
+
+class AlertDispatcher:
+    def __init__(self, outbox_dir: str = OUTBOX_DIR):
+        self.outbox_dir = outbox_dir
+        self.channels: dict[str, Channel] = {
+            "telegram": TelegramChannel(rate=1.0, burst=3),     # ~1 msg/s por chat
+            "call": CallChannel(rate=0.2, burst=1),
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # preparo dos alertas (clipe, retenção, incidente) fora do loop: ele só faz I/O de rede
+        self._prep = ThreadPoolExecutor(1, thread_name_prefix="alert-prep")
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self):
+        """Starts the loop thread (idempotent) and re-queues jobs left in the outbox."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            os.makedirs(os.path.join(self.outbox_dir, "dead"), exist_ok=True)
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="alert-dispatch", daemon=True)
+            self._thread.start()
+            ready.wait()
+            pending = self._load_outbox()     # antes de qualquer submit novo gravar no outbox
+        for job in pending:
+            self._call(self._enqueue(job))
+        if pending:
+            logging.info("%d alertas pendentes recuperados do outbox", len(pending))
+
+    def _run(self, ready: threading.Event):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._open())
+        ready.set()
+        self._loop.run_forever()
+
+    async def _open(self):
+        for ch in self.channels.values():
+            await ch.open()
+            asyncio.ensure_future(self._worker(ch))
+
+    def stop(self, timeout: float = 5.0):
+        """Closes the sessions; whatever is still queued stays in the outbox."""
+        if self._loop is None or self._thread is None or not self._thread.is_alive():
+            return
+        fut = self._call(self._close())
+        try:
+            fut.result(timeout)
+        except Exception:
+            logging.exception("Falha ao encerrar o dispatcher")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    async def _close(self):
+        for ch in self.channels.values():
+            await ch.close()
+
+    def _call(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # ------------------------------------------------------------------
+    # API (thread-safe)
+    # ------------------------------------------------------------------
+    def submit(self, channel: str, severity: str, payload: dict) -> str:
+        """Persists and queues one alert (`payload` = Incident.to_dict()); returns its job id."""
+        if channel not in self.channels:
+            raise ValueError(f"Unknown channel {channel!r}; expected one of {tuple(self.channels)}")
+        self.start()
+        job = {
+            "id": uuid.uuid4().hex,
+            "channel": channel,
+            "priority": PRIORITY.get(severity, PRIORITY["MILD"]),
+            "created": time.time(),
+            "attempts": 0,
+            "payload": payload,
+        }
+        self._save(job)
+        self._call(self._enqueue(job))
+        return job["id"]
+
+    def defer(self, callback: Callable[..., None], *args):
+        """Runs `callback(*args)` on the alert-prep thread (blocking I/O allowed; never on the loop)."""
+        def _run():
+            try:
+                callback(*args)
+            except Exception:
+                logging.exception("Falha ao preparar o alerta")
+
+        self._prep.submit(_run)
+
+    def when_done(self, fut: Future, timeout: float, callback: Callable[[Any], None], default: Any = None):
+        """
+        Calls `callback(result)` on the alert-prep thread once `fut` resolves,
+        or `callback(default)` after `timeout` s / on error. The wait happens
+        on the dispatch loop, so no thread is parked waiting.
+        """
+        self.start()
+
+        async def _wait():
+            result = default
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(fut), timeout)
+            except Exception as e:
+                logging.warning("Alert sent without MODEL2/MODEL3 results: %s", e)
+            self.defer(callback, result)
+
+        self._call(_wait())
+
+    def stats(self) -> dict:
+        return {
+            "channels": {name: ch.stats() for name, ch in self.channels.items()},
+            "evicted": self.evicted,
+        }
+
+    # ------------------------------------------------------------------
+    # Outbox
+    # ------------------------------------------------------------------
+    def _path(self, job: dict, dead: bool = False) -> str:
+        return os.path.join(self.outbox_dir, "dead" if dead else "", f"{job['id']}.json")
+
+    def _save(self, job: dict):
+        path = self._path(job)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp, path)
+
+    def _discard(self, job: dict, dead: bool = False):
+        try:
+            if dead:
+                os.replace(self._path(job), self._path(job, dead=True))
+            else:
+                os.remove(self._path(job))
+        except FileNotFoundError:
+            pass
+
+    def _load_outbox(self) -> list[dict]:
+        jobs = []
+        for name in os.listdir(self.outbox_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.outbox_dir, name)) as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                logging.exception("Job inválido no outbox: %s", name)
+        jobs.sort(key=lambda j: (j["priority"], j["created"]))
+        return jobs
+
+    # ------------------------------------------------------------------
+    # Entrega
+    # ------------------------------------------------------------------
+    async def _enqueue(self, job: dict):
+        dropped = await self.channels[job["channel"]].queue.put(job)
+        if dropped is not None:
+            self.evicted += 1
+            logging.error("Fila de alertas cheia; job %s descartado", dropped["id"])
+            self._discard(dropped, dead=True)
+
+    async def _worker(self, ch: Channel):
+        while True:
+            job = await ch.queue.get()
+            t0 = time.perf_counter()
+            try:
+                await ch.send(job, self._save)
+            except Exception as e:
+                ALERT_SECONDS.observe(time.perf_counter() - t0, ch.name, "error")
+                self._failed(ch, job, e)
+            else:
+                ALERT_SECONDS.observe(time.perf_counter() - t0, ch.name, "ok")
+                ch.sent += 1
+                self._discard(job)
+
+    def _failed(self, ch: Channel, job: dict, exc: Exception):
+        job["attempts"] += 1
+        retryable = not isinstance(exc, DispatchError) or exc.retryable
+        if not retryable or job["attempts"] >= MAX_ATTEMPTS:
+            ch.dead += 1
+            logging.error("Alerta %s (%s) falhou definitivamente: %s", job["id"], ch.name, exc)
+            self._discard(job, dead=True)
+            return
+        delay = getattr(exc, "retry_after", None) or min(BACKOFF_BASE * 2 ** (job["attempts"] - 1), BACKOFF_MAX)
+        ch.retries += 1
+        logging.warning("Alerta %s (%s) falhou (%s); nova tentativa em %.1fs", job["id"], ch.name, exc, delay)
+        self._save(job)
+        self._loop.call_later(delay, lambda: asyncio.ensure_future(self._enqueue(job)))
+
+dispatcher = AlertDispatcher()
@@ -0,0 +1,177 @@
+# app/events.py
+
+"""
+In-process event bus for pushing status and incidents to the frontend.
+
+Two kinds of events:
+
+- state (`set_state`): the latest value per (type, stream), e.g. the
+  per-frame status. Publishing is one dict assignment with no wake-ups and
+  no per-client work. Each subscriber picks up whatever changed at most once
+  per its `interval`, so intermediate values are coalesced.
+- discrete (`publish`): severity changes, alerts, incidents. Every one is
+  queued for each subscriber, which is woken right away. A subscriber that
+  falls behind loses its oldest events past `EVENT_QUEUE_SIZE`, and the
+  loss is reported to it as a "dropped" event, so a slow WebSocket never
+  holds up the detection loop.
+
+Publishers call from any thread and never block on subscribers.
+Subscribers are async (`Subscription.events()`), running on the server's
+event loop.
+"""
+
+import time
+import asyncio
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import AsyncIterator, Iterable, Optional
+
+EVENT_QUEUE_SIZE   = 256        # eventos discretos pendentes por cliente
+DEFAULT_INTERVAL   = 0.5        # s entre envios de estado coalescido
+MIN_INTERVAL       = 0.05
+HEARTBEAT_INTERVAL = 15.0
+
+def _event(seq: int, kind: str, stream: Optional[str], data: dict) -> dict:
+    return {"seq": seq, "type": kind, "stream": stream, "ts": time.time(), "data": data}
+
+class Subscription:
+    def __init__(self, bus: "EventBus", loop: asyncio.AbstractEventLoop, interval: float,
+                 types: Optional[set[str]], stream: Optional[str]):
+        self.bus = bus
+        self.loop = loop
+        self.interval = max(MIN_INTERVAL, interval)
+        self.types = types
+        self.stream = stream
+        self.queue: deque = deque()
+        self.dropped = 0
+        self.sent = 0
+        self._seen: dict[tuple, int] = {}       # chave de estado -> seq já enviado
+        self._wake = asyncio.Event()
+        self._last_state = 0.0
+        self.closed = False
+
+    def wants(self, kind: str, stream: Optional[str]) -> bool:
+        return (self.types is None or kind in self.types) and (
+            self.stream is None or stream is None or stream == self.stream)
+
+    def _push(self, event: dict):
+        """Called by the bus (any thread) with the bus lock held."""
+        if len(self.queue) >= EVENT_QUEUE_SIZE:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:    # loop encerrado: o cliente já foi embora
+            self.closed = True
+
+    def _drain(self, with_state: bool) -> list[dict]:
+        out = []
+        with self.bus._lock:
+            if self.dropped:
+                out.append(_event(0, "dropped", None, {"count": self.dropped}))
+                self.dropped = 0
+            out.extend(self.queue)
+            self.queue.clear()
+            if with_state:
+                for key, event in list(self.bus._state.items()):   # set_state não usa o lock
+                    if self._seen.get(key) != event["seq"] and self.wants(*key):
+                        self._seen[key] = event["seq"]
+                        out.append(event)
+        return out
+
+    async def events(self) -> AsyncIterator[Optional[dict]]:
+        """
+        Current state first, then discrete events as they come and changed
+        state every `interval`. Yields None after HEARTBEAT_INTERVAL s without
+        events, so the transport can send a keep-alive.
+        """
+        self._last_state = last_sent = time.monotonic()
+        for event in self._drain(with_state=True):
+            self.sent += 1
+            yield event
+        while not self.closed:
+            timeout = max(0.0, self._last_state + self.interval - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            now = time.monotonic()
+            with_state = now - self._last_state >= self.interval
+            if with_state:
+                self._last_state = now
+            batch = self._drain(with_state)
+            for event in batch:
+                self.sent += 1
+                yield event
+            if batch:
+                last_sent = now
+            elif now - last_sent >= HEARTBEAT_INTERVAL:
+                last_sent = now
+                yield None
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._state: dict[tuple, dict] = {}     # (tipo, stream) -> último evento
+        self._subs: set[Subscription] = set()
+        self.published = 0
+
+    # ------------------------------------------------------------------
+    # Publicação (qualquer thread, nunca bloqueia em clientes)
+    # ------------------------------------------------------------------
+    def set_state(self, kind: str, stream: Optional[str], data: dict):
+        """Replaces the latest `kind` value for `stream`; subscribers see only the newest one."""
+        self._state[(kind, stream)] = _event(next(self._seq), kind, stream, data)
+
+    def publish(self, kind: str, stream: Optional[str], data: dict):
+        event = _event(next(self._seq), kind, stream, data)
+        with self._lock:
+            self.published += 1
+            for sub in self._subs:
+                if sub.wants(kind, stream):
+                    sub._push(event)
+
+    def forget(self, stream: str):
+        """Drops the retained state of a removed stream."""
+        with self._lock:
+            for key in [k for k in self._state if k[1] == stream]:
+                del self._state[key]
+
+    # ------------------------------------------------------------------
+    # Assinaturas (no event loop do servidor)
+    # ------------------------------------------------------------------
+    def subscribe(self, interval: float = DEFAULT_INTERVAL, types: Optional[Iterable[str]] = None,
+                  stream: Optional[str] = None) -> Subscription:
+        sub = Subscription(self, asyncio.get_running_loop(), interval,
+                           set(types) if types else None, stream)
+        with self._lock:
+            self._subs.add(sub)
+        logging.info("Eventos: cliente conectado (%d ativos)", len(self._subs))
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        sub.closed = True
+        with self._lock:
+            self._subs.discard(sub)
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subs = list(self._subs)
+        return {
+            "clients": len(subs),
+            "published": self.published,
+            "state_keys": len(self._state),
+            "pending": sum(len(s.queue) for s in subs),
+            "sent": sum(s.sent for s in subs),
+        }
+
+events = EventBus()
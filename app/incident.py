@@ -0,0 +1,100 @@
+# app/incident.py
+
+"""
+Structured incident record.
+
+One Incident is created when a stream raises an alert and is carried
+through the clip writer, the MODEL2/MODEL3 cascade, the dispatch queue and
+the incident history. Each consumer renders what it needs from the fields
+(Telegram text, Millis call metadata, JSON for /incidents); nothing is
+parsed back out of a formatted message.
+"""
+
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Optional
+
+CASCADE_TITLES = (("model2", "Lethal Objects"), ("model3", "Violence"))
+
+@dataclass
+class Incident:
+    camera: str
+    severity: str
+    confidence: float
+    detections: int
+    created: datetime = field(default_factory=datetime.now)
+    clip: Optional[str] = None
+    model2: list[dict] = field(default_factory=list)
+    model3: list[dict] = field(default_factory=list)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def attach_cascade(self, extra: dict):
+        self.model2 = list(extra.get("model2", []))
+        self.model3 = list(extra.get("model3", []))
+
+    # ------------------------------------------------------------------
+    # Formatos por canal
+    # ------------------------------------------------------------------
+    def summary(self) -> str:
+        return (
+            "🚨 Violent Activity Detected!\n"
+            f"Camera: {self.camera}\n"
+            f"Date: {self.created:%Y-%m-%d}\n"
+            f"Time: {self.created:%I:%M %p}\n"
+            f"Severity: {self.severity}\n"
+            f"Confidence: {self.confidence:.2f}\n"
+            f"Detections: {self.detections}"
+        )
+
+    def telegram_text(self) -> str:
+        parts = [self.summary()]
+        for key, title in CASCADE_TITLES:
+            dets = getattr(self, key)
+            if dets:
+                lines = [f" - conf={d['confidence']:.2f}, cls={d['class']}, box={tuple(d['box'])}" for d in dets]
+                parts.append(f"\n{title}:\n" + "\n".join(lines))
+        return "".join(parts)
+
+    def call_metadata(self) -> dict:
+        """Fields expected by app.millis_call.build_call_request."""
+        extra = [f"{title}: {len(getattr(self, key))}" for key, title in CASCADE_TITLES if getattr(self, key)]
+        return {
+            "date_of_incident": f"{self.created:%Y-%m-%d}",
+            "time_of_incident": f"{self.created:%H:%M:%S}",
+            "severity_level": self.severity,
+            "detections": self.detections,
+            "confidence": round(self.confidence, 2),
+            "additional_info": f"Camera {self.camera}" + ("; " + ", ".join(extra) if extra else ""),
+        }
+
+    def log_line(self) -> str:
+        return f"{self.created:%H:%M:%S} - {self.severity} alert (Confidence: {self.confidence:.2f}, Detections: {self.detections})"
+
+    # ------------------------------------------------------------------
+    # Serialização (histórico, outbox)
+    # ------------------------------------------------------------------
+    def to_dict(self) -> dict:
+        out = asdict(self)
+        out.update(
+            created=self.created.timestamp(),
+            date=f"{self.created:%Y-%m-%d}",
+            time=f"{self.created:%H:%M:%S}",
+            confidence=round(self.confidence, 2),
+            message=self.summary(),
+        )
+        return out
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Incident":
+        return cls(
+            camera=data["camera"],
+            severity=data["severity"],
+            confidence=data["confidence"],
+            detections=data["detections"],
+            created=datetime.fromtimestamp(data["created"]),
+            clip=data.get("clip"),
+            model2=data.get("model2", []),
+            model3=data.get("model3", []),
+            id=data["id"],
+        )
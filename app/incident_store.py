@@ -0,0 +1,207 @@
+# app/incident_store.py
+
+"""
+Persistent incident history in SQLite (WAL).
+
+Writes are queued and applied by one background thread in batches (one
+transaction per batch), so the detection loop never waits on disk. An
+incident is saved when it is raised and again when its clip and cascade
+results arrive; `save()` upserts by id. Reads open their own connection,
+which WAL lets run concurrently with the writer.
+
+`query()` pages newest-first with an opaque cursor ("<created>:<id>"),
+optionally filtered by time range, severity and camera; `counts()` returns
+per-severity and per-camera totals for a time range / camera.
+"""
+
+import os
+import json
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import Optional
+
+from app.incident import Incident
+
+INCIDENT_DB   = os.getenv("INCIDENT_DB", "incidents.db")
+WRITE_BATCH   = 64        # incidentes por transação
+WRITE_WAIT    = 0.2       # s de espera para juntar um lote
+MAX_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id          TEXT PRIMARY KEY,
+    created     REAL NOT NULL,
+    camera      TEXT NOT NULL,
+    severity    TEXT NOT NULL,
+    confidence  REAL NOT NULL,
+    detections  INTEGER NOT NULL,
+    clip        TEXT,
+    model2      TEXT NOT NULL DEFAULT '[]',
+    model3      TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_created  ON incidents (created, id);
+CREATE INDEX IF NOT EXISTS idx_incidents_severity ON incidents (severity, created);
+CREATE INDEX IF NOT EXISTS idx_incidents_camera   ON incidents (camera, created);
+"""
+
+UPSERT = """
+INSERT INTO incidents (id, created, camera, severity, confidence, detections, clip, model2, model3)
+VALUES (:id, :created, :camera, :severity, :confidence, :detections, :clip, :model2, :model3)
+ON CONFLICT(id) DO UPDATE SET
+    clip = excluded.clip, model2 = excluded.model2, model3 = excluded.model3
+"""
+
+def _row(incident: Incident) -> dict:
+    return {
+        "id": incident.id,
+        "created": incident.created.timestamp(),
+        "camera": incident.camera,
+        "severity": incident.severity,
+        "confidence": round(incident.confidence, 4),
+        "detections": incident.detections,
+        "clip": incident.clip,
+        "model2": json.dumps(incident.model2),
+        "model3": json.dumps(incident.model3),
+    }
+
+def _incident(row: sqlite3.Row) -> Incident:
+    return Incident.from_dict({
+        **dict(row),
+        "model2": json.loads(row["model2"]),
+        "model3": json.loads(row["model3"]),
+    })
+
+class IncidentStore:
+    def __init__(self, path: str = INCIDENT_DB):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ------------------------------------------------------------------
+    # Escrita (assíncrona, em lotes)
+    # ------------------------------------------------------------------
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="incident-store", daemon=True)
+                self._thread.start()
+
+    def save(self, incident: Incident):
+        """Queues an upsert of the incident's current state."""
+        self._ensure_worker()
+        self._queue.put(_row(incident))
+
+    def _loop(self):
+        conn = self._connect()
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)        # flush(): fecha o lote aqui
+                else:
+                    batch.append(item)
+                if waiters or len(batch) >= WRITE_BATCH:
+                    break
+                try:
+                    item = self._queue.get(timeout=WRITE_WAIT)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(UPSERT, batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                except sqlite3.Error:
+                    logging.exception("Falha ao gravar %d incidentes", len(batch))
+            for w in waiters:
+                w.set()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued so far is committed."""
+        done = threading.Event()
+        self._ensure_worker()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _filters(since: Optional[float], until: Optional[float], severity: Optional[str],
+                 camera: Optional[str]) -> tuple[list[str], list]:
+        where, args = [], []
+        if since is not None:
+            where.append("created >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created < ?")
+            args.append(until)
+        if severity:
+            where.append("severity = ?")
+            args.append(severity.upper())
+        if camera:
+            where.append("camera = ?")
+            args.append(camera)
+        return where, args
+
+    def query(self, limit: int = 50, cursor: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, severity: Optional[str] = None,
+              camera: Optional[str] = None) -> tuple[list[Incident], Optional[str]]:
+        """Newest first. Returns (page, cursor for the next page or None)."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where, args = self._filters(since, until, severity, camera)
+        if cursor:
+            created, _, last_id = cursor.partition(":")
+            where.append("(created < ? OR (created = ? AND id < ?))")
+            args += [float(created), float(created), last_id]
+        sql = "SELECT * FROM incidents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC, id DESC LIMIT ?"
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, (*args, limit + 1)).fetchall()
+        page = [_incident(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last['created']!r}:{last['id']}"
+        return page, next_cursor
+
+    def get(self, incident_id: str) -> Optional[Incident]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+        return _incident(row) if row else None
+
+    def counts(self, since: Optional[float] = None, until: Optional[float] = None,
+               camera: Optional[str] = None) -> dict:
+        where, args = self._filters(since, until, None, camera)
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+        with closing(self._connect()) as conn:
+            by_sev = conn.execute(f"SELECT severity, COUNT(*) FROM incidents{clause} GROUP BY severity", args).fetchall()
+            by_cam = conn.execute(f"SELECT camera, COUNT(*) FROM incidents{clause} GROUP BY camera", args).fetchall()
+        by_severity = {r[0]: r[1] for r in by_sev}
+        return {
+            "total": sum(by_severity.values()),
+            "by_severity": by_severity,
+            "by_camera": {r[0]: r[1] for r in by_cam},
+        }
+
+    def stats(self) -> dict:
+        return {"pending": self._queue.qsize(), "written": self.written, "batches": self.batches}
@@ -0,0 +1,220 @@
+# app/metrics.py
+
+"""
+Lightweight, thread-safe metric primitives shared by the pipeline, and
+their Prometheus text exposition (`REGISTRY.render()`, served on /metrics).
+
+Hot-path timers are labelled HistogramFamily instances (`with
+STAGE_SECONDS.time("encode"): ...`); everything that is already counted
+somewhere else (queue depths, drops, clients) is read at scrape time
+through collectors registered with `REGISTRY.collector()`, so it costs
+nothing between scrapes.
+
+Worker processes ship their histograms with `REGISTRY.export()`; the
+server mirrors them with `REGISTRY.merge({"worker": "0"}, ...)`, so one
+scrape covers every process.
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Iterable
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics: bucket `le` counts values <= le)."""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)    # último = +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def cumulative(self) -> tuple[list[tuple[float, int]], float]:
+        """([(le, cumulative count), ..., (+inf, total)], sum)."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        out, acc = [], 0
+        for le, c in zip(self.buckets + [float("inf")], counts):
+            acc += c
+            out.append((le, acc))
+        return out, total
+
+    def state(self) -> dict:
+        """Raw (non-cumulative) counts, picklable; see `load()`."""
+        with self._lock:
+            return {"buckets": self.buckets, "counts": list(self._counts), "sum": self._sum}
+
+    def load(self, state: dict):
+        """Replaces the counts with a `state()` taken in another process (same buckets)."""
+        with self._lock:
+            self._counts = list(state["counts"])
+            self._sum = state["sum"]
+
+    def snapshot(self) -> dict:
+        buckets, total = self.cumulative()
+        acc = buckets[-1][1]
+        return {
+            "buckets": {_le(le): c for le, c in buckets},
+            "count": acc,
+            "sum": round(total, 3),
+            "avg": round(total / acc, 3) if acc else 0.0,
+        }
+
+def _le(value: float) -> str:
+    return "+Inf" if value == float("inf") else f"{value:g}"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs: dict) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+
+class HistogramFamily:
+    """One Histogram per label combination, created on first use."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: Iterable[float] = STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = list(buckets)
+        self._children: dict[tuple, Histogram] = {}
+        self._remote: dict[tuple, Histogram] = {}      # (labels de origem, valores) -> espelho
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Histogram:
+        hist = self._children.get(values)
+        if hist is None:
+            with self._lock:
+                hist = self._children.setdefault(values, Histogram(self.buckets))
+        return hist
+
+    def observe(self, value: float, *values):
+        self.labels(*values).observe(value)
+
+    def time(self, *values) -> _Timer:
+        """Context manager observing the elapsed seconds."""
+        return _Timer(self.labels(*values))
+
+    def export(self) -> list[tuple[tuple, dict]]:
+        """[(label values, state)] of the local children."""
+        with self._lock:
+            items = list(self._children.items())
+        return [(values, hist.state()) for values, hist in items]
+
+    def merge(self, source: dict, exported: list[tuple[tuple, dict]]):
+        """Mirrors another process's `export()`, exposed with the extra labels `source`."""
+        origin = tuple(source.items())
+        for values, state in exported:
+            key = (origin, tuple(values))
+            hist = self._remote.get(key)
+            if hist is None:
+                with self._lock:
+                    hist = self._remote.setdefault(key, Histogram(self.buckets))
+            hist.load(state)
+
+    def children(self) -> list[tuple[dict, Histogram]]:
+        with self._lock:
+            items = list(self._children.items())
+            remote = list(self._remote.items())
+        out = [(dict(zip(self.label_names, values)), hist) for values, hist in items]
+        out += [({**dict(origin), **dict(zip(self.label_names, values))}, hist)
+                for (origin, values), hist in remote]
+        return out
+
+Sample = tuple[dict, float]     # (labels, valor)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families: list[HistogramFamily] = []
+        self._histograms: list[tuple[str, str, Callable[[], list[tuple[dict, Histogram]]]]] = []
+        self._collectors: list[tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (),
+                  buckets: Iterable[float] = STAGE_BUCKETS) -> HistogramFamily:
+        family = HistogramFamily(name, help, labels, buckets)
+        self._families.append(family)
+        return family
+
+    def export(self) -> dict[str, list]:
+        """Local histograms of every family, by name (sent by the worker processes)."""
+        return {f.name: f.export() for f in self._families}
+
+    def merge(self, source: dict, exported: dict[str, list]):
+        for f in self._families:
+            if f.name in exported:
+                f.merge(source, exported[f.name])
+
+    def register_histograms(self, name: str, help: str, fn: Callable[[], list[tuple[dict, Histogram]]]):
+        """Exposes Histogram instances owned elsewhere (e.g. the scheduler's), read at scrape time."""
+        self._histograms.append((name, help, fn))
+
+    def collector(self, name: str, kind: str, help: str, fn: Callable[[], Iterable[Sample]]):
+        """`kind` is "gauge" or "counter"; `fn()` yields (labels, value) when /metrics is scraped."""
+        self._collectors.append((name, kind, help, fn))
+
+    @staticmethod
+    def _histogram_lines(name: str, help: str, children: list[tuple[dict, Histogram]]) -> list[str]:
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        for labels, hist in children:
+            buckets, total = hist.cumulative()
+            for le, c in buckets:
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': _le(le)})} {c}")
+            lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_labels(labels)} {buckets[-1][1]}")
+        return lines
+
+    def render(self) -> str:
+        """Prometheus text format 0.0.4."""
+        lines: list[str] = []
+        for f in self._families:
+            lines += self._histogram_lines(f.name, f.help, f.children())
+        for name, help, fn in self._histograms:
+            lines += self._histogram_lines(name, help, fn())
+        for name, kind, help, fn in self._collectors:
+            try:
+                samples = list(fn())
+            except Exception as e:      # uma fonte quebrada não derruba o scrape inteiro
+                lines.append(f"# {name} collector failed: {_escape(e)}")
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_labels(labels)} {float(value)!r}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "skynet_stage_seconds", "Latency of each per-stream pipeline stage.", ("stage",))
+MODEL_SECONDS = REGISTRY.histogram(
+    "skynet_model_seconds", "Detector latency per model and phase (preprocess/infer/postprocess).",
+    ("model", "phase"))
+ALERT_SECONDS = REGISTRY.histogram(
+    "skynet_alert_send_seconds", "Duration of each Telegram/Millis delivery attempt.",
+    ("channel", "result"))
@@ -0,0 +1,145 @@
+# app/model_registry.py
+
+"""
+Lazy model registry.
+
+Models are loaded on first `get()`, not at import time. Entries with an
+`idle_ttl` are unloaded by a background reaper once unused for that long,
+and `warmup()` loads and exercises models on a background thread so the
+server can accept connections immediately.
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+class ModelEntry:
+    def __init__(self, name: str, path: str, idle_ttl: Optional[float]):
+        self.name = name
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.model: Any = None
+        self.state = "unloaded"         # unloaded | loading | ready | error
+        self.error = ""
+        self.load_seconds = 0.0
+        self.loaded_at = 0.0
+        self.last_used = 0.0
+        self.loads = 0
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": self.loaded_at,
+            "idle_seconds": round(time.time() - self.last_used, 1) if self.last_used else None,
+            "idle_ttl": self.idle_ttl,
+            "loads": self.loads,
+            "memory_mb": round(self.nbytes / 2**20, 2),
+        }
+
+def model_nbytes(model: Any) -> int:
+    """Parameter + buffer bytes of the underlying torch module, when there is one."""
+    own = getattr(model, "nbytes", None)
+    if callable(own):
+        return own()
+    module = getattr(model, "model", model)
+    total = 0
+    for attr in ("parameters", "buffers"):
+        fn = getattr(module, attr, None)
+        if callable(fn):
+            try:
+                total += sum(t.numel() * t.element_size() for t in fn())
+            except TypeError:
+                pass
+    return total
+
+class ModelRegistry:
+    def __init__(self, loader: Callable[[str], Any], on_unload: Optional[Callable[[], None]] = None):
+        self._loader = loader
+        self._on_unload = on_unload
+        self._entries: dict[str, ModelEntry] = {}
+        self._reaper: Optional[threading.Thread] = None
+
+    def register(self, name: str, path: str, idle_ttl: Optional[float] = None):
+        self._entries[name] = ModelEntry(name, path, idle_ttl)
+
+    def entry(self, name: str) -> ModelEntry:
+        return self._entries[name]
+
+    def get(self, name: str) -> Any:
+        e = self._entries[name]
+        e.last_used = time.time()
+        model = e.model
+        if model is not None:
+            return model
+        with e.lock:
+            if e.model is None:
+                self._load(e)
+            return e.model
+
+    def _load(self, e: ModelEntry):
+        e.state, e.error = "loading", ""
+        t0 = time.perf_counter()
+        try:
+            model = self._loader(e.path)
+        except Exception as exc:
+            e.state, e.error = "error", str(exc)
+            logging.exception("Falha ao carregar %s", e.path)
+            raise
+        e.load_seconds = time.perf_counter() - t0
+        e.loaded_at = e.last_used = time.time()
+        e.nbytes = model_nbytes(model)
+        e.loads += 1
+        e.model, e.state = model, "ready"
+
+    def unload(self, name: str) -> bool:
+        e = self._entries[name]
+        with e.lock:
+            if e.model is None:
+                return False
+            e.model, e.state, e.nbytes = None, "unloaded", 0
+        if self._on_unload:
+            self._on_unload()
+        logging.info("Modelo %s descarregado", name)
+        return True
+
+    def warmup(self, names: Iterable[str], exercise: Optional[Callable[[str, Any], None]] = None) -> threading.Thread:
+        """Loads (and optionally runs a dummy batch through) `names` on a background thread."""
+        names = list(names)
+
+        def _run():
+            for name in names:
+                try:
+                    model = self.get(name)
+                    if exercise:
+                        exercise(name, model)
+                except Exception:
+                    logging.exception("Warm-up de %s falhou", name)
+
+        t = threading.Thread(target=_run, name="model-warmup", daemon=True)
+        t.start()
+        return t
+
+    def start_reaper(self, interval: float = 30.0):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                now = time.time()
+                for e in list(self._entries.values()):
+                    if e.idle_ttl and e.model is not None and now - e.last_used > e.idle_ttl:
+                        self.unload(e.name)
+
+        self._reaper = threading.Thread(target=_run, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def status(self) -> list[dict]:
+        return [e.status() for e in self._entries.values()]
@@ -0,0 +1,100 @@
+# app/motion.py
+
+"""
+Motion gate in front of MODEL1.
+
+Each frame is downscaled to a small grayscale image and compared with a
+running-average background. If the fraction of changed pixels is below
+`threshold`, the frame skips YOLO; a keep-alive still lets one frame
+through every `keepalive` seconds so slow-developing events get sampled.
+With `roi=True` the gate also returns the bounding box of the moving
+area so inference can run on that crop only.
+"""
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+MOTION_WIDTH     = 160      # largura da imagem de análise
+MOTION_THRESHOLD = 0.005    # fração de pixels alterados p/ considerar movimento
+PIXEL_DELTA      = 25       # diferença mínima (0-255) para um pixel contar
+BG_ALPHA         = 0.05     # velocidade de adaptação do fundo
+KEEPALIVE_SEC    = 1.0
+ROI_PAD          = 0.10     # folga em volta da região em movimento
+ROI_MIN_FRACTION = 0.6      # ROI maior que isso do frame => usa o frame inteiro
+
+class MotionGate:
+    def __init__(self, threshold: float = MOTION_THRESHOLD, keepalive: float = KEEPALIVE_SEC,
+                 roi: bool = False, width: int = MOTION_WIDTH):
+        self.threshold = threshold
+        self.keepalive = keepalive
+        self.roi = roi
+        self.width = width
+        self._bg: Optional[np.ndarray] = None
+        self._last_run = float("-inf")
+        self.energy = 0.0
+        self.processed = 0
+        self.skipped = 0
+        self.keepalives = 0
+        self.roi_frames = 0
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, h * self.width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame: np.ndarray, now: float) -> tuple[bool, Optional[tuple[int, int, int, int]]]:
+        """Returns (run inference?, ROI in frame coordinates or None for the full frame)."""
+        gray = self._prepare(frame)
+        if self._bg is None or self._bg.shape != gray.shape:
+            self._bg = gray.astype(np.float32)
+            self._last_run = now
+            self.processed += 1
+            return True, None
+
+        mask = cv2.absdiff(gray, cv2.convertScaleAbs(self._bg)) > PIXEL_DELTA
+        cv2.accumulateWeighted(gray, self._bg, BG_ALPHA)
+        self.energy = float(mask.mean())
+
+        if self.energy < self.threshold:
+            if now - self._last_run < self.keepalive:
+                self.skipped += 1
+                return False, None
+            self.keepalives += 1
+            self._last_run = now
+            self.processed += 1
+            return True, None
+
+        self._last_run = now
+        self.processed += 1
+        return True, self._roi(mask, frame.shape) if self.roi else None
+
+    def _roi(self, mask: np.ndarray, shape: tuple) -> Optional[tuple[int, int, int, int]]:
+        ys, xs = np.nonzero(mask)
+        if not len(xs):
+            return None
+        mh, mw = mask.shape
+        h, w = shape[:2]
+        sx, sy = w / mw, h / mh
+        x1, x2 = xs.min() * sx, (xs.max() + 1) * sx
+        y1, y2 = ys.min() * sy, (ys.max() + 1) * sy
+        px, py = (x2 - x1) * ROI_PAD, (y2 - y1) * ROI_PAD
+        x1, y1 = max(0, int(x1 - px)), max(0, int(y1 - py))
+        x2, y2 = min(w, int(x2 + px)), min(h, int(y2 + py))
+        if (x2 - x1) * (y2 - y1) >= ROI_MIN_FRACTION * w * h:
+            return None
+        self.roi_frames += 1
+        return x1, y1, x2, y2
+
+    def stats(self) -> dict:
+        total = self.processed + self.skipped
+        return {
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "keepalives": self.keepalives,
+            "roi_frames": self.roi_frames,
+            "skip_ratio": round(self.skipped / total, 3) if total else 0.0,
+            "energy": round(self.energy, 4),
+        }
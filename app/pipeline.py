@@ -0,0 +1,107 @@
+# app/pipeline.py
+
+"""
+Per-stream stages shared by the in-process detection loop (main_fastapi)
+and the worker processes (app/workers.py): the capture stage, MODEL1
+behind the motion gate, the tracker step that runs MODEL1 only every
+`infer_every` frames and propagates boxes in between, and the MJPEG
+preview (boxes drawn, one multipart part per preview profile).
+"""
+
+import time
+import queue
+import logging
+from threading import Event
+
+import cv2
+import numpy as np
+
+from app.detection import run_all_models
+from app.metrics import STAGE_SECONDS
+from app.preview import PreviewProfile, encode_jpeg, multipart_part, resize_for
+from app.streams import StreamState
+
+def capture_stage(stream: StreamState, cap, stop: Event):
+    """Decodes continuously, keeps the pre-event buffer and feeds inference per the frame policy."""
+    idx = 0
+    start = time.monotonic()
+    while not stop.is_set():
+        with STAGE_SECONDS.time("capture"):
+            frame, stored = stream.frame_buffer.read_from(cap)
+        if frame is None:
+            logging.error("Error: Cannot read frame from %s.", stream.id)
+            break
+
+        if stream.recorder is not None:
+            stream.recorder.write(stored)
+        stream.frames_captured += 1
+        if stream.policy.admit(idx):
+            item = (frame, time.monotonic(), cap.position)
+            while not stop.is_set():
+                try:
+                    stream.infer_queue.put(item, block=stream.policy.block, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+        else:
+            stream.frames_skipped += 1
+        idx += 1
+
+        if not cap.live:   # arquivo: simula tempo real pelo timestamp de mídia
+            delay = start + cap.position - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                start = time.monotonic() - cap.position
+    stream.infer_queue.put(None)  # fim de fluxo nunca bloqueia
+
+def gated_inference(stream: StreamState, frame, now: float) -> dict:
+    """MODEL1 only when the motion gate lets the frame through (optionally on the moving ROI)."""
+    if stream.motion is None:
+        return run_all_models(frame, stream.id)
+    run, roi = stream.motion.check(frame, now)
+    if not run:
+        return {"model1": [], "model2": [], "model3": []}
+    if roi is None:
+        return run_all_models(frame, stream.id)
+    x1, y1, x2, y2 = roi
+    results = run_all_models(frame[y1:y2, x1:x2], stream.id)
+    for det in results["model1"]:
+        bx1, by1, bx2, by2 = det["box"]
+        det["box"] = (bx1 + x1, by1 + y1, bx2 + x1, by2 + y1)
+    return results
+
+def track_frame(stream: StreamState, frame, media_t: float, now: float, frame_idx: int) -> tuple[list[dict], bool]:
+    """
+    MODEL1 + tracker update every `infer_every` frames, tracker propagation
+    on the others. Returns (tracks, inferred).
+    """
+    if frame_idx % stream.infer_every:
+        stream.frames_propagated += 1
+        return stream.objects.predict(media_t), False
+    with STAGE_SECONDS.time("inference"):     # inclui a espera pelo lote no scheduler
+        results = gated_inference(stream, frame, now)
+    return stream.objects.update(results.get("model1", []), media_t), True
+
+def draw_tracks(frame: np.ndarray, tracks: list[dict]) -> np.ndarray:
+    """Copy of `frame` with the track boxes and ids (the frame itself is a ring view: never drawn on)."""
+    preview = frame.copy()
+    for det in tracks:
+        x1, y1, x2, y2 = det["box"]
+        cv2.rectangle(preview, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        cv2.putText(preview, f"#{det['track_id']}", (x1, max(12, y1 - 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    return preview
+
+def encode_preview(frame: np.ndarray, profiles: list[PreviewProfile]) -> list[tuple[PreviewProfile, bytes]]:
+    """One multipart part per profile; one resize per width, shared between qualities."""
+    parts = []
+    resized = {}
+    for profile in profiles:
+        with STAGE_SECONDS.time("encode"):
+            if profile.width not in resized:
+                resized[profile.width] = resize_for(frame, profile.width)
+            jpeg = encode_jpeg(resized[profile.width], profile.quality)
+        if jpeg is not None:
+            parts.append((profile, multipart_part(jpeg)))
+    return parts
@@ -0,0 +1,97 @@
+# app/preprocess.py
+
+"""
+Batch preprocessing for MODEL1.
+
+Frames are letterboxed straight into a pre-allocated uint8 NHWC staging
+buffer (pinned when CUDA is available) with cv2.resize writing into the
+destination view. BGR->RGB, HWC->CHW and the 1/255 scaling are then done in
+one vectorized pass into a pre-allocated NCHW tensor that is fed to the
+model as-is. `LetterboxMeta` maps the predicted boxes back to source
+coordinates.
+"""
+
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+import torch
+
+PAD_VALUE = 114     # mesmo cinza do letterbox do ultralytics
+
+@dataclass
+class LetterboxMeta:
+    scale: float
+    pad_x: int
+    pad_y: int
+    src_w: int
+    src_h: int
+
+    def to_source(self, xyxy: np.ndarray) -> np.ndarray:
+        """(K, 4) boxes in letterbox space -> int boxes clipped to the source frame."""
+        out = np.asarray(xyxy, dtype=np.float32).copy()
+        xs, ys = out[:, 0::2], out[:, 1::2]     # views: (x1, x2) e (y1, y2)
+        xs -= self.pad_x
+        ys -= self.pad_y
+        out /= self.scale
+        np.clip(xs, 0, self.src_w - 1, out=xs)
+        np.clip(ys, 0, self.src_h - 1, out=ys)
+        return out.astype(np.int32)
+
+class LetterboxBatcher:
+    """
+    Reusable (max_batch, 3, size, size) input tensor. Grows only if a batch
+    larger than `max_batch` shows up; steady state allocates nothing.
+    """
+
+    def __init__(self, size: int, max_batch: int, device: str = "cpu", half: bool = False):
+        if size % 32:
+            raise ValueError("Letterbox size must be a multiple of the model stride (32)")
+        self.size = size
+        self.device = device
+        self.dtype = torch.float16 if half else torch.float32
+        self._allocate(max_batch)
+
+    def _allocate(self, max_batch: int):
+        pin = self.device != "cpu" and torch.cuda.is_available()
+        self.max_batch = max_batch
+        self._host = torch.full((max_batch, self.size, self.size, 3), PAD_VALUE,
+                                dtype=torch.uint8, pin_memory=pin)
+        self._host_np = self._host.numpy()          # mesma memória: cv2 escreve direto aqui
+        self._input = torch.empty((max_batch, 3, self.size, self.size),
+                                  dtype=self.dtype, device=self.device)
+
+    def _letterbox_into(self, canvas: np.ndarray, frame: np.ndarray) -> LetterboxMeta:
+        h, w = frame.shape[:2]
+        s = self.size
+        r = min(s / h, s / w)
+        nw, nh = max(1, round(w * r)), max(1, round(h * r))
+        left, top = (s - nw) // 2, (s - nh) // 2
+        # só as bordas precisam ser repintadas: o miolo é sobrescrito pelo resize
+        canvas[:top] = PAD_VALUE
+        canvas[top + nh:] = PAD_VALUE
+        canvas[top:top + nh, :left] = PAD_VALUE
+        canvas[top:top + nh, left + nw:] = PAD_VALUE
+        dst = canvas[top:top + nh, left:left + nw]
+        if (nw, nh) == (w, h):
+            dst[...] = frame
+        else:
+            cv2.resize(frame, (nw, nh), dst=dst,
+                       interpolation=cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR)
+        return LetterboxMeta(r, left, top, w, h)
+
+    def __call__(self, frames_bgr: list[np.ndarray]) -> tuple[torch.Tensor, list[LetterboxMeta]]:
+        n = len(frames_bgr)
+        if n > self.max_batch:
+            self._allocate(n)
+        metas = [self._letterbox_into(self._host_np[i], f) for i, f in enumerate(frames_bgr)]
+
+        src = self._host[:n]
+        if self.device != "cpu":
+            src = src.to(self.device, non_blocking=True)
+        dst = self._input[:n]
+        # BGR(NHWC) -> RGB(NCHW) + conversão de dtype numa única cópia por canal
+        for c in range(3):
+            dst[:, c].copy_(src[..., 2 - c])
+        dst.mul_(1.0 / 255.0)
+        return dst, metas
@@ -0,0 +1,92 @@
+# app/preview.py
+
+"""
+MJPEG preview encoding.
+
+Each /video_feed client asks for a PreviewProfile (width, JPEG quality,
+max fps). The encode stage encodes every frame once per distinct profile
+that has viewers and is due, and the resulting multipart part is shared by
+all clients on that profile.
+
+PyTurboJPEG is used when the library can be loaded; otherwise cv2.imencode.
+"""
+
+import logging
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+DEFAULT_QUALITY = 80
+MIN_QUALITY     = 10
+MAX_QUALITY     = 95
+MIN_WIDTH       = 160
+MAX_FPS         = 30.0
+
+try:
+    from turbojpeg import TurboJPEG
+    _turbo = TurboJPEG()
+except Exception:           # pacote ausente ou libturbojpeg não encontrada
+    _turbo = None
+
+ENCODER = "turbojpeg" if _turbo is not None else "opencv"
+
+class PreviewProfile(NamedTuple):
+    width: int = 0              # 0 = resolução da fonte
+    quality: int = DEFAULT_QUALITY
+    max_fps: float = 0.0        # 0 = todo frame que chegar ao encoder
+
+    @classmethod
+    def clamp(cls, width: int = 0, quality: int = DEFAULT_QUALITY, max_fps: float = 0.0) -> "PreviewProfile":
+        width = 0 if width <= 0 else max(MIN_WIDTH, width)
+        quality = min(MAX_QUALITY, max(MIN_QUALITY, quality))
+        max_fps = 0.0 if max_fps <= 0 else min(MAX_FPS, float(max_fps))
+        return cls(width, quality, max_fps)
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.max_fps if self.max_fps else 0.0
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+DEFAULT_PROFILE = PreviewProfile()
+
+class PreviewSchedule:
+    """Next due time per profile, so each profile is encoded at most at its max_fps."""
+
+    def __init__(self):
+        self._next_due: dict[PreviewProfile, float] = {}
+
+    def due(self, profiles, now: float) -> list[PreviewProfile]:
+        """Profiles among `profiles` that may get another frame at `now` (monotonic)."""
+        due = []
+        for profile in profiles:
+            if now >= self._next_due.get(profile, 0.0):
+                self._next_due[profile] = now + profile.interval
+                due.append(profile)
+        return due
+
+    def discard(self, profile: PreviewProfile):
+        self._next_due.pop(profile, None)
+
+def resize_for(frame: np.ndarray, width: int) -> np.ndarray:
+    h, w = frame.shape[:2]
+    if not width or width >= w:
+        return frame
+    return cv2.resize(frame, (width, max(1, h * width // w)), interpolation=cv2.INTER_AREA)
+
+def encode_jpeg(frame: np.ndarray, quality: int) -> Optional[bytes | np.ndarray]:
+    """JPEG bytes (TurboJPEG) or the uint8 buffer from cv2; both support the buffer protocol."""
+    if _turbo is not None:
+        try:
+            return _turbo.encode(frame, quality=quality)
+        except Exception:
+            logging.exception("TurboJPEG falhou; usando cv2.imencode")
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf if ok else None
+
+def multipart_part(jpeg) -> bytes:
+    """One multipart/x-mixed-replace part, built with a single copy of the JPEG data."""
+    header = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpeg)
+    return b"".join((header, jpeg, b"\r\n"))
@@ -0,0 +1,143 @@
+# app/profiler.py
+
+"""
+Opt-in sampling profiler for live boxes.
+
+Nothing runs until `start(seconds)` is called (POST /profile). A daemon
+thread then snapshots every Python thread's stack with
+`sys._current_frames()` each `interval_ms` and, when the time is up (or on
+`stop()`), writes the aggregated stacks in the folded format
+("thread;file:func;file:func count" per line) to PROFILE_DIR. The file
+loads directly in speedscope or `flamegraph.pl`.
+
+Unless `include_idle` is set, a thread is only recorded if it used CPU
+since the previous sample (per-thread CPU clocks, Linux) and isn't parked
+in a known blocking wait, so the profile shows where CPU goes rather than
+where threads sleep.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+PROFILE_DIR         = os.getenv("PROFILE_DIR", ".profiles")
+PROFILE_MAX_SECONDS = 600
+PROFILE_INTERVAL_MS = 5.0
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("queue.py", "get"),
+}
+
+def _cpu_time(tid: int) -> Optional[float]:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(tid))
+    except (AttributeError, OSError):
+        return None
+
+def _frame_name(frame) -> str:
+    co = frame.f_code
+    return f"{os.path.basename(co.co_filename)}:{co.co_name}"
+
+class SamplingProfiler:
+    def __init__(self, out_dir: str = PROFILE_DIR):
+        self.out_dir = out_dir
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.started = 0.0
+        self.seconds = 0.0
+        self.samples = 0
+        self.last_file: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval_ms: float = PROFILE_INTERVAL_MS,
+              include_idle: bool = False) -> str:
+        """Starts a profile of `seconds`; returns the name of the file it will write."""
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ValueError(f"seconds must be in (0, {PROFILE_MAX_SECONDS}]")
+        if interval_ms < 1:
+            raise ValueError("interval_ms must be >= 1")
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already running")
+            os.makedirs(self.out_dir, exist_ok=True)
+            name = f"profile_{datetime.now():%Y%m%d-%H%M%S}.folded"
+            self._stop.clear()
+            self.started, self.seconds, self.samples = time.time(), seconds, 0
+            self._thread = threading.Thread(
+                target=self._run, args=(name, seconds, interval_ms / 1000, include_idle),
+                name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logging.info("Profiler: amostrando por %.0fs a cada %.0fms -> %s", seconds, interval_ms, name)
+        return name
+
+    def stop(self, timeout: float = 5.0):
+        """Ends the current profile early; the file is still written."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, name: str, seconds: float, interval: float, include_idle: bool):
+        stacks: Counter = Counter()
+        cpu: dict[int, Optional[float]] = {}
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if not include_idle:
+                    used, cpu[tid] = cpu.get(tid), _cpu_time(tid)
+                    if cpu[tid] is not None and (used is None or cpu[tid] <= used):
+                        continue        # sem CPU desde a última amostra
+                    if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES:
+                        continue
+                parts = []
+                while frame is not None:
+                    parts.append(_frame_name(frame))
+                    frame = frame.f_back
+                parts.append(names.get(tid, str(tid)).replace(";", "_"))
+                stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+            self._stop.wait(interval)
+
+        path = os.path.join(self.out_dir, name)
+        with open(path + ".tmp", "w") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in stacks.most_common())
+        os.replace(path + ".tmp", path)
+        self.last_file = name
+        logging.info("Profiler: %d amostras, %d pilhas distintas em %s", self.samples, len(stacks), path)
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a profile written earlier; None for unknown or unsafe names."""
+        if name != os.path.basename(name) or not name.endswith(".folded"):
+            return None
+        path = os.path.join(self.out_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def stats(self) -> dict:
+        try:
+            files = sorted(n for n in os.listdir(self.out_dir) if n.endswith(".folded"))
+        except FileNotFoundError:
+            files = []
+        return {
+            "running": self.running,
+            "started": self.started or None,
+            "seconds": self.seconds,
+            "samples": self.samples,
+            "last_file": self.last_file,
+            "files": files,
+        }
+
+profiler = SamplingProfiler()
@@ -0,0 +1,337 @@
+# app/retention.py
+
+"""
+Clip retention for `video_save_path`.
+
+A background thread enforces, in order:
+
+1. max age: clips older than `max_age` seconds are deleted;
+2. compaction: clips older than `compact_after` are either re-encoded at a
+   lower bitrate ("transcode", saved as `<name>_lq.mp4`) or reduced to a
+   strip of thumbnails ("thumbnail", saved as `<name>_thumb.jpg`);
+3. quota: while the directory holds more than `max_bytes`, clips are
+   evicted oldest first, MILD before untagged before HIGH.
+
+Severity is taken from the file name (`..._HIGH.mp4` / `..._MILD.mp4`).
+The startup index is one `os.scandir` pass on the background thread (no
+per-file probing), so it stays cheap with very large directories. New
+clips are added with `add()` as they're written; after `move_root()`, a
+clip that lands in the old directory is moved into the new one there.
+"""
+
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Optional
+
+import cv2
+import numpy as np
+
+CLIP_MAX_BYTES     = int(float(os.getenv("CLIP_MAX_GB", "10")) * 2**30)
+CLIP_MAX_AGE       = float(os.getenv("CLIP_MAX_AGE_DAYS", "0")) * 86400      # 0 = sem limite de idade
+CLIP_COMPACT_AFTER = float(os.getenv("CLIP_COMPACT_AFTER_DAYS", "7")) * 86400
+CLIP_COMPACT_MODE  = os.getenv("CLIP_COMPACT_MODE", "none")     # none | transcode | thumbnail
+COMPACT_MODES      = ("none", "transcode", "thumbnail")
+SWEEP_INTERVAL     = 60.0
+COMPACT_PER_SWEEP  = 5          # recodificações por ciclo (não monopoliza a CPU)
+THUMB_COUNT        = 6
+THUMB_HEIGHT       = 120
+
+CLIP_RE = re.compile(r"^violent_clip_.*?(?:_(HIGH|MILD))?(_lq\.mp4|_thumb\.jpg|\.mp4)$")
+EVICT_RANK = {"MILD": 0, None: 1, "HIGH": 2}
+
+class Clip:
+    __slots__ = ("name", "size", "mtime", "severity", "kind")
+
+    def __init__(self, name: str, size: int, mtime: float, severity: Optional[str], kind: str):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.severity = severity
+        self.kind = kind        # mp4 | lq | thumb
+
+def parse_clip_name(name: str) -> Optional[tuple[Optional[str], str]]:
+    """(severity, kind) for clip file names, None for anything else."""
+    m = CLIP_RE.match(name)
+    if not m:
+        return None
+    kind = {"_lq.mp4": "lq", "_thumb.jpg": "thumb"}.get(m.group(2), "mp4")
+    return m.group(1), kind
+
+def clip_stem(name: str) -> str:
+    for suffix in ("_lq.mp4", "_thumb.jpg", ".mp4"):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+class RetentionManager:
+    def __init__(self, root: str, max_bytes: int = CLIP_MAX_BYTES, max_age: float = CLIP_MAX_AGE,
+                 compact_after: float = CLIP_COMPACT_AFTER, compact_mode: str = CLIP_COMPACT_MODE,
+                 interval: float = SWEEP_INTERVAL):
+        if compact_mode not in COMPACT_MODES:
+            raise ValueError(f"Unknown compact mode {compact_mode!r}; expected one of {COMPACT_MODES}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compact_after = compact_after
+        self.compact_mode = compact_mode
+        self.interval = interval
+        self._clips: dict[str, Clip] = {}
+        self._bytes = 0             # soma de `size` do índice, mantida incrementalmente
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.indexed = False
+        self.evicted = 0
+        self.expired = 0
+        self.compacted = 0
+        self.migrated = 0
+        self._old_roots: set[str] = set()   # clipes que ainda chegarem lá são trazidos para `root`
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+    def _scan(self):
+        clips = {}
+        with os.scandir(self.root) as it:
+            for entry in it:
+                parsed = parse_clip_name(entry.name)
+                if parsed is None or not entry.is_file():
+                    continue
+                st = entry.stat()
+                clips[entry.name] = Clip(entry.name, st.st_size, st.st_mtime, *parsed)
+        with self._lock:
+            clips.update(self._clips)       # add() durante o scan prevalece
+            self._clips = clips
+            self._bytes = sum(c.size for c in clips.values())
+        self.indexed = True
+        logging.info("Retenção: %d clipes indexados em %s", len(clips), self.root)
+
+    def add(self, path: str) -> str:
+        """
+        Registers a freshly written clip and returns the path it's indexed
+        under. A clip finished in a previous root (its writer started before
+        `move_root`) is moved into the current one first.
+        """
+        name = os.path.basename(path)
+        parsed = parse_clip_name(name)
+        if parsed is None:
+            logging.warning("Retenção: %s não é um clipe; não indexado", path)
+            return path
+        directory = os.path.dirname(os.path.abspath(path))
+        if directory != os.path.abspath(self.root):
+            if directory not in self._old_roots:
+                logging.warning("Retenção: %s está fora de %s; não indexado", path, self.root)
+                return path
+            try:
+                path = self._move_in(path)
+            except OSError:
+                logging.exception("Falha ao mover %s", name)
+                return path
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            logging.warning("Retenção: %s não existe; não indexado", path)
+            return path
+        with self._lock:
+            old = self._clips.get(name)
+            self._bytes += st.st_size - (old.size if old else 0)
+            self._clips[name] = Clip(name, st.st_size, st.st_mtime, *parsed)
+            over = self._bytes > self.max_bytes
+        if over:
+            self._wake.set()
+        return path
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Current file for a clip path recorded earlier (may have moved or been compacted)."""
+        stem = clip_stem(os.path.basename(path))
+        for suffix in (".mp4", "_lq.mp4", "_thumb.jpg"):
+            candidate = os.path.join(self.root, stem + suffix)
+            if os.path.isfile(candidate):
+                return candidate
+        return path if os.path.isfile(path) else None
+
+    # ------------------------------------------------------------------
+    # Ciclo
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="clip-retention", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                if not self.indexed:
+                    os.makedirs(self.root, exist_ok=True)
+                    self._scan()
+                self.sweep()
+            except Exception:
+                logging.exception("Ciclo de retenção falhou")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sweep(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            clips = sorted(self._clips.values(), key=lambda c: c.mtime)
+        for clip in clips:
+            if self.max_age and now - clip.mtime > self.max_age:
+                self._delete(clip)
+                self.expired += 1
+        if self.compact_mode != "none" and self.compact_after:
+            pending = [c for c in clips if c.kind == "mp4" and now - c.mtime > self.compact_after
+                       and c.name in self._clips]
+            for clip in pending[:COMPACT_PER_SWEEP]:
+                self._compact(clip)
+        self._enforce_quota()
+
+    def _enforce_quota(self):
+        with self._lock:
+            total = self._bytes
+            if total <= self.max_bytes:
+                return
+            victims = sorted(self._clips.values(), key=lambda c: (EVICT_RANK[c.severity], c.mtime))
+        for clip in victims:
+            if total <= self.max_bytes:
+                break
+            total -= clip.size
+            self._delete(clip)
+            self.evicted += 1
+
+    def _delete(self, clip: Clip):
+        try:
+            os.remove(os.path.join(self.root, clip.name))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if self._clips.pop(clip.name, None) is not None:
+                self._bytes -= clip.size
+
+    # ------------------------------------------------------------------
+    # Compactação
+    # ------------------------------------------------------------------
+    def _compact(self, clip: Clip):
+        src = os.path.join(self.root, clip.name)
+        stem = clip_stem(clip.name)
+        if self.compact_mode == "transcode":
+            dst = os.path.join(self.root, stem + "_lq.mp4")
+            ok = transcode_low(src, dst)
+        else:
+            dst = os.path.join(self.root, stem + "_thumb.jpg")
+            ok = thumbnail_strip(src, dst)
+        if not ok:
+            logging.warning("Compactação de %s falhou; mantendo o original", clip.name)
+            return
+        os.utime(dst, (clip.mtime, clip.mtime))     # idade continua sendo a do clipe
+        self._delete(clip)
+        self.add(dst)
+        self.compacted += 1
+
+    # ------------------------------------------------------------------
+    # Mudança de diretório
+    # ------------------------------------------------------------------
+    def move_root(self, new_root: str):
+        """Points retention at `new_root` and moves the indexed clips there in the background."""
+        old_root = self.root
+        if os.path.abspath(new_root) == os.path.abspath(old_root):
+            return
+        os.makedirs(new_root, exist_ok=True)
+        with self._lock:
+            names = list(self._clips)
+            self._clips, self._bytes = {}, 0
+            self._old_roots.add(os.path.abspath(old_root))
+            self._old_roots.discard(os.path.abspath(new_root))
+            self.root = new_root
+            self.indexed = False
+
+        def _move():
+            for name in names:
+                try:
+                    self._move_in(os.path.join(old_root, name))
+                except OSError:
+                    logging.exception("Falha ao mover %s", name)
+            self._scan()        # reindexa o novo diretório já completo
+
+        threading.Thread(target=_move, name="clip-migrate", daemon=True).start()
+
+    def _move_in(self, path: str) -> str:
+        dst = os.path.join(self.root, os.path.basename(path))
+        shutil.move(path, dst)
+        self.migrated += 1
+        return dst
+
+    def stats(self) -> dict:
+        with self._lock:
+            clips = list(self._clips.values())
+        by_severity: dict[str, dict] = {}
+        for c in clips:
+            s = by_severity.setdefault(c.severity or "UNKNOWN", {"clips": 0, "bytes": 0})
+            s["clips"] += 1
+            s["bytes"] += c.size
+        try:
+            disk = shutil.disk_usage(self.root)
+            disk_info = {"total": disk.total, "used": disk.used, "free": disk.free}
+        except OSError:
+            disk_info = {}
+        return {
+            "root": self.root,
+            "indexed": self.indexed,
+            "clips": len(clips),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "by_severity": by_severity,
+            "compact_mode": self.compact_mode,
+            "compacted_clips": sum(c.kind != "mp4" for c in clips),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "compacted": self.compacted,
+            "migrated": self.migrated,
+            "disk": disk_info,
+        }
+
+def transcode_low(src: str, dst: str) -> bool:
+    """Half resolution, low bitrate. ffmpeg/libx264 when available, OpenCV otherwise."""
+    tmp = dst + ".tmp.mp4"
+    if shutil.which("ffmpeg"):
+        cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", src, "-vf", "scale=trunc(iw/4)*2:-2",
+               "-c:v", "libx264", "-preset", "veryfast", "-crf", "32", "-an", tmp]
+        if subprocess.run(cmd, capture_output=True).returncode == 0:
+            os.replace(tmp, dst)
+            return True
+    cap = cv2.VideoCapture(src)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    vw = None
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        small = cv2.resize(frame, (frame.shape[1] // 2 & ~1, frame.shape[0] // 2 & ~1), interpolation=cv2.INTER_AREA)
+        if vw is None:
+            vw = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*"mp4v"), fps, small.shape[1::-1])
+        vw.write(small)
+    cap.release()
+    if vw is None:
+        return False
+    vw.release()
+    os.replace(tmp, dst)
+    return True
+
+def thumbnail_strip(src: str, dst: str, count: int = THUMB_COUNT, height: int = THUMB_HEIGHT) -> bool:
+    """`count` evenly spaced frames side by side in one JPEG."""
+    cap = cv2.VideoCapture(src)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    thumbs = []
+    for idx in np.linspace(0, max(0, total - 1), count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+        ok, frame = cap.read()
+        if ok:
+            w = max(1, frame.shape[1] * height // frame.shape[0])
+            thumbs.append(cv2.resize(frame, (w, height), interpolation=cv2.INTER_AREA))
+    cap.release()
+    return bool(thumbs) and cv2.imwrite(dst, np.hstack(thumbs))
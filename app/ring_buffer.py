@@ -0,0 +1,170 @@
+# app/ring_buffer.py
+
+"""
+Fixed-size pre-event frame history.
+
+"raw" mode keeps one contiguous (N, H, W, 3) uint8 array allocated up front;
+the decoder writes straight into the next slot, so steady state costs no
+per-frame allocation and resident memory is known when the stream starts.
+"scaled" stores downscaled frames in the same layout, and "jpeg" keeps
+encoded bytes per slot for the smallest footprint.
+
+`latest()` hands out a view into the ring. `snapshot()` copies each frame
+into one scratch frame and re-checks the slot's sequence number after the
+copy, so a frame the decoder recycled before or during the read is skipped
+instead of reaching the clip torn.
+"""
+
+import threading
+from typing import Iterator, Optional
+
+import cv2
+import numpy as np
+
+BUFFER_MODES = ("raw", "scaled", "jpeg")
+
+class FrameRing:
+    def __init__(self, capacity: int, mode: str = "raw", scale: float = 0.5, jpeg_quality: int = 80):
+        if mode not in BUFFER_MODES:
+            raise ValueError(f"Unknown buffer mode {mode!r}; expected one of {BUFFER_MODES}")
+        self.capacity = capacity
+        self.mode = mode
+        self.scale = scale
+        self.jpeg_quality = jpeg_quality
+        self._frames: Optional[np.ndarray] = None                # raw / scaled
+        self._jpegs: list[Optional[np.ndarray]] = [None] * capacity
+        self._seq = np.full(capacity, -1, dtype=np.int64)         # seq gravado em cada slot
+        self._next = 0                                            # próximo seq a escrever
+        self._lock = threading.Lock()
+        self.overwritten = 0                                      # frames perdidos por snapshots atrasados
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def _allocate(self, frame_shape: tuple):
+        h, w = frame_shape[:2]
+        if self.mode == "scaled":
+            h, w = max(1, int(h * self.scale)), max(1, int(w * self.scale))
+        if self.mode != "jpeg":
+            self._frames = np.empty((self.capacity, h, w, 3), dtype=np.uint8)
+
+    @property
+    def slot_shape(self) -> Optional[tuple]:
+        return None if self._frames is None else self._frames.shape[1:]
+
+    def next_slot(self) -> Optional[np.ndarray]:
+        """Slot the decoder may write into directly (raw mode only), then `commit()`."""
+        if self.mode != "raw" or self._frames is None:
+            return None
+        idx = self._next % self.capacity
+        self._seq[idx] = -1     # leitores atrasados pulam o slot enquanto é sobrescrito
+        return self._frames[idx]
+
+    def commit(self) -> np.ndarray:
+        """Publishes the slot returned by `next_slot()` after the decoder filled it."""
+        with self._lock:
+            idx = self._next % self.capacity
+            self._seq[idx] = self._next
+            self._next += 1
+        return self._frames[idx]
+
+    def push(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Stores `frame` (copy/resize/encode per mode) and returns the stored view, if any."""
+        if self.mode != "jpeg" and self._frames is None:
+            self._allocate(frame.shape)
+        idx = self._next % self.capacity
+        self._seq[idx] = -1
+        if self.mode == "jpeg":
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return None
+            self._jpegs[idx] = buf
+            stored = None
+        else:
+            slot = self._frames[idx]
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot, interpolation=cv2.INTER_AREA)
+            stored = slot
+        with self._lock:
+            self._seq[idx] = self._next
+            self._next += 1
+        return stored
+
+    def read_from(self, cap) -> tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Decodes the next frame from `cap` (straight into the ring in raw mode).
+        Returns (frame for inference, stored frame for clips), or (None, None) at EOF.
+        """
+        slot = self.next_slot()
+        ok, frame = cap.read(slot) if slot is not None else cap.read()
+        if not ok or frame is None:
+            return None, None
+        if slot is not None and np.shares_memory(frame, slot):
+            stored = self.commit()
+            return stored, stored
+        stored = self.push(frame)    # 1º frame, resolução nova ou modo scaled/jpeg
+        return frame, stored if stored is not None else frame
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return min(self._next, self.capacity)
+
+    def __bool__(self) -> bool:
+        return self._next > 0
+
+    def latest(self) -> Optional[np.ndarray]:
+        if not self._next:
+            return None
+        return self._load((self._next - 1) % self.capacity)
+
+    def _load(self, idx: int) -> np.ndarray:
+        if self.mode == "jpeg":
+            return cv2.imdecode(self._jpegs[idx], cv2.IMREAD_COLOR)
+        return self._frames[idx]
+
+    def snapshot(self) -> Iterator[np.ndarray]:
+        """
+        Lazy oldest→newest iterator over the frames present right now. The
+        yielded array is reused for the next frame: consume it before advancing.
+        """
+        with self._lock:
+            end = self._next
+        start = max(0, end - self.capacity)
+        return self._iter(start, end)
+
+    def _iter(self, start: int, end: int) -> Iterator[np.ndarray]:
+        scratch: Optional[np.ndarray] = None
+        for seq in range(start, end):
+            idx = seq % self.capacity
+            if self._seq[idx] != seq:
+                self.overwritten += 1
+                continue
+            if self.mode == "jpeg":
+                frame = self._load(idx)
+            else:
+                if scratch is None:
+                    scratch = np.empty_like(self._frames[idx])
+                np.copyto(scratch, self._frames[idx])
+                frame = scratch
+            if self._seq[idx] != seq:   # sobrescrito durante a cópia/decodificação
+                self.overwritten += 1
+                continue
+            yield frame
+
+    def nbytes(self) -> int:
+        if self.mode == "jpeg":
+            return sum(b.nbytes for b in self._jpegs if b is not None)
+        return 0 if self._frames is None else self._frames.nbytes
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "capacity": self.capacity,
+            "frames": len(self),
+            "bytes": self.nbytes(),
+            "overwritten": self.overwritten,
+        }
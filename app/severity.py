@@ -0,0 +1,234 @@
+# app/severity.py
+
+"""
+Severity over a sliding time window of MODEL1 detections.
+
+Timestamps are the media time of the frame the detections came from (see
+`CaptureSource.position`), not the wall clock, so replaying a file faster
+than real time yields the same verdicts.
+
+TrackSeverity scores tracked detections (see app/tracking.py): each track
+is one event, so a fight seen for 20 frames counts once, and a window is
+hot when some track has lasted `track_min_duration` seconds. It drives the
+live loop and batch analysis.
+
+SeverityTracker is incremental: detections are stored per frame as
+(t, count) runs plus a monotonic deque of confidences, so every update and
+query is amortised O(1) and counts are exact (nothing is capped).
+SeverityBank evaluates many streams in one NumPy call with the same
+verdicts (measured per stream against SeverityTracker by app/bench.py).
+"""
+
+from collections import deque
+from typing import Iterable, Optional
+
+import numpy as np
+
+HYPER = dict(
+    mild_threshold          = 0.80,
+    detection_count_thresh  = 20,
+    mild_consecutive_thresh = 5,
+    track_min_duration      = 0.7,      # s; ~detection_count_thresh frames a 30 fps
+)
+
+LEVELS = ("NONE", "MILD", "HIGH")
+
+class SeverityTracker:
+    def __init__(self, window_sec: float):
+        self.win         = window_sec
+        self._frames     = deque()      # (t, nº de detecções no frame)
+        self._peaks      = deque()      # (t, conf) com conf estritamente decrescente
+        self._count      = 0
+        self._now        = 0.0          # maior timestamp visto
+        self.mild_streak = 0
+
+    def add(self, conf: float, t: float):
+        self.add_frame((conf,), t)
+
+    def add_frame(self, confs: Iterable[float], t: float):
+        """All detections of one frame at media time `t` (seconds)."""
+        n = 0
+        peaks = self._peaks
+        for conf in confs:
+            while peaks and peaks[-1][1] <= conf:
+                peaks.pop()
+            peaks.append((t, conf))
+            n += 1
+        if n:
+            self._frames.append((t, n))
+            self._count += n
+        self._expire(t)
+
+    def _expire(self, now: float):
+        self._now = now = max(self._now, now)
+        limit = now - self.win
+        frames, peaks = self._frames, self._peaks
+        while frames and frames[0][0] < limit:
+            self._count -= frames.popleft()[1]
+        while peaks and peaks[0][0] < limit:
+            peaks.popleft()
+
+    def reset(self):
+        self._frames.clear()
+        self._peaks.clear()
+        self._count = 0
+        self._now = 0.0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def severity(self, now: Optional[float] = None) -> dict:
+        """Verdict at media time `now` (defaults to the latest frame added)."""
+        self._expire(self._now if now is None else now)
+        count    = self._count
+        max_conf = self._peaks[0][1] if self._peaks else 0.0
+
+        level = "NONE"
+        if count >= HYPER["detection_count_thresh"]:
+            level = "HIGH" if max_conf >= HYPER["mild_threshold"] else "MILD"
+
+        if level == "MILD":
+            self.mild_streak += 1
+            if self.mild_streak >= HYPER["mild_consecutive_thresh"]:
+                level, self.mild_streak = "HIGH", 0
+        else:
+            self.mild_streak = 0
+
+        return {"level": level, "count": count, "max_confidence": max_conf}
+
+class TrackSeverity:
+    """
+    Same interface as SeverityTracker (`severity()`, `reset()`, `count`;
+    fed by `add_tracks()` instead of `add_frame()`), scoring per track.
+
+    The verdicts differ: `count` is the number of distinct tracks in the
+    window, not of boxes, and a level is raised once some track has lasted
+    `track_min_duration` seconds, whatever the box count. HIGH needs one of
+    those lasting tracks to peak at `mild_threshold`; a brief high-confidence
+    track doesn't count. The MILD-streak escalation is the same, and the
+    result also carries `longest` (s). Both trackers can disagree on the
+    same footage: one long, sparse track fires here but not there.
+    """
+
+    def __init__(self, window_sec: float):
+        self.win         = window_sec
+        self._tracks: dict[int, list] = {}     # track_id -> [1º t, último t, pico de conf]
+        self._now        = 0.0
+        self.mild_streak = 0
+
+    def add_tracks(self, tracks: Iterable[dict], t: float):
+        """Tracks observed in one frame at media time `t` (dicts with track_id/confidence)."""
+        for tr in tracks:
+            state = self._tracks.get(tr["track_id"])
+            if state is None:
+                self._tracks[tr["track_id"]] = [t, t, tr["confidence"]]
+            else:
+                state[1] = t
+                state[2] = max(state[2], tr["confidence"])
+        self._expire(t)
+
+    def _expire(self, now: float):
+        self._now = now = max(self._now, now)
+        limit = now - self.win
+        for tid in [tid for tid, s in self._tracks.items() if s[1] < limit]:
+            del self._tracks[tid]
+
+    def reset(self):
+        self._tracks.clear()
+        self._now = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self._tracks)
+
+    def severity(self, now: Optional[float] = None) -> dict:
+        """Verdict at media time `now` (defaults to the latest frame added)."""
+        self._expire(self._now if now is None else now)
+        tracks = self._tracks.values()
+        max_conf = max((s[2] for s in tracks), default=0.0)
+        lasting = [s[2] for s in tracks if s[1] - s[0] >= HYPER["track_min_duration"]]
+        longest = max((s[1] - s[0] for s in tracks), default=0.0)
+
+        level = "NONE"
+        if lasting:
+            level = "HIGH" if max(lasting) >= HYPER["mild_threshold"] else "MILD"
+
+        if level == "MILD":
+            self.mild_streak += 1
+            if self.mild_streak >= HYPER["mild_consecutive_thresh"]:
+                level, self.mild_streak = "HIGH", 0
+        else:
+            self.mild_streak = 0
+
+        return {"level": level, "count": len(self._tracks), "max_confidence": max_conf,
+                "longest": round(longest, 2)}
+
+class SeverityBank:
+    """
+    Severity for `n_streams` streams at once, with the same verdicts as one
+    SeverityTracker per stream. Each stream keeps its recent frames
+    (per-frame detection count and max confidence) in a ring; `update()`
+    writes one frame per stream and evaluates all windows with array
+    reductions. The ring doubles whenever a write would evict a frame still
+    inside the window, so high fps or long windows never truncate it.
+    """
+
+    def __init__(self, n_streams: int, window_sec: float, capacity: int = 512):
+        self.win = window_sec
+        self.capacity = capacity
+        self.times  = np.full((n_streams, capacity), -np.inf)
+        self.counts = np.zeros((n_streams, capacity), dtype=np.int32)
+        self.peaks  = np.zeros((n_streams, capacity), dtype=np.float64)
+        self.head   = np.zeros(n_streams, dtype=np.int64)
+        self.mild_streak = np.zeros(n_streams, dtype=np.int32)
+
+    def update(self, t: np.ndarray, counts: np.ndarray, max_conf: np.ndarray,
+               active: Optional[np.ndarray] = None) -> dict:
+        """
+        `t`, `counts`, `max_conf`: shape (n_streams,), one frame per stream.
+        Streams with `active == False` are evaluated but not written.
+        Returns arrays: level (0 NONE / 1 MILD / 2 HIGH), count, max_confidence.
+        """
+        rows = np.arange(len(self.head)) if active is None else np.flatnonzero(active)
+        slots = self.head[rows] % self.capacity
+        if (self.times[rows, slots] >= t[rows] - self.win).any():     # despejaria frame da janela
+            self._grow()
+            slots = self.head[rows] % self.capacity
+        self.times[rows, slots] = t[rows]
+        self.counts[rows, slots] = counts[rows]
+        self.peaks[rows, slots] = max_conf[rows]
+        self.head[rows] += 1
+
+        valid = self.times >= (t - self.win)[:, None]
+        count = np.where(valid, self.counts, 0).sum(axis=1)
+        peak = np.where(valid, self.peaks, 0.0).max(axis=1)
+
+        level = np.zeros(len(self.head), dtype=np.int8)
+        hot = count >= HYPER["detection_count_thresh"]
+        level[hot] = np.where(peak[hot] >= HYPER["mild_threshold"], 2, 1)
+
+        mild = level == 1
+        self.mild_streak = np.where(mild, self.mild_streak + 1, 0)
+        promote = mild & (self.mild_streak >= HYPER["mild_consecutive_thresh"])
+        level[promote] = 2
+        self.mild_streak[promote] = 0
+        return {"level": level, "count": count, "max_confidence": peak}
+
+    def _grow(self):
+        """Doubles the ring, unrolling every stream oldest→newest so slot `capacity` is free."""
+        cap = self.capacity
+        order = (self.head[:, None] + np.arange(cap)) % cap
+        for name, fill in (("times", -np.inf), ("counts", 0), ("peaks", 0.0)):
+            old = getattr(self, name)
+            new = np.full((len(old), cap * 2), fill, dtype=old.dtype)
+            new[:, :cap] = np.take_along_axis(old, order, axis=1)
+            setattr(self, name, new)
+        self.head[:] = cap
+        self.capacity = cap * 2
+
+    def reset(self, stream: int):
+        self.times[stream] = -np.inf
+        self.counts[stream] = 0
+        self.peaks[stream] = 0.0
+        self.mild_streak[stream] = 0
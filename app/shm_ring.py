@@ -0,0 +1,130 @@
+# app/shm_ring.py
+
+"""
+Single-producer frame ring in `multiprocessing.shared_memory`.
+
+A worker process writes each processed frame, together with its tracks,
+into the next of `slots` fixed-size slots and tells the server only the
+sequence number; the server maps the same block and copies the slot out,
+so frames never go through pickling or a pipe.
+
+Layout of the block: a header row per slot (seq, media time, capture
+time, track count, inferred flag), then `max_tracks` x 7 float64 per slot
+(x1, y1, x2, y2, confidence, track_id, predicted), then the frames as one
+(slots, H, W, 3) uint8 array. A slot's seq is set to -1 while it is being
+written. The reader checks seq, copies the slot, then checks seq again: a
+reader that fell `slots` frames behind, or was lapped mid-copy, sees the
+mismatch and drops the frame instead of keeping a torn one.
+"""
+
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+RING_SLOTS = 8
+MAX_TRACKS = 64
+TRACK_FIELDS = 7
+
+HEADER = np.dtype([
+    ("seq", "<i8"),
+    ("media_t", "<f8"),
+    ("captured", "<f8"),    # time.monotonic() no worker (relógio do sistema, comum aos processos)
+    ("n", "<i4"),
+    ("inferred", "<i4"),
+])
+
+class ShmFrameRing:
+    def __init__(self, shm: shared_memory.SharedMemory, shape: tuple[int, int], slots: int, owner: bool):
+        self.shm = shm
+        self.name = shm.name
+        self.shape = shape
+        self.slots = slots
+        self.owner = owner
+        h, w = shape
+        hdr_bytes = slots * HEADER.itemsize
+        trk_bytes = slots * MAX_TRACKS * TRACK_FIELDS * 8
+        self.header = np.ndarray((slots,), HEADER, shm.buf, 0)
+        self.tracks = np.ndarray((slots, MAX_TRACKS, TRACK_FIELDS), np.float64, shm.buf, hdr_bytes)
+        self.frames = np.ndarray((slots, h, w, 3), np.uint8, shm.buf, hdr_bytes + trk_bytes)
+        self.written = 0
+        self.torn = 0
+
+    @staticmethod
+    def nbytes(shape: tuple[int, int], slots: int) -> int:
+        h, w = shape
+        return slots * (HEADER.itemsize + MAX_TRACKS * TRACK_FIELDS * 8 + h * w * 3)
+
+    @classmethod
+    def create(cls, shape: tuple[int, int], slots: int = RING_SLOTS) -> "ShmFrameRing":
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(shape, slots))
+        ring = cls(shm, shape, slots, owner=True)
+        ring.header["seq"] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, shape: tuple[int, int], slots: int = RING_SLOTS) -> "ShmFrameRing":
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, owner=False)
+
+    # ------------------------------------------------------------------
+    # Produtor (worker)
+    # ------------------------------------------------------------------
+    def write(self, seq: int, frame: np.ndarray, tracks: list[dict], media_t: float,
+              captured: float, inferred: bool):
+        idx = seq % self.slots
+        hdr = self.header[idx:idx + 1]      # view: escreve direto no bloco compartilhado
+        hdr["seq"] = -1
+        np.copyto(self.frames[idx], frame)
+        n = min(len(tracks), MAX_TRACKS)
+        if n:
+            self.tracks[idx, :n] = [
+                (*t["box"], t["confidence"], t["track_id"], t["predicted"]) for t in tracks[:n]
+            ]
+        hdr["media_t"], hdr["captured"], hdr["n"], hdr["inferred"] = media_t, captured, n, inferred
+        hdr["seq"] = seq
+        self.written += 1
+
+    # ------------------------------------------------------------------
+    # Consumidor (servidor)
+    # ------------------------------------------------------------------
+    def read(self, seq: int) -> Optional[tuple[np.ndarray, list[dict], float, float, bool]]:
+        """
+        (frame, tracks, media_t, captured, inferred) for `seq`, or None if the
+        slot was reused before or during the read. The frame is a private
+        copy, so the producer can overwrite the slot afterwards.
+        """
+        idx = seq % self.slots
+        hdr = self.header[idx].copy()
+        if hdr["seq"] != seq:
+            self.torn += 1
+            return None
+        rows = self.tracks[idx, :hdr["n"]].tolist()
+        frame = self.frames[idx].copy()
+        if self.header[idx]["seq"] != seq:     # sobrescrito durante a cópia: descarta
+            self.torn += 1
+            return None
+        tracks = [
+            {
+                "confidence": conf,
+                "box": (int(x1), int(y1), int(x2), int(y2)),
+                "class": 1,
+                "track_id": int(tid),
+                "predicted": bool(pred),
+            }
+            for x1, y1, x2, y2, conf, tid, pred in rows
+        ]
+        return frame, tracks, float(hdr["media_t"]), float(hdr["captured"]), bool(hdr["inferred"])
+
+    def close(self):
+        # views numpy seguram o buffer: soltá-las antes de fechar o mmap
+        self.header = self.tracks = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:     # alguém ainda segura uma view; o mmap sai com o processo
+            pass
+
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
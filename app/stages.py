@@ -0,0 +1,82 @@
+# app/stages.py
+
+"""
+Building blocks for the decode -> infer -> encode pipeline.
+
+Stages run on their own threads and are linked by bounded StageQueues, so
+a slow stage drops frames instead of letting latency grow without bound.
+"""
+
+import queue
+import threading
+from typing import Any
+
+POLICIES = ("latest", "nth", "all")
+
+class StageQueue:
+    """
+    Bounded hand-off between two stages. `put(block=False)` evicts the
+    oldest item when full, so the consumer always sees the newest frames.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1):
+        self.name = name
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item: Any, block: bool = False, timeout: float | None = None):
+        if block:
+            self._q.put(item, timeout=timeout)
+            self.put_count += 1
+            return
+        with self._lock:
+            while True:
+                try:
+                    self._q.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._q.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+            self.put_count += 1
+
+    def get(self, timeout: float | None = None) -> Any:
+        return self._q.get(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._q.qsize(),
+            "maxsize": self._q.maxsize,
+            "put": self.put_count,
+            "dropped": self.dropped,
+        }
+
+class FramePolicy:
+    """
+    Which captured frames reach inference:
+      - latest: only the newest frame (queue of 1, older ones dropped)
+      - nth:    every Nth captured frame
+      - all:    every frame; capture blocks when inference falls behind
+    """
+
+    def __init__(self, mode: str = "latest", every_n: int = 1):
+        if mode not in POLICIES:
+            raise ValueError(f"Unknown frame policy {mode!r}; expected one of {POLICIES}")
+        if every_n < 1:
+            raise ValueError("every_n must be >= 1")
+        self.mode = mode
+        self.every_n = every_n
+
+    @property
+    def block(self) -> bool:
+        return self.mode == "all"
+
+    def admit(self, frame_idx: int) -> bool:
+        return self.mode != "nth" or frame_idx % self.every_n == 0
+
+    def to_dict(self) -> dict:
+        return {"mode": self.mode, "every_n": self.every_n}
@@ -0,0 +1,158 @@
+# app/stream_hub.py
+
+"""
+Single-producer / many-subscriber fan-out for the MJPEG preview.
+
+One StreamPipeline per video source decodes and infers once; every
+/video_feed client subscribes to its FrameHub with a PreviewProfile and
+gets a bounded queue. Payloads are published per profile, so clients
+sharing a profile share one encoded part. Slow clients lose their oldest
+frames instead of stalling the pipeline.
+"""
+
+import queue
+import logging
+import threading
+from typing import Callable, Iterator, Optional
+
+from app.preview import DEFAULT_PROFILE, PreviewProfile, PreviewSchedule
+
+CLIENT_QUEUE_SIZE = 2       # frames buffered per client before dropping
+CLIENT_TIMEOUT    = 5.0     # seconds a client waits before re-checking the hub
+
+class FrameHub:
+    def __init__(self, client_queue_size: int = CLIENT_QUEUE_SIZE):
+        self.client_queue_size = client_queue_size
+        self._clients: dict[PreviewProfile, set[queue.Queue]] = {}
+        self._schedule = PreviewSchedule()
+        self._lock = threading.Lock()
+        self._count = 0             # mantido sob _lock; lido sem lock pelo loop de detecção
+        self.closed = False
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def client_count(self) -> int:
+        return self._count
+
+    def subscribe(self, profile: PreviewProfile = DEFAULT_PROFILE) -> queue.Queue:
+        q = queue.Queue(maxsize=self.client_queue_size)
+        with self._lock:
+            self._clients.setdefault(profile, set()).add(q)
+            self._count += 1
+        return q
+
+    def unsubscribe(self, q: queue.Queue, profile: PreviewProfile = DEFAULT_PROFILE):
+        with self._lock:
+            clients = self._clients.get(profile)
+            if clients is not None and q in clients:
+                clients.remove(q)
+                self._count -= 1
+                if not clients:
+                    del self._clients[profile]
+                    self._schedule.discard(profile)
+
+    def profiles(self) -> tuple[PreviewProfile, ...]:
+        """Profiles that currently have viewers."""
+        with self._lock:
+            return tuple(self._clients)
+
+    def due_profiles(self, now: float) -> list[PreviewProfile]:
+        """Profiles with viewers whose max_fps allows another frame at `now` (monotonic)."""
+        with self._lock:
+            return self._schedule.due(self._clients, now)
+
+    def publish(self, payload: bytes, profile: PreviewProfile = DEFAULT_PROFILE):
+        """Non-blocking: a full client queue drops its oldest frame."""
+        with self._lock:
+            clients = list(self._clients.get(profile, ()))
+        self.published += 1
+        for q in clients:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(payload)
+                except queue.Full:
+                    pass
+                self.dropped += 1
+
+    def close(self):
+        self.closed = True
+        with self._lock:
+            clients = [q for qs in self._clients.values() for q in qs]
+        for q in clients:
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                q.put_nowait(None)
+
+    def stream(self, profile: PreviewProfile = DEFAULT_PROFILE) -> Iterator[bytes]:
+        """Generator for StreamingResponse; unsubscribes when the client leaves."""
+        q = self.subscribe(profile)
+        try:
+            while True:
+                try:
+                    payload = q.get(timeout=CLIENT_TIMEOUT)
+                except queue.Empty:
+                    if self.closed:
+                        return
+                    continue
+                if payload is None:
+                    return
+                yield payload
+        finally:
+            self.unsubscribe(q, profile)
+
+    def stats(self) -> dict:
+        with self._lock:
+            profiles = [{**p.to_dict(), "clients": len(c)} for p, c in self._clients.items()]
+            count = self._count
+        return {
+            "clients": count,
+            "published": self.published,
+            "dropped": self.dropped,
+            "profiles": profiles,
+        }
+
+class StreamPipeline:
+    """
+    Runs `target(source, hub, stop_event)` on a daemon thread. The target
+    owns capture, inference and alerting for the source and publishes
+    encoded frames to `hub`.
+    """
+
+    def __init__(self, source: str, target: Callable[[str, FrameHub, threading.Event], None]):
+        self.source = source
+        self.hub = FrameHub()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(target,), name=f"pipeline:{source}", daemon=True
+        )
+
+    def _run(self, target):
+        try:
+            target(self.source, self.hub, self._stop)
+        except Exception:
+            logging.exception("Pipeline for %s crashed.", self.source)
+        finally:
+            self.hub.close()
+
+    def start(self) -> "StreamPipeline":
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
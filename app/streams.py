@@ -0,0 +1,177 @@
+# app/streams.py
+
+"""
+Registry of video sources. Every stream owns its own object tracker and
+TrackSeverity, pre-event frame buffer, alert cooldowns and status, plus the
+StreamPipeline that decodes it and fans frames out to viewers.
+
+`status` is an immutable snapshot: only the stream's detection thread
+writes it, by swapping in a new dict (see `update_detection_status`), so
+readers never need a lock.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from app.capture import CaptureSource, make_capture
+from app.cascade import CASCADE_FRAMES
+from app.detection import INFER_EVERY
+from app.motion import MotionGate
+from app.ring_buffer import FrameRing
+from app.severity import TrackSeverity
+from app.stages import FramePolicy, StageQueue
+from app.stream_hub import StreamPipeline
+from app.tracking import ObjectTracker
+
+MAX_LOG_ENTRIES = 10
+SEVERITY_WINDOW = 5     # segundos
+
+class StreamState:
+    def __init__(self, stream_id: str, source: str, policy: Optional[FramePolicy] = None,
+                 clip_mode: str = "buffer", buffer_mode: str = "raw",
+                 motion: Optional[MotionGate] = None, capture: Optional[CaptureSource] = None,
+                 infer_every: int = INFER_EVERY):
+        self.id = stream_id
+        self.source = source
+        self.capture = capture or make_capture(source)
+        self.policy = policy or FramePolicy()
+        self.clip_mode = clip_mode
+        self.buffer_mode = buffer_mode
+        self.motion = motion        # None = toda inferência passa, sem pré-filtro
+        self.recorder = None        # SegmentRecorder quando clip_mode == "segments"
+        self.infer_queue = StageQueue("infer")
+        self.encode_queue = StageQueue("encode")
+        self.frames_captured = 0
+        self.frames_skipped = 0     # descartados pela política "nth"
+        self.latency_ms = 0.0       # captura -> fim da inferência (último frame)
+        self.infer_every = infer_every      # MODEL1 a cada K frames; nos outros o tracker propaga as caixas
+        self.frames_propagated = 0
+        self.objects = ObjectTracker()
+        self.tracker = TrackSeverity(SEVERITY_WINDOW)
+        self.frame_buffer = FrameRing(1, buffer_mode)    # recriado com o fps real no início do loop
+        self.fps = 30
+        self.last_telegram_alert_time = 0
+        self.last_emergency_call_time = 0
+        self.recent_hits: deque = deque(maxlen=CASCADE_FRAMES)   # ROIs (cópias) de cada hit do MODEL1
+        self.cascade = None         # Future da última cascata MODEL2/MODEL3
+        self.cascade_started = 0.0
+        self.pipeline: Optional[StreamPipeline] = None
+        self.worker_stats: Optional[dict] = None    # últimas estatísticas do worker (WORKER_PROCESSES > 0)
+        self.status = {
+            "level": "NONE",
+            "max_confidence": 0.0,
+            "detections": 0,
+            "last_update": "",
+            "alert": "",
+            "logs": (),             # tupla: o snapshot inteiro é trocado, nunca alterado
+        }
+
+    def reset_severity(self):
+        """New severity window: after an alert, a (re)opened source or a restarted worker."""
+        self.tracker.reset()
+        self.recent_hits.clear()
+
+    @property
+    def running(self) -> bool:
+        return self.pipeline is not None and self.pipeline.is_alive()
+
+    def status_view(self) -> dict:
+        out = dict(self.status)
+        out["logs"] = list(out["logs"])
+        if self.worker_stats is not None:   # o MotionGate roda no worker
+            out["motion"] = self.worker_stats.get("motion")
+        else:
+            out["motion"] = self.motion.stats() if self.motion else None
+        return out
+
+    def info(self) -> dict:
+        return {
+            "stream_id": self.id,
+            "source": self.source,
+            "running": self.running,
+            "level": self.status["level"],
+            "viewers": self.pipeline.hub.client_count if self.pipeline else 0,
+            "policy": self.policy.to_dict(),
+            "clip_mode": self.clip_mode,
+            "stages": self.stage_stats(),
+        }
+
+    def stage_stats(self) -> dict:
+        if self.worker_stats is not None:
+            ws = self.worker_stats
+            return {
+                "worker_pid": ws["pid"],
+                "capture": {"frames": self.frames_captured, "skipped": self.frames_skipped, **ws["capture"]},
+                "infer": ws["infer"],
+                "encode": ws["encode"],
+                "buffer": ws["buffer"],
+                "ring": ws["ring"],
+                "preview": self.pipeline.hub.stats() if self.pipeline else {},
+                "tracking": ws["tracking"],
+                "latency_ms": round(self.latency_ms, 1),
+            }
+        return {
+            "capture": {"frames": self.frames_captured, "skipped": self.frames_skipped, **self.capture.stats()},
+            "infer": self.infer_queue.stats(),
+            "encode": self.encode_queue.stats(),
+            "buffer": self.frame_buffer.stats(),
+            "preview": self.pipeline.hub.stats() if self.pipeline else {},
+            "tracking": {"infer_every": self.infer_every, "propagated": self.frames_propagated,
+                         **self.objects.stats()},
+            "latency_ms": round(self.latency_ms, 1),
+        }
+
+class StreamRegistry:
+    """
+    `target(stream, hub, stop_event)` is the per-stream detection loop; the
+    registry only owns lifecycle (add/remove/restart).
+    """
+
+    def __init__(self, target: Callable):
+        self._target = target
+        self._streams: dict[str, StreamState] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stream_id: str, source: str, start: bool = True,
+            policy: Optional[FramePolicy] = None, clip_mode: str = "buffer",
+            buffer_mode: str = "raw", motion: Optional[MotionGate] = None,
+            capture: Optional[CaptureSource] = None, infer_every: int = INFER_EVERY) -> StreamState:
+        with self._lock:
+            if stream_id in self._streams:
+                raise KeyError(f"Stream {stream_id!r} already registered")
+            stream = self._streams[stream_id] = StreamState(
+                stream_id, source, policy, clip_mode, buffer_mode, motion, capture, infer_every)
+        if start:
+            self.ensure_running(stream_id)
+        return stream
+
+    def remove(self, stream_id: str, timeout: float = 5.0) -> StreamState:
+        with self._lock:
+            stream = self._streams.pop(stream_id)
+        if stream.pipeline:
+            stream.pipeline.stop(timeout)
+        return stream
+
+    def get(self, stream_id: str) -> StreamState:
+        return self._streams[stream_id]
+
+    def list(self) -> list[StreamState]:
+        with self._lock:
+            return list(self._streams.values())
+
+    def ensure_running(self, stream_id: str) -> StreamState:
+        """(Re)starts the stream pipeline if it isn't alive; file sources end on EOF."""
+        stream = self.get(stream_id)
+        with self._lock:
+            if not stream.running:
+                stream.pipeline = StreamPipeline(
+                    stream.source,
+                    lambda _src, hub, stop: self._target(stream, hub, stop),
+                ).start()
+        return stream
+
+    def stop_all(self, timeout: float = 5.0):
+        for stream in self.list():
+            if stream.pipeline:
+                stream.pipeline.stop(timeout)
@@ -6,6 +6,8 @@ import re
 import logging
 from app.config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
@@ -38,26 +40,31 @@ def extract_metadata_from_message(message: str):
         metadata["confidence"] = float(confidence_match.group(1))
     return metadata
 
+def telegram_url(method: str) -> str:
+    return f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/{method}"
+
+def is_valid_video(video_path) -> bool:
+    return bool(video_path) and os.path.exists(video_path) and os.path.getsize(video_path) > 0
+
 def send_telegram_video(video_path: str, message: str):
     """
     Sends a Telegram text message and video clip.
     Returns metadata extracted from the message.
+    Synchronous; the server queues alerts through app.dispatch instead.
     """
     metadata = extract_metadata_from_message(message)
     try:
         # Send text message
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        response = requests.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": message}, timeout=5)
+        response = requests.post(telegram_url("sendMessage"), data={"chat_id": TELEGRAM_CHAT_ID, "text": message}, timeout=5)
         response.raise_for_status()
         logging.info("Telegram text message sent successfully.")
 
         # Send video if the file exists and is valid
-        if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
-            video_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendVideo"
+        if is_valid_video(video_path):
             with open(video_path, "rb") as video_file:
                 files = {"video": ("video.mp4", video_file, "video/mp4")}
                 response = requests.post(
-                    video_url,
+                    telegram_url("sendVideo"),
                     data={"chat_id": TELEGRAM_CHAT_ID},
                     files=files,
                     timeout=30
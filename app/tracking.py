@@ -0,0 +1,165 @@
+# app/tracking.py
+
+"""
+Lightweight multi-object tracker for MODEL1 detections (ByteTrack style).
+
+Every detection is associated with a track by IoU against the track's
+predicted box, in two passes: confident detections first (against all
+tracks), then the low-confidence ones against the tracks still unmatched,
+so a fight that momentarily scores low keeps its ID instead of being lost
+or double-counted. Unmatched confident detections open new tracks; a track
+is reported once it has been matched `min_hits` times and is dropped
+after `max_age` seconds of media time without a match.
+
+Motion is a constant-velocity model on the box corners, smoothed with an
+exponential average, which is also what `predict(t)` uses to propagate
+boxes on the frames where the detector didn't run (see INFER_EVERY).
+
+Tracks come out as the same dicts `_infer_model1` produces, plus
+`track_id` and `predicted`, so drawing and the cascade don't change.
+"""
+
+import itertools
+from typing import Optional
+
+import numpy as np
+
+TRACK_HIGH_THRESH   = 0.5       # 1ª associação e abertura de tracks novos
+TRACK_MATCH_IOU     = 0.2       # IoU mínimo na 1ª associação
+TRACK_LOW_MATCH_IOU = 0.5       # IoU mínimo na 2ª (detecções fracas)
+TRACK_MAX_AGE       = 1.0       # s de mídia sem casar até o track morrer
+TRACK_MIN_HITS      = 2         # casamentos até o track ser reportado
+VELOCITY_ALPHA      = 0.5       # suavização da velocidade
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU between every row of `a` (N, 4) and `b` (M, 4), xyxy."""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def greedy_match(iou: np.ndarray, thresh: float) -> list[tuple[int, int]]:
+    """Pairs (row, col) by descending IoU, each row/col at most once, IoU >= thresh."""
+    pairs: list[tuple[int, int]] = []
+    if not iou.size:
+        return pairs
+    rows, cols = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        i, j = divmod(int(flat), iou.shape[1])
+        if iou[i, j] < thresh:
+            break
+        if i in rows or j in cols:
+            continue
+        rows.add(i)
+        cols.add(j)
+        pairs.append((i, j))
+    return pairs
+
+class Track:
+    __slots__ = ("id", "box", "vel", "t_obs", "hits", "conf", "cls")
+
+    def __init__(self, track_id: int, box: np.ndarray, conf: float, cls: int, t: float):
+        self.id = track_id
+        self.box = box
+        self.vel = np.zeros(4)          # px/s por canto
+        self.t_obs = t
+        self.hits = 1
+        self.conf = conf
+        self.cls = cls
+
+    def predict(self, t: float) -> np.ndarray:
+        return self.box + self.vel * min(max(0.0, t - self.t_obs), TRACK_MAX_AGE)
+
+    def observe(self, box: np.ndarray, conf: float, t: float):
+        dt = t - self.t_obs
+        if dt > 0:
+            vel = (box - self.box) / dt
+            self.vel = vel if self.hits == 1 else VELOCITY_ALPHA * vel + (1 - VELOCITY_ALPHA) * self.vel
+        self.box, self.t_obs, self.conf = box, t, conf
+        self.hits += 1
+
+    def to_dict(self, box: np.ndarray, predicted: bool) -> dict:
+        return {
+            "confidence": self.conf,
+            "box": tuple(int(round(v)) for v in box),
+            "class": self.cls,
+            "track_id": self.id,
+            "predicted": predicted,
+        }
+
+class ObjectTracker:
+    def __init__(self, high_thresh: float = TRACK_HIGH_THRESH, match_iou: float = TRACK_MATCH_IOU,
+                 low_match_iou: float = TRACK_LOW_MATCH_IOU, max_age: float = TRACK_MAX_AGE,
+                 min_hits: int = TRACK_MIN_HITS):
+        self.high_thresh = high_thresh
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self._tracks: list[Track] = []
+        self._ids = itertools.count(1)
+        self._last_t: Optional[float] = None
+        self.created = 0
+        self.updates = 0
+        self.predictions = 0
+
+    def reset(self):
+        self._tracks = []
+        self._last_t = None
+
+    def update(self, dets: list[dict], t: float) -> list[dict]:
+        """Associates one frame of detections at media time `t`; returns the confirmed tracks seen in it."""
+        self.updates += 1
+        boxes = np.array([d["box"] for d in dets], dtype=np.float64).reshape(-1, 4)
+        confs = np.array([d["confidence"] for d in dets], dtype=np.float64)
+        tracks = self._tracks
+        pred = np.array([tr.predict(t) for tr in tracks]).reshape(-1, 4)
+
+        high = np.flatnonzero(confs >= self.high_thresh)
+        low = np.flatnonzero(confs < self.high_thresh)
+        matched: set[int] = set()
+        high_used: set[int] = set()
+        for i, j in greedy_match(iou_matrix(pred, boxes[high]), self.match_iou):
+            tracks[i].observe(boxes[high[j]], float(confs[high[j]]), t)
+            matched.add(i)
+            high_used.add(int(high[j]))
+
+        rest = [i for i in range(len(tracks)) if i not in matched]
+        for i, j in greedy_match(iou_matrix(pred[rest], boxes[low]), self.low_match_iou):
+            tracks[rest[i]].observe(boxes[low[j]], float(confs[low[j]]), t)
+            matched.add(rest[i])
+
+        alive = [
+            tr for i, tr in enumerate(tracks)
+            if i in matched or (tr.hits >= self.min_hits and t - tr.t_obs <= self.max_age)
+        ]   # tentativo que não casou de novo é descartado (ruído de um frame)
+        for j in high.tolist():
+            if j not in high_used:
+                alive.append(Track(next(self._ids), boxes[j], float(confs[j]), int(dets[j].get("class", 1)), t))
+                self.created += 1
+        self._tracks = alive
+        self._last_t = t
+        return [tr.to_dict(tr.box, False) for tr in alive if tr.t_obs == t and tr.hits >= self.min_hits]
+
+    def predict(self, t: float) -> list[dict]:
+        """Confirmed tracks seen at the last update, propagated to `t` (frames without inference)."""
+        self.predictions += 1
+        return [
+            tr.to_dict(tr.predict(t), True) for tr in self._tracks
+            if tr.t_obs == self._last_t and tr.hits >= self.min_hits
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "active": sum(tr.hits >= self.min_hits for tr in self._tracks),
+            "tentative": sum(tr.hits < self.min_hits for tr in self._tracks),
+            "created": self.created,
+            "updates": self.updates,
+            "predicted_frames": self.predictions,
+        }
@@ -0,0 +1,628 @@
+# app/workers.py
+
+"""
+Stream sharding over worker processes.
+
+With WORKER_PROCESSES > 0 the server stops decoding and inferring itself.
+A WorkerPool (the supervisor) spawns N processes, each pinned to its own
+slice of the CPUs, and assigns every stream to the least loaded one. A
+worker runs, per stream, what the in-process loop runs (capture stage,
+motion gate, MODEL1 through its own InferenceScheduler, tracker) and keeps
+the pre-event buffer and segment recorder, so clips are written there too.
+It also draws the boxes and encodes the MJPEG preview, once per profile
+that has viewers (the server forwards the profile set as it changes).
+
+Each processed frame and its tracks go into the stream's ShmFrameRing
+(app/shm_ring.py); only the sequence number crosses the worker's queue,
+next to the encoded preview parts. The server side (RemoteFeed) copies the
+slot out and runs what is left: severity, the MODEL2/MODEL3 cascade
+on hits, alerts, status/events, and publishing the parts to the viewers.
+
+The supervisor watches the worker processes. One that dies is respawned
+(with exponential backoff if it keeps dying) and its streams are
+re-added. Their rings are unlinked and pending clip requests fail, so the
+alert still goes out without a clip.
+"""
+
+import os
+import time
+import queue
+import signal
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import connection, shared_memory
+from typing import Optional
+
+from app.metrics import REGISTRY, Histogram
+from app.shm_ring import RING_SLOTS, ShmFrameRing
+from app.streams import StreamState
+
+WORKER_PROCESSES    = int(os.getenv("WORKER_PROCESSES", "0"))   # 0 = tudo no processo do servidor
+WORKER_PIN_CPUS     = os.getenv("WORKER_PIN_CPUS", "1") == "1"
+STATS_INTERVAL      = 1.0       # s entre estatísticas de cada stream do worker
+FEED_QUEUE          = RING_SLOTS * 2    # avisos pendentes por stream; frames mais velhos já foram sobrescritos
+RESTART_BACKOFF     = 1.0       # s antes de recriar um worker que caiu; dobra a cada queda seguida
+RESTART_BACKOFF_MAX = 30.0
+STABLE_AFTER        = 60.0      # s de vida a partir dos quais uma queda não conta como "seguida"
+
+def cpu_groups(n: int) -> list[list[int]]:
+    """Splits the CPUs this process may use into `n` contiguous groups (shared round-robin if n > CPUs)."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    if n >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(n)]
+    size, extra = divmod(len(cpus), n)
+    groups, start = [], 0
+    for i in range(n):
+        end = start + size + (i < extra)
+        groups.append(cpus[start:end])
+        start = end
+    return groups
+
+def stream_spec(stream: StreamState, video_save_path: str) -> dict:
+    """Everything a worker needs to rebuild `stream` on its side (picklable)."""
+    cap, motion = stream.capture, stream.motion
+    return {
+        "id": stream.id,
+        "source": stream.source,
+        "policy": stream.policy.to_dict(),
+        "clip_mode": stream.clip_mode,
+        "buffer_mode": stream.buffer_mode,
+        "motion": None if motion is None else {
+            "threshold": motion.threshold, "keepalive": motion.keepalive,
+            "roi": motion.roi, "width": motion.width,
+        },
+        "capture": {
+            "backend": cap.backend, "max_side": cap.max_side,
+            "keyframes_only": cap.keyframes_only, "threads": cap.threads,
+        },
+        "infer_every": stream.infer_every,
+        "video_save_path": video_save_path,
+        "preview": (),          # PreviewProfiles com espectadores; atualizado por WorkerPool.set_preview
+    }
+
+# ------------------------------------------------------------------
+# Lado do worker
+# ------------------------------------------------------------------
+class _WorkerStream:
+    """One stream inside a worker: capture + inference threads writing into its ring, plus the preview encoder."""
+
+    def __init__(self, spec: dict, out_q):
+        from app.capture import make_capture
+        from app.motion import MotionGate
+        from app.preview import PreviewSchedule
+        from app.stages import FramePolicy, StageQueue
+
+        self.spec = spec
+        self.id = spec["id"]
+        self.out_q = out_q
+        self.state = StreamState(
+            self.id, spec["source"], FramePolicy(**spec["policy"]), spec["clip_mode"], spec["buffer_mode"],
+            MotionGate(**spec["motion"]) if spec["motion"] is not None else None,
+            make_capture(spec["source"], **spec["capture"]), spec["infer_every"],
+        )
+        self.state.encode_queue = StageQueue("encode", maxsize=2)
+        self.profiles: tuple = tuple(spec["preview"])      # trocado inteiro pelo comando "preview"
+        self._schedule = PreviewSchedule()
+        self.stop = threading.Event()
+        self.ring: Optional[ShmFrameRing] = None
+        self.thread = threading.Thread(target=self._run, name=f"stream:{self.id}", daemon=True)
+
+    def _open_ring(self, shape: tuple[int, int]):
+        old, self.ring = self.ring, ShmFrameRing.create(shape)
+        self.out_q.put(("open", self.id, self.ring.name, shape, self.ring.slots, self.state.fps))
+        if old is not None:     # o servidor troca de anel ao receber "open"; a fila preserva a ordem
+            old.close()
+            old.unlink()
+
+    def _stats(self) -> dict:
+        from app.detection import scheduler
+
+        st = self.state
+        return {
+            "pid": os.getpid(),
+            "frames_captured": st.frames_captured,
+            "frames_skipped": st.frames_skipped,
+            "frames_propagated": st.frames_propagated,
+            "capture": st.capture.stats(),
+            "infer": st.infer_queue.stats(),
+            "encode": st.encode_queue.stats(),
+            "buffer": st.frame_buffer.stats(),
+            "tracking": {"infer_every": st.infer_every, "propagated": st.frames_propagated,
+                         **st.objects.stats()},
+            "motion": st.motion.stats() if st.motion else None,     # o gate roda aqui, não no servidor
+            "ring": {"slots": self.ring.slots if self.ring else 0,
+                     "written": self.ring.written if self.ring else 0},
+            "preview": list(self.profiles),
+            # do processo inteiro: o servidor guarda por worker, não por stream
+            "metrics": REGISTRY.export(),
+            "scheduler": scheduler.stats(),
+            "scheduler_hist": {"batch_size": scheduler.batch_size_hist.state(),
+                               "wait_ms": scheduler.wait_ms_hist.state(),
+                               "throughput_fps": scheduler.fps_hist.state()},
+        }
+
+    def _encode(self):
+        """Encodes each drawn frame for the due profiles and ships the parts to the server."""
+        from app.pipeline import encode_preview
+
+        while True:
+            frame = self.state.encode_queue.get()
+            if frame is None:
+                return
+            due = self._schedule.due(self.profiles, time.monotonic())
+            parts = encode_preview(frame, due)
+            if parts:
+                self.out_q.put(("preview", self.id, parts))
+
+    def _run(self):
+        from app.clip_writer import SegmentRecorder
+        from app.detection import BUFFER_SECONDS
+        from app.pipeline import capture_stage, draw_tracks, track_frame
+        from app.ring_buffer import FrameRing
+        from app.stages import StageQueue
+
+        st, cap = self.state, self.state.capture
+        capture = None
+        encoder = threading.Thread(target=self._encode, name=f"encode:{st.id}", daemon=True)
+        encoder.start()
+        try:
+            if not cap.open(self.stop):
+                logging.error("Error: Cannot access video source %s.", st.source)
+                return
+            st.fps = cap.fps
+            st.frame_buffer = FrameRing(st.fps * (BUFFER_SECONDS * 2), st.buffer_mode)
+            st.infer_queue = StageQueue("infer", maxsize=st.fps if st.policy.block else 1)
+            if st.clip_mode == "segments":
+                st.recorder = SegmentRecorder(st.id, self.spec["video_save_path"], st.fps)
+            capture = threading.Thread(target=capture_stage, args=(st, cap, self.stop),
+                                       name=f"capture:{st.id}", daemon=True)
+            capture.start()
+
+            seq, last_stats = 0, 0.0
+            while not self.stop.is_set():
+                try:
+                    item = st.infer_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                frame, captured_at, media_t = item
+                tracks, inferred = track_frame(st, frame, media_t, time.time(), seq)
+                if self.ring is None or self.ring.shape != frame.shape[:2]:
+                    self._open_ring(frame.shape[:2])
+                self.ring.write(seq, frame, tracks, media_t, captured_at, inferred)
+                self.out_q.put(("frame", self.id, seq))
+                if self.profiles:   # ninguém assistindo: não desenha nem codifica
+                    st.encode_queue.put(draw_tracks(frame, tracks))
+                seq += 1
+                now = time.monotonic()
+                if now - last_stats >= STATS_INTERVAL:
+                    last_stats = now
+                    self.out_q.put(("stats", self.id, self._stats()))
+        except Exception:
+            logging.exception("Worker: stream %s falhou", self.id)
+        finally:
+            self.stop.set()
+            if capture is not None:
+                capture.join()
+            st.encode_queue.put(None)
+            encoder.join()
+            if st.recorder is not None:
+                st.recorder.close()
+                st.recorder = None
+            cap.release()
+            self.out_q.put(("eof", self.id))
+
+    def save_clip(self, path: str) -> Future:
+        from app.clip_writer import clip_writer
+
+        st = self.state
+        if st.recorder is not None:
+            return st.recorder.save_clip(path)
+        return clip_writer.submit(st.frame_buffer.snapshot(), path, st.fps)
+
+    def close(self, timeout: float = 5.0):
+        self.stop.set()
+        self.thread.join(timeout)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+
+def _clip_done(out_q, req: int, fut: Future):
+    err = fut.exception()
+    path = None if err is not None else fut.result()
+    out_q.put(("clip", req, path, "" if path else repr(err) if err else "clip not written"))
+
+def _worker_main(index: int, cpus: list[int], cmd_q, out_q, parent_pid: int):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # quem encerra os workers é o supervisor
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [%(levelname)s] [worker {index}] %(message)s",
+                        force=True)
+
+    import app.detection as detection
+    from app.backends import configure_threads
+    if cpus and not detection.INTRA_THREADS:
+        # o pacote app já importou app.detection ao desserializar este alvo: ajusta
+        # o torch agora e as sessões ONNX/OpenVINO na carga do modelo
+        detection.INTRA_THREADS = len(cpus)
+        configure_threads(len(cpus), 0)
+    detection.warmup_models()
+    logging.info("Worker %d pronto (pid %d, CPUs %s)", index, os.getpid(), cpus or "todas")
+
+    streams: dict[str, _WorkerStream] = {}
+    while True:
+        try:
+            cmd = cmd_q.get(timeout=1.0)
+        except queue.Empty:
+            if os.getppid() != parent_pid:      # servidor morreu sem nos encerrar
+                break
+            continue
+        kind = cmd[0]
+        if kind == "stop":
+            break
+        if kind == "add":
+            spec = cmd[1]
+            old = streams.pop(spec["id"], None)
+            if old is not None:
+                old.close()
+            ws = streams[spec["id"]] = _WorkerStream(spec, out_q)
+            ws.thread.start()
+        elif kind == "remove":
+            ws = streams.pop(cmd[1], None)
+            if ws is not None:
+                ws.close()
+        elif kind == "preview":
+            ws = streams.get(cmd[1])
+            if ws is not None:
+                ws.profiles = tuple(cmd[2])
+        elif kind == "clip":
+            _, sid, path, req = cmd
+            ws = streams.get(sid)
+            if ws is None:
+                out_q.put(("clip", req, None, f"unknown stream {sid!r}"))
+                continue
+            ws.save_clip(path).add_done_callback(lambda f, req=req: _clip_done(out_q, req, f))
+
+    for ws in streams.values():
+        ws.close()
+
+# ------------------------------------------------------------------
+# Lado do servidor
+# ------------------------------------------------------------------
+class RemoteFeed:
+    """
+    Server-side end of one stream: frame notices from its worker, read from
+    the shared ring. At most `maxsize` notices wait; when full, the oldest
+    frame/preview notice is dropped ("open" and "eof" are always kept), so a
+    slow consumer reads fresh slots instead of a backlog of overwritten ones.
+    """
+
+    def __init__(self, stream: StreamState, maxsize: int = FEED_QUEUE):
+        self.stream = stream
+        self.maxsize = maxsize
+        self._q: deque = deque()
+        self._cv = threading.Condition()
+        self.ring: Optional[ShmFrameRing] = None
+        self.received = 0
+        self.skipped = 0        # slots reaproveitados antes de o servidor lê-los
+        self.dropped = 0        # avisos descartados com a fila cheia
+
+    def put(self, msg: tuple):
+        with self._cv:
+            if len(self._q) >= self.maxsize:
+                for i, old in enumerate(self._q):
+                    if old[0] in ("frame", "preview"):
+                        del self._q[i]
+                        self.dropped += 1
+                        break
+            self._q.append(msg)
+            self._cv.notify()
+
+    def get(self, timeout: float) -> Optional[tuple]:
+        """
+        ("open", fps) when the worker (re)opened the source, ("frame", frame,
+        tracks, media_t, captured_at, inferred), ("preview", [(profile, part)]),
+        ("eof",) or None on timeout.
+        """
+        with self._cv:
+            if not self._cv.wait_for(lambda: self._q, timeout):
+                return None
+            msg = self._q.popleft()
+        kind = msg[0]
+        if kind == "open":
+            _, name, shape, slots, fps = msg
+            try:
+                ring = ShmFrameRing.attach(name, shape, slots)
+            except FileNotFoundError:   # já substituído por outro anel; o "open" dele vem a seguir
+                return None
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = ring
+            return ("open", fps)
+        if kind == "frame":
+            if self.ring is None:
+                return None
+            got = self.ring.read(msg[1])
+            if got is None:
+                self.skipped += 1
+                return None
+            self.received += 1
+            return ("frame", *got)
+        return msg
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def stats(self) -> dict:
+        return {"received": self.received, "skipped": self.skipped, "dropped": self.dropped,
+                "pending": len(self._q)}
+
+class _Worker:
+    def __init__(self, index: int, cpus: list[int]):
+        self.index = index
+        self.cpus = cpus
+        self.proc = None
+        self.cmd_q = None
+        self.streams: set[str] = set()
+        self.generation = 0
+        self.started = 0.0
+        self.restarts = 0
+        self.crashes_in_row = 0
+        self.restart_at: Optional[float] = None     # monotonic do respawn agendado (worker fora do ar)
+        self.scheduler: Optional[dict] = None       # últimas estatísticas do InferenceScheduler do worker
+        self.scheduler_hist: dict[str, Histogram] = {}
+
+class WorkerPool:
+    def __init__(self, processes: int = WORKER_PROCESSES, pin: bool = WORKER_PIN_CPUS):
+        self.processes = processes
+        self.pin = pin
+        self._ctx = mp.get_context("spawn")
+        self._workers: list[_Worker] = []
+        self._feeds: dict[str, RemoteFeed] = {}
+        self._specs: dict[str, dict] = {}
+        self._assigned: dict[str, _Worker] = {}
+        self._rings: dict[str, str] = {}        # stream -> shm atual, p/ limpar se o worker cair
+        self._clips: dict[int, tuple[str, Future]] = {}
+        self._clip_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    # ------------------------------------------------------------------
+    # Processos
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        """Spawns the workers on first use (called with the lock held)."""
+        if self._workers:
+            return
+        groups = cpu_groups(self.processes) if self.pin else [[] for _ in range(self.processes)]
+        for i, cpus in enumerate(groups):
+            w = _Worker(i, cpus)
+            self._spawn(w)
+            self._workers.append(w)
+        self._monitor = threading.Thread(target=self._watch, name="worker-supervisor", daemon=True)
+        self._monitor.start()
+
+    def _spawn(self, w: _Worker):
+        w.generation += 1
+        w.scheduler = None      # o processo novo recomeça do zero; os histogramas são trocados no 1º "stats"
+        w.cmd_q, out_q = self._ctx.Queue(), self._ctx.Queue()
+        w.proc = self._ctx.Process(
+            target=_worker_main, args=(w.index, w.cpus, w.cmd_q, out_q, os.getpid()),
+            name=f"skynet-worker-{w.index}", daemon=True)
+        w.proc.start()
+        w.started = time.monotonic()
+        threading.Thread(target=self._read, args=(w, w.generation, out_q),
+                         name=f"worker-reader-{w.index}", daemon=True).start()
+        for sid in w.streams:
+            w.cmd_q.put(("add", self._specs[sid]))
+        logging.info("Workers: worker %d iniciado (pid %d, CPUs %s, %d streams)",
+                     w.index, w.proc.pid, w.cpus or "todas", len(w.streams))
+
+    def _read(self, w: _Worker, generation: int, out_q):
+        """Routes one worker's messages; exits when that process is replaced."""
+        while not self._stopping and w.generation == generation:
+            try:
+                msg = out_q.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            kind = msg[0]
+            if kind == "clip":
+                _, req, path, err = msg
+                with self._lock:
+                    _, fut = self._clips.pop(req, (None, None))
+                if fut is not None:
+                    if path:
+                        fut.set_result(path)
+                    else:
+                        fut.set_exception(RuntimeError(err))
+                continue
+            sid = msg[1]
+            if kind == "stats":
+                self._merge_stats(w, msg[2])
+            with self._lock:
+                feed = self._feeds.get(sid)
+                if kind == "open" and feed is not None:
+                    self._rings[sid] = msg[2]
+            if feed is None:
+                continue
+            if kind == "stats":
+                stats = msg[2]
+                s = feed.stream
+                s.frames_captured = stats["frames_captured"]
+                s.frames_skipped = stats["frames_skipped"]
+                s.frames_propagated = stats["frames_propagated"]
+                s.worker_stats = stats
+            else:
+                feed.put((kind, *msg[2:]))
+
+    def _merge_stats(self, w: _Worker, stats: dict):
+        """Moves the process-wide part of a stream's stats (histograms, scheduler) onto its worker."""
+        REGISTRY.merge({"worker": str(w.index)}, stats.pop("metrics"))
+        w.scheduler = stats.pop("scheduler")
+        for name, state in stats.pop("scheduler_hist").items():
+            hist = w.scheduler_hist.get(name)
+            if hist is None:
+                hist = w.scheduler_hist[name] = Histogram(state["buckets"])
+            hist.load(state)
+
+    def scheduler_histograms(self, name: str) -> list[tuple[dict, Histogram]]:
+        """The workers' scheduler histogram `name` ("batch_size", "wait_ms", ...), labelled by worker."""
+        with self._lock:
+            workers = list(self._workers)
+        return [({"worker": str(w.index)}, w.scheduler_hist[name]) for w in workers if name in w.scheduler_hist]
+
+    def _watch(self):
+        """Waits on the live workers' sentinels; respawns dead ones once their backoff expires."""
+        while not self._stopping:
+            now = time.monotonic()
+            timeout = 1.0
+            for w in self._workers:
+                if w.restart_at is None:
+                    continue
+                if now >= w.restart_at:
+                    with self._lock:
+                        w.restart_at = None
+                        self._spawn(w)
+                else:
+                    timeout = min(timeout, w.restart_at - now)
+            by_sentinel = {w.proc.sentinel: w for w in self._workers if w.restart_at is None}
+            for sentinel in connection.wait(list(by_sentinel), timeout=timeout):
+                if self._stopping:
+                    return
+                self._recover(by_sentinel[sentinel])
+
+    def _recover(self, w: _Worker):
+        """Cleans up after a dead worker and schedules its respawn (never blocks the supervisor)."""
+        w.proc.join(1.0)        # colhe o processo: exitcode só existe depois do join
+        lived = time.monotonic() - w.started
+        w.crashes_in_row = 0 if lived >= STABLE_AFTER else w.crashes_in_row + 1
+        w.restarts += 1
+        delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** max(0, w.crashes_in_row - 1))
+        logging.error("Workers: worker %d (pid %d) saiu com código %s após %.0fs; reiniciando em %.0fs com %d streams",
+                      w.index, w.proc.pid, w.proc.exitcode, lived, delay, len(w.streams))
+        with self._lock:
+            w.restart_at = time.monotonic() + delay
+            for req, (sid, fut) in list(self._clips.items()):
+                if sid in w.streams:
+                    del self._clips[req]
+                    fut.set_exception(RuntimeError(f"worker {w.index} crashed"))
+            names = [self._rings.pop(sid) for sid in w.streams if sid in self._rings]
+        for name in names:
+            _unlink(name)
+
+    # ------------------------------------------------------------------
+    # Streams
+    # ------------------------------------------------------------------
+    def attach(self, stream: StreamState, video_save_path: str) -> RemoteFeed:
+        """Assigns `stream` to the least loaded worker; its frames arrive through the returned feed."""
+        feed = RemoteFeed(stream)
+        spec = stream_spec(stream, video_save_path)
+        with self._lock:
+            self._ensure_started()
+            w = min(self._workers, key=lambda w: (w.restart_at is not None, len(w.streams)))
+            self._feeds[stream.id] = feed
+            self._specs[stream.id] = spec
+            self._assigned[stream.id] = w
+            w.streams.add(stream.id)
+            w.cmd_q.put(("add", spec))
+        logging.info("Workers: stream %s -> worker %d", stream.id, w.index)
+        return feed
+
+    def detach(self, stream_id: str):
+        with self._lock:
+            feed = self._feeds.pop(stream_id, None)
+            self._specs.pop(stream_id, None)
+            self._rings.pop(stream_id, None)
+            w = self._assigned.pop(stream_id, None)
+            if w is not None:
+                w.streams.discard(stream_id)
+                w.cmd_q.put(("remove", stream_id))
+        if feed is not None:
+            feed.close()
+
+    def set_preview(self, stream_id: str, profiles: tuple):
+        """Preview profiles that have viewers; the worker encodes only these (none = no encoding)."""
+        with self._lock:
+            spec = self._specs.get(stream_id)
+            w = self._assigned.get(stream_id)
+            if spec is None or w is None:
+                return
+            spec["preview"] = tuple(profiles)   # um worker recriado já volta com eles
+            w.cmd_q.put(("preview", stream_id, spec["preview"]))
+
+    def save_clip(self, stream_id: str, path: str) -> Future:
+        """The worker writes the clip from its pre-event buffer; resolves to the path."""
+        fut: Future = Future()
+        with self._lock:
+            w = self._assigned.get(stream_id)
+            if w is None:
+                fut.set_exception(KeyError(stream_id))
+                return fut
+            if w.restart_at is not None:    # o buffer pré-evento morreu com o processo
+                fut.set_exception(RuntimeError(f"worker {w.index} restarting"))
+                return fut
+            req = next(self._clip_ids)
+            self._clips[req] = (stream_id, fut)
+            w.cmd_q.put(("clip", stream_id, path, req))
+        return fut
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping = True
+        for w in self._workers:
+            w.cmd_q.put(("stop",))
+        for w in self._workers:
+            w.proc.join(timeout)
+            if w.proc.is_alive():
+                w.proc.terminate()
+        for name in list(self._rings.values()):
+            _unlink(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            workers = list(self._workers)
+            feeds = dict(self._feeds)
+        return {
+            "processes": self.processes,
+            "workers": [
+                {
+                    "index": w.index,
+                    "pid": w.proc.pid if w.proc else None,
+                    "alive": bool(w.proc and w.proc.is_alive()),
+                    "restarting": w.restart_at is not None,
+                    "cpus": w.cpus,
+                    "streams": sorted(w.streams),
+                    "restarts": w.restarts,
+                    "uptime": round(time.monotonic() - w.started, 1) if w.started else 0.0,
+                    "scheduler": w.scheduler,
+                }
+                for w in workers
+            ],
+            "feeds": {sid: f.stats() for sid, f in feeds.items()},
+        }
+
+def _unlink(name: str):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+workers = WorkerPool()
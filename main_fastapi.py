@@ -1,49 +1,61 @@
 # main_fastapi.py
-import os, cv2, time, logging
+import os, cv2, json, time, queue, logging
 from datetime import datetime
-from collections import deque
-from threading import Thread, Lock
-from fastapi import FastAPI, Form
-from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Optional
+from threading import Thread, Event
+from fastapi import FastAPI, Form, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.detection import (
-    run_all_models,
     process_alerts,
     process_review_alert,
-    save_video_clip,
+    scheduler,
+    models,
+    warmup_models,
     BUFFER_SECONDS,
-    SeverityTracker,
+    INFER_EVERY,
+    INFER_SIZE,
 )
+from app.batch import BatchJob, BATCH_OUTPUT_DIR, BATCH_WORKERS
+from app.capture import make_capture, CAPTURE_BACKENDS, CAPTURE_BACKEND, DECODE_THREADS
+from app.cascade import cascade_worker, hit_rois, CASCADE_INTERVAL, CASCADE_TIMEOUT
+from app.clip_writer import clip_writer, SegmentRecorder, CLIP_MODES
+from app.dispatch import dispatcher
+from app.events import events, DEFAULT_INTERVAL as EVENT_INTERVAL
+from app.incident import Incident
+from app.incident_store import IncidentStore
+from app.metrics import REGISTRY
+from app.motion import MotionGate
+from app.pipeline import capture_stage, draw_tracks, encode_preview, track_frame
+from app.profiler import profiler, PROFILE_INTERVAL_MS
+from app.preview import PreviewProfile, DEFAULT_QUALITY
+from app.retention import RetentionManager
+from app.ring_buffer import FrameRing, BUFFER_MODES
+from app.stages import FramePolicy, StageQueue
+from app.stream_hub import FrameHub
+from app.streams import StreamRegistry, StreamState, MAX_LOG_ENTRIES
+from app.workers import workers
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 DEFAULT_VIDEO_SOURCE = "videos/luta.mp4"
-MAX_LOG_ENTRIES = 10
+DEFAULT_STREAM_ID = "default"
 
 class AppState:
     def __init__(self):
-        self.detection_status = {
-            "level": "NONE",
-            "max_confidence": 0.0,
-            "detections": 0,
-            "last_update": "",
-            "alert": "",
-            "logs": deque(maxlen=MAX_LOG_ENTRIES),
-        }
-        self.incident_history = []
-        self.last_telegram_alert_time = 0
-        self.last_emergency_call_time = 0
-        self.detection_lock = Lock()
-        self.incident_lock = Lock()
         self.settings = {
             "video_save_path": "output",
             "telegram_alert_interval": 10,
             "emergency_call_interval": 30,
+            "batch_size": scheduler.max_batch,
+            "batch_wait_ms": scheduler.max_wait_ms,
         }
         os.makedirs(self.settings["video_save_path"], exist_ok=True)
 
 app_state = AppState()
-severity_tracker = SeverityTracker(5)
+incident_store = IncidentStore()
+retention = RetentionManager(app_state.settings["video_save_path"])
+batch_jobs: dict[str, BatchJob] = {}
 
 app = FastAPI()
 
@@ -56,142 +68,564 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def generate_alert_message(sev: str, conf: float, dets: int):
-    now = datetime.now()
-    base = (
-        "🚨 Violent Activity Detected!\n"
-        f"Date: {now:%Y-%m-%d}\n"
-        f"Time: {now:%I:%M %p}\n"
-        f"Severity: {sev}\n"
-        f"Confidence: {conf:.2f}\n"
-        f"Detections: {dets}"
-    )
-    log = f"{now:%H:%M:%S} - {sev} alert (Confidence: {conf:.2f}, Detections: {dets})"
-    return base, log, now
-
-def update_detection_status(sev: str, conf: float, dets: int, alert=""):
-    with app_state.detection_lock:
-        app_state.detection_status.update({
-            "level": sev,
-            "max_confidence": round(conf, 2),
-            "detections": dets,
-            "last_update": time.strftime("%H:%M:%S"),
-            "alert": alert,
-        })
-
-def add_incident(sev: str, conf: float, dets: int, msg: str, dt: datetime):
-    with app_state.incident_lock:
-        app_state.incident_history.append({
-            "date": dt.strftime("%Y-%m-%d"),
-            "time": dt.strftime("%H:%M:%S"),
-            "severity": sev,
-            "confidence": round(conf, 2),
-            "detections": dets,
-            "message": msg,
-        })
-
-def process_alert(severity, frame_buffer, max_conf, det_count, results, now, make_call=False):
-    name = f"violent_clip_{int(now)}.mp4"
-    path = os.path.join(app_state.settings["video_save_path"], name)
-    saved_path = save_video_clip(frame_buffer, path, int(cap.get(cv2.CAP_PROP_FPS)) or 30)
+def update_detection_status(stream: StreamState, sev: str, conf: float, dets: int, alert=""):
+    """Swaps in a new status snapshot (readers never lock) and publishes it on the event bus."""
+    previous = stream.status
+    status = {
+        "level": sev,
+        "max_confidence": round(conf, 2),
+        "detections": dets,
+        "last_update": time.strftime("%H:%M:%S"),
+        "alert": alert,
+        "logs": previous["logs"],
+    }
+    stream.status = status
+    events.set_state("status", stream.id, status)     # coalescido: só o último por intervalo
+    if sev != previous["level"]:
+        events.publish("severity", stream.id, {"level": sev, "previous": previous["level"],
+                                               "max_confidence": status["max_confidence"], "detections": dets})
+
+def add_incident(incident: Incident) -> Incident:
+    incident_store.save(incident)
+    events.publish("incident", incident.camera, _incident_view(incident))
+    return incident
+
+def _send_alert(extra, clip_path, incident: Incident, fn, *args):
+    if clip_path:
+        clip_path = retention.add(clip_path)     # pode ter sido movido para o diretório atual
+    incident.clip = clip_path
+    incident.attach_cascade(extra)
+    incident_store.save(incident)
+    events.publish("incident_update", incident.camera, _incident_view(incident))
+    fn(incident, *args)
+
+def _dispatch_alert(clip, cascade, incident: Incident, fn, args):
+    """
+    Runs once the background clip writer is done with the alert's clip;
+    `_send_alert` (disk and SQLite I/O) then runs on the dispatcher's
+    alert-prep thread, never on the clip writer or the dispatch loop.
+    """
+    clip_path = clip.result() if clip.exception() is None else None
+    send = lambda extra: _send_alert(extra, clip_path, incident, fn, *args)
+    if cascade is None:
+        dispatcher.defer(send, {})
+    else:
+        dispatcher.when_done(cascade, CASCADE_TIMEOUT, send, default={})
 
-    base_msg, log_entry, dt = generate_alert_message(severity, max_conf, det_count)
+def process_alert(stream: StreamState, severity, max_conf, det_count, now, make_call=False) -> str:
+    """Saves the clip, records the incident and queues the alert; returns the status text."""
+    name = f"violent_clip_{stream.id}_{int(now)}_{severity}.mp4"
+    path = os.path.join(app_state.settings["video_save_path"], name)
+    if workers.enabled:
+        clip = workers.save_clip(stream.id, path)   # buffer/segmentos ficam no worker
+    elif stream.recorder is not None:
+        clip = stream.recorder.save_clip(path)
+    else:
+        clip = clip_writer.submit(stream.frame_buffer.snapshot(), path, stream.fps)
 
-    with app_state.detection_lock:
-        app_state.detection_status["logs"].append(log_entry)
+    incident = add_incident(Incident(stream.id, severity, max_conf, det_count, datetime.fromtimestamp(now)))
 
-    extra = {"model2": results.get("model2", []), "model3": results.get("model3", [])}
+    logs = (*stream.status["logs"], incident.log_line())[-MAX_LOG_ENTRIES:]
+    stream.status = {**stream.status, "logs": logs}
 
     if severity == "HIGH":
-        fn = process_alerts
+        fn, args = process_alerts, (make_call,)
         alert_txt = "High alert triggered: Telegram alert sent" + (
             ", emergency call initiated." if make_call else "."
         )
     else:
-        fn = process_review_alert
+        fn, args = process_review_alert, ()
         alert_txt = "Mild alert triggered: Telegram review alert sent."
 
-    Thread(target=fn, args=(saved_path, base_msg, extra, make_call)).start()
-    add_incident(severity, max_conf, det_count, base_msg, dt)
-
-    with app_state.detection_lock:
-        app_state.detection_status["alert"] = alert_txt
-
-    severity_tracker.dets.clear()
-
-def detection_frame_generator():
-    global cap
-    cap = cv2.VideoCapture(DEFAULT_VIDEO_SOURCE)
-    if not cap.isOpened():
-        logging.error("Error: Cannot access video source.")
+    cascade = stream.cascade
+    clip.add_done_callback(lambda f: _dispatch_alert(f, cascade, incident, fn, args))
+    events.publish("alert", stream.id, {"severity": severity, "message": alert_txt,
+                                        "incident_id": incident.id, "call": make_call})
+
+    stream.reset_severity()
+    return alert_txt
+
+def _encode_stage(stream: StreamState, hub: FrameHub, stop: Event):
+    while not stop.is_set():
+        try:
+            frame = stream.encode_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if frame is None:
+            return
+        for profile, part in encode_preview(frame, hub.due_profiles(time.monotonic())):
+            hub.publish(part, profile)
+
+def _handle_frame(stream: StreamState, frame, tracks: list[dict], inferred: bool,
+                  media_t: float, now: float, sev_info: dict) -> dict:
+    """
+    Severity, alerts and status for one processed frame. Severity only
+    changes with new detections, so frames whose boxes were propagated by
+    the tracker keep `sev_info`; returns the verdict in force.
+    """
+    if inferred:
+        stream.tracker.add_tracks(tracks, media_t)
+        if tracks:
+            stream.recent_hits.append(hit_rois(frame, [t["box"] for t in tracks]))
+        sev_info = stream.tracker.severity(media_t)
+        if sev_info["level"] != "NONE" and now - stream.cascade_started >= CASCADE_INTERVAL:
+            stream.cascade_started = now
+            stream.cascade = cascade_worker.submit(list(stream.recent_hits))
+
+    overlay = (
+        f"Severity: {sev_info['level']} | "
+        f"Confidence: {sev_info['max_confidence']:.2f} | "
+        f"Detections: {sev_info['count']} | "
+        f"Last Update: {time.strftime('%H:%M:%S')}"
+    )
+    #cv2.putText(frame, overlay, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+    level = sev_info["level"]
+    tel_ok = (now - stream.last_telegram_alert_time) >= app_state.settings["telegram_alert_interval"]
+    call_ok = level == "HIGH" and (now - stream.last_emergency_call_time) >= app_state.settings["emergency_call_interval"]
+
+    alert_txt = ""
+    if inferred and level in ("HIGH", "MILD") and (tel_ok or call_ok):
+        if tel_ok:
+            stream.last_telegram_alert_time = now
+        if call_ok:
+            stream.last_emergency_call_time = now
+
+        alert_txt = process_alert(stream, level, sev_info["max_confidence"], sev_info["count"], now, call_ok)
+    update_detection_status(stream, level, sev_info["max_confidence"], sev_info["count"], alert_txt)
+    return sev_info
+
+NO_SEVERITY = {"level": "NONE", "count": 0, "max_confidence": 0.0}
+
+def detection_loop(stream: StreamState, hub: FrameHub, stop: Event):
+    """
+    Producer for one source: decode and infer once, publish to every subscriber.
+    Capture and encode run on their own threads; this thread is the inference stage.
+    With worker processes enabled, capture and inference move to a worker
+    (see _remote_loop).
+    """
+    if workers.enabled:
+        return _remote_loop(stream, hub, stop)
+    cap = stream.capture
+    if not cap.open(stop):
+        logging.error("Error: Cannot access video source %s.", stream.source)
         return
 
-    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
-    frame_buffer = deque(maxlen=fps * (BUFFER_SECONDS * 2))
-
-    while cap.isOpened():
-        ok, frame = cap.read()
-        if not ok:
-            logging.error("Error: Cannot read frame.")
+    stream.fps = cap.fps
+    stream.reset_severity()     # relógio de mídia recomeça a cada abertura
+    stream.objects.reset()
+    stream.frame_buffer = FrameRing(stream.fps * (BUFFER_SECONDS * 2), stream.buffer_mode)
+    stream.infer_queue = StageQueue("infer", maxsize=stream.fps if stream.policy.block else 1)
+    stream.encode_queue = StageQueue("encode", maxsize=2)
+    if stream.clip_mode == "segments":
+        stream.recorder = SegmentRecorder(stream.id, app_state.settings["video_save_path"], stream.fps)
+
+    stages = [
+        Thread(target=capture_stage, args=(stream, cap, stop), name=f"capture:{stream.id}", daemon=True),
+        Thread(target=_encode_stage, args=(stream, hub, stop), name=f"encode:{stream.id}", daemon=True),
+    ]
+    for t in stages:
+        t.start()
+
+    sev_info = NO_SEVERITY
+    frame_idx = 0
+    while not stop.is_set():
+        try:
+            item = stream.infer_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if item is None:
             break
-
-        frame_buffer.append(frame.copy())
+        frame, captured_at, media_t = item
         now = time.time()
 
-        results = run_all_models(frame)
-        for det in results.get("model1", []):
-            severity_tracker.add(det["confidence"])
-
-        sev_info = severity_tracker.severity()
-        update_detection_status(sev_info["level"], sev_info["max_confidence"], sev_info["count"])
-
-        for det in results.get("model1", []):
-            x1, y1, x2, y2 = det["box"]
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-
-        overlay = (
-            f"Severity: {sev_info['level']} | "
-            f"Confidence: {sev_info['max_confidence']:.2f} | "
-            f"Detections: {sev_info['count']} | "
-            f"Last Update: {time.strftime('%H:%M:%S')}"
-        )
-        #cv2.putText(frame, overlay, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-        level = sev_info["level"]
-        tel_ok = (now - app_state.last_telegram_alert_time) >= app_state.settings["telegram_alert_interval"]
-        call_ok = level == "HIGH" and (now - app_state.last_emergency_call_time) >= app_state.settings["emergency_call_interval"]
-
-        if level in ("HIGH", "MILD") and (tel_ok or call_ok):
-            if tel_ok:
-                app_state.last_telegram_alert_time = now
-            if call_ok:
-                app_state.last_emergency_call_time = now
-
-            process_alert(level, frame_buffer, sev_info["max_confidence"], sev_info["count"], results, now, call_ok)
-        else:
-            with app_state.detection_lock:
-                app_state.detection_status["alert"] = ""
-
-        ret, buf = cv2.imencode(".jpg", frame)
-        if ret:
-            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n")
-
+        # MODEL1 a cada `infer_every` frames; nos demais o tracker propaga as caixas
+        tracks, inferred = track_frame(stream, frame, media_t, now, frame_idx)
+        frame_idx += 1
+        stream.latency_ms = (time.monotonic() - captured_at) * 1000
+        sev_info = _handle_frame(stream, frame, tracks, inferred, media_t, now, sev_info)
+        if hub.client_count:  # ninguém assistindo: detecção segue, encode não
+            stream.encode_queue.put(draw_tracks(frame, tracks))
+
+    stop.set()
+    stream.encode_queue.put(None)
+    for t in stages:
+        t.join()
+    if stream.recorder is not None:
+        stream.recorder.close()
+        stream.recorder = None
     cap.release()
 
+def _remote_loop(stream: StreamState, hub: FrameHub, stop: Event):
+    """
+    Worker mode: a worker process decodes, infers, tracks and encodes the
+    preview, and writes each frame with its tracks to shared memory. This
+    thread copies them out and only decides (severity, cascade, alerts,
+    status), tells the worker which preview profiles have viewers and
+    publishes the parts it sends back.
+    """
+    feed = workers.attach(stream, app_state.settings["video_save_path"])
+    sev_info = NO_SEVERITY
+    profiles = ()
+    try:
+        while not stop.is_set():
+            current = hub.profiles()
+            if current != profiles:
+                profiles = current
+                workers.set_preview(stream.id, profiles)
+            msg = feed.get(timeout=0.5)
+            if msg is None:
+                continue
+            if msg[0] == "eof":
+                break
+            if msg[0] == "open":    # 1ª abertura ou worker reiniciado: novo relógio de mídia
+                stream.fps = msg[1]
+                stream.reset_severity()
+                sev_info = NO_SEVERITY
+                continue
+            if msg[0] == "preview":
+                for profile, part in msg[1]:
+                    hub.publish(part, profile)
+                continue
+            _, frame, tracks, media_t, captured_at, inferred = msg
+            stream.latency_ms = (time.monotonic() - captured_at) * 1000
+            sev_info = _handle_frame(stream, frame, tracks, inferred, media_t, time.time(), sev_info)
+    finally:
+        workers.detach(stream.id)
+        stop.set()
+
+streams = StreamRegistry(detection_loop)
+streams.add(DEFAULT_STREAM_ID, DEFAULT_VIDEO_SOURCE, start=False, motion=MotionGate())
+
+# ---------------------- MÉTRICAS (lidas no scrape) -----------------------
+LEVEL_VALUE = {"NONE": 0, "MILD": 1, "HIGH": 2}
+
+def _per_stream(fn):
+    return lambda: [({"stream": s.id}, fn(s)) for s in streams.list()]
+
+def _frames_dropped():
+    for s in streams.list():
+        yield {"stream": s.id, "stage": "infer"}, s.worker_stats["infer"]["dropped"] if s.worker_stats else s.infer_queue.dropped
+        yield {"stream": s.id, "stage": "encode"}, s.worker_stats["encode"]["dropped"] if s.worker_stats else s.encode_queue.dropped
+        yield {"stream": s.id, "stage": "preview"}, s.pipeline.hub.dropped if s.pipeline else 0
+        yield {"stream": s.id, "stage": "recorder"}, s.recorder.dropped if s.recorder else 0
+
+def _stage_depth():
+    for s in streams.list():
+        yield {"stream": s.id, "queue": "infer"}, (s.worker_stats["infer"] if s.worker_stats else s.infer_queue.stats())["depth"]
+        yield {"stream": s.id, "queue": "encode"}, (s.worker_stats["encode"] if s.worker_stats else s.encode_queue.stats())["depth"]
+
+def _alert_channels(key: str):
+    return lambda: [({"channel": name}, ch[key]) for name, ch in dispatcher.stats()["channels"].items()]
+
+REGISTRY.register_histograms("skynet_scheduler_batch_size", "Frames per MODEL1 batch.",
+                             lambda: [({}, scheduler.batch_size_hist)] + workers.scheduler_histograms("batch_size"))
+REGISTRY.register_histograms("skynet_scheduler_wait_ms", "Wait of the oldest frame before its batch ran (ms).",
+                             lambda: [({}, scheduler.wait_ms_hist)] + workers.scheduler_histograms("wait_ms"))
+REGISTRY.collector("skynet_stream_running", "gauge", "1 while the stream pipeline is alive.",
+                   _per_stream(lambda s: s.running))
+REGISTRY.collector("skynet_stream_clients", "gauge", "Active /video_feed clients.",
+                   _per_stream(lambda s: s.pipeline.hub.client_count if s.pipeline else 0))
+REGISTRY.collector("skynet_stream_severity", "gauge", "Current severity (0 NONE, 1 MILD, 2 HIGH).",
+                   _per_stream(lambda s: LEVEL_VALUE.get(s.status["level"], 0)))
+REGISTRY.collector("skynet_stream_latency_seconds", "gauge", "Capture to end of inference, last frame.",
+                   _per_stream(lambda s: s.latency_ms / 1000))
+REGISTRY.collector("skynet_buffer_frames", "gauge", "Frames held in the pre-event buffer.",
+                   _per_stream(lambda s: s.worker_stats["buffer"]["frames"] if s.worker_stats else len(s.frame_buffer)))
+REGISTRY.collector("skynet_buffer_bytes", "gauge", "Memory held by the pre-event buffer.",
+                   _per_stream(lambda s: s.worker_stats["buffer"]["bytes"] if s.worker_stats else s.frame_buffer.nbytes()))
+REGISTRY.collector("skynet_stage_queue_depth", "gauge", "Items waiting between pipeline stages.", _stage_depth)
+REGISTRY.collector("skynet_frames_captured_total", "counter", "Frames decoded.",
+                   _per_stream(lambda s: s.frames_captured))
+REGISTRY.collector("skynet_frames_dropped_total", "counter", "Frames dropped because a stage fell behind.",
+                   _frames_dropped)
+REGISTRY.collector("skynet_frames_propagated_total", "counter", "Frames whose boxes came from the tracker, not MODEL1.",
+                   _per_stream(lambda s: s.frames_propagated))
+REGISTRY.collector("skynet_tracks_active", "gauge", "Confirmed object tracks.",
+                   _per_stream(lambda s: s.objects.stats()["active"]))
+REGISTRY.collector("skynet_capture_reconnects_total", "counter", "Reconnections of live sources.",
+                   _per_stream(lambda s: s.worker_stats["capture"]["reconnects"] if s.worker_stats else s.capture.reconnects))
+REGISTRY.collector("skynet_scheduler_queue_length", "gauge", "Frames waiting for a MODEL1 batch.",
+                   lambda: [({}, scheduler.stats()["queued"])] + [
+                       ({"worker": str(w["index"])}, w["scheduler"]["queued"])
+                       for w in workers.stats()["workers"] if w["scheduler"]])
+REGISTRY.collector("skynet_alert_queue_length", "gauge", "Alerts waiting for delivery.", _alert_channels("queued"))
+REGISTRY.collector("skynet_alerts_sent_total", "counter", "Alerts delivered.", _alert_channels("sent"))
+REGISTRY.collector("skynet_alerts_dead_total", "counter", "Alerts that exhausted their retries.",
+                   _alert_channels("dead"))
+def _worker_stat(key: str):
+    return lambda: [({"worker": str(w["index"])}, w[key]) for w in workers.stats()["workers"]]
+
+def _feed_stat(key: str):
+    return lambda: [({"stream": sid}, f[key]) for sid, f in workers.stats()["feeds"].items()]
+
+REGISTRY.collector("skynet_worker_up", "gauge", "1 while the worker process is alive.", _worker_stat("alive"))
+REGISTRY.collector("skynet_worker_restarts_total", "counter", "Worker processes respawned after a crash.",
+                   _worker_stat("restarts"))
+REGISTRY.collector("skynet_shm_frames_skipped_total", "counter",
+                   "Frames a worker overwrote in shared memory before the server read them.", _feed_stat("skipped"))
+REGISTRY.collector("skynet_worker_feed_dropped_total", "counter",
+                   "Frame/preview notices dropped because the server fell behind.", _feed_stat("dropped"))
+REGISTRY.collector("skynet_event_clients", "gauge", "Connected WebSocket/SSE event clients.",
+                   lambda: [({}, events.client_count)])
+REGISTRY.collector("skynet_clip_writer_pending", "gauge", "Clips waiting to be written.",
+                   lambda: [({}, clip_writer.stats()["pending"])])
+REGISTRY.collector("skynet_incident_store_pending", "gauge", "Incident writes waiting for the DB.",
+                   lambda: [({}, incident_store.stats()["pending"])])
+REGISTRY.collector("skynet_model_loaded", "gauge", "1 while the model is resident.",
+                   lambda: [({"model": m["name"]}, m["state"] == "ready") for m in models.status()])
+REGISTRY.collector("skynet_model_memory_bytes", "gauge", "Approximate memory of each resident model.",
+                   lambda: [({"model": m["name"]}, m["memory_mb"] * 2**20) for m in models.status()])
+
+def _get_stream(stream_id: str) -> StreamState:
+    try:
+        return streams.get(stream_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown stream: {stream_id}")
+
+@app.on_event("startup")
+def _warmup():
+    warmup_models(() if workers.enabled else ("model1",))    # com workers, o MODEL1 vive neles
+    dispatcher.start()      # reenvia alertas que ficaram no outbox
+    retention.start()
+
+@app.on_event("shutdown")
+def _shutdown():
+    dispatcher.stop()
+    if workers.enabled:
+        streams.stop_all()
+        workers.stop()
+
 # ---------------------- API ENDPOINTS -----------------------
 @app.get("/status_view")
-async def status_view():
-    with app_state.detection_lock:
-        return app_state.detection_status.copy()
+async def status_view(stream_id: str = DEFAULT_STREAM_ID):
+    return _get_stream(stream_id).status_view()
 
 @app.get("/video_feed")
-def video_feed():
-    return StreamingResponse(detection_frame_generator(), media_type="multipart/x-mixed-replace; boundary=frame")
+def video_feed(stream_id: str = DEFAULT_STREAM_ID, width: int = 0,
+               quality: int = DEFAULT_QUALITY, fps: float = 0.0):
+    _get_stream(stream_id)
+    hub = streams.ensure_running(stream_id).pipeline.hub
+    profile = PreviewProfile.clamp(width, quality, fps)
+    return StreamingResponse(hub.stream(profile), media_type="multipart/x-mixed-replace; boundary=frame")
+
+def _event_types(types: Optional[str]) -> Optional[list[str]]:
+    return [t.strip() for t in types.split(",") if t.strip()] if types else None
+
+@app.websocket("/ws/events")
+async def events_ws(websocket: WebSocket, stream_id: Optional[str] = None, types: Optional[str] = None,
+                    interval: float = EVENT_INTERVAL):
+    """Pushes status (coalesced every `interval` s), severity changes, alerts and incidents."""
+    await websocket.accept()
+    sub = events.subscribe(interval, _event_types(types), stream_id)
+    try:
+        async for event in sub.events():
+            await websocket.send_json(event if event is not None else {"type": "ping", "ts": time.time()})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        events.unsubscribe(sub)
+
+@app.get("/events")
+async def events_sse(stream_id: Optional[str] = None, types: Optional[str] = None,
+                     interval: float = EVENT_INTERVAL):
+    """Same events as /ws/events, as Server-Sent Events."""
+    sub = events.subscribe(interval, _event_types(types), stream_id)
+
+    async def _stream():
+        try:
+            async for event in sub.events():
+                if event is None:
+                    yield ": ping\n\n"
+                else:
+                    yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(sub)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _scheduler_stats() -> dict:
+    """In worker mode MODEL1 runs in the workers: their schedulers' stats, by worker index."""
+    if not workers.enabled:
+        return scheduler.stats()
+    return {str(w["index"]): w["scheduler"] for w in workers.stats()["workers"]}
+
+@app.get("/streams")
+def list_streams():
+    return {
+        "streams": [s.info() for s in streams.list()],
+        "scheduler": _scheduler_stats(),
+        "clip_writer": clip_writer.stats(),
+        "cascade": cascade_worker.stats(),
+        "dispatch": dispatcher.stats(),
+        "incident_store": incident_store.stats(),
+        "events": events.stats(),
+        "workers": workers.stats() if workers.enabled else None,
+    }
+
+@app.post("/streams")
+def add_stream(
+    stream_id: str = Form(...),
+    source: str = Form(...),
+    frame_policy: str = Form("latest"),
+    every_n: int = Form(1),
+    clip_mode: str = Form("buffer"),
+    buffer_mode: str = Form("raw"),
+    motion_gate: bool = Form(True),
+    motion_roi: bool = Form(False),
+    capture_backend: str = Form(CAPTURE_BACKEND),
+    decode_threads: int = Form(DECODE_THREADS),
+    downscale: bool = Form(False),
+    keyframes_only: bool = Form(False),
+    infer_every: int = Form(INFER_EVERY),
+):
+    try:
+        policy = FramePolicy(frame_policy, every_n)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if infer_every < 1:
+        return JSONResponse({"error": "infer_every must be >= 1"}, status_code=400)
+    if clip_mode not in CLIP_MODES:
+        return JSONResponse({"error": f"clip_mode must be one of {CLIP_MODES}"}, status_code=400)
+    if buffer_mode not in BUFFER_MODES:
+        return JSONResponse({"error": f"buffer_mode must be one of {BUFFER_MODES}"}, status_code=400)
+    if capture_backend not in CAPTURE_BACKENDS:
+        return JSONResponse({"error": f"capture_backend must be one of {CAPTURE_BACKENDS}"}, status_code=400)
+    capture = make_capture(
+        source, capture_backend, max_side=INFER_SIZE if downscale else 0,
+        keyframes_only=keyframes_only, threads=decode_threads,
+    )
+    try:
+        stream = streams.add(
+            stream_id, source, policy=policy, clip_mode=clip_mode, buffer_mode=buffer_mode,
+            motion=MotionGate(roi=motion_roi) if motion_gate else None, capture=capture,
+            infer_every=infer_every,
+        )
+    except KeyError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    return {"success": True, "stream": stream.info()}
+
+@app.delete("/streams/{stream_id}")
+def remove_stream(stream_id: str):
+    _get_stream(stream_id)
+    streams.remove(stream_id)
+    events.forget(stream_id)
+    return {"success": True}
+
+def _incident_view(incident: Incident) -> dict:
+    return {**incident.to_dict(), "clip_url": f"/incidents/{incident.id}/clip" if incident.clip else None}
 
 @app.get("/incidents")
-def get_incidents():
-    with app_state.incident_lock:
-        return {"incidents": app_state.incident_history}
+def get_incidents(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    severity: Optional[str] = None,
+    camera: Optional[str] = None,
+):
+    """Newest first; pass `next_cursor` back as `cursor` for the next page. Times are epoch seconds."""
+    try:
+        page, next_cursor = incident_store.query(limit, cursor, since, until, severity, camera)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "incidents": [_incident_view(i) for i in page],
+        "next_cursor": next_cursor,
+        "counts": incident_store.counts(since, until, camera),
+    }
+
+@app.get("/incidents/{incident_id}/clip")
+def get_incident_clip(incident_id: str):
+    incident = incident_store.get(incident_id)
+    path = retention.resolve(incident.clip) if incident is not None and incident.clip else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    root = os.path.realpath(retention.root)
+    path = os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    return FileResponse(path, media_type="image/jpeg" if path.endswith(".jpg") else "video/mp4")
+
+@app.get("/storage")
+def storage_stats():
+    return retention.stats()
+
+@app.post("/batch")
+def start_batch(
+    paths: str = Form(...),
+    out_dir: str = Form(BATCH_OUTPUT_DIR),
+    format: str = Form("jsonl"),
+    workers: int = Form(BATCH_WORKERS),
+    capture_backend: str = Form(CAPTURE_BACKEND),
+    keyframes_only: bool = Form(False),
+    force: bool = Form(False),
+    infer_every: int = Form(INFER_EVERY),
+):
+    """Offline analysis of recorded files/directories (comma-separated `paths`)."""
+    sources = [p.strip() for p in paths.split(",") if p.strip()]
+    missing = [p for p in sources if not os.path.exists(p)]
+    if not sources or missing:
+        return JSONResponse({"error": f"Paths not found: {missing or paths}"}, status_code=400)
+    try:
+        job = BatchJob(sources, out_dir, format, workers, capture_backend, keyframes_only, force, infer_every)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    job_id = f"{int(time.time())}-{len(batch_jobs)}"
+    batch_jobs[job_id] = job
+    job.start()
+    return {"success": True, "job_id": job_id}
+
+@app.get("/batch")
+def list_batch_jobs():
+    return {"jobs": {job_id: job.stats() for job_id, job in batch_jobs.items()}}
+
+@app.get("/batch/{job_id}")
+def get_batch_job(job_id: str):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    return job.stats()
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/profile")
+def start_profile(
+    seconds: float = Form(30),
+    interval_ms: float = Form(PROFILE_INTERVAL_MS),
+    include_idle: bool = Form(False),
+):
+    """Samples every thread's stack for `seconds`; the folded output is fetched from /profile/{name}."""
+    try:
+        name = profiler.start(seconds, interval_ms, include_idle)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except RuntimeError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    return {"success": True, "file": name, "url": f"/profile/{name}"}
+
+@app.delete("/profile")
+def stop_profile():
+    profiler.stop()
+    return profiler.stats()
+
+@app.get("/profile")
+def profile_status():
+    return profiler.stats()
+
+@app.get("/profile/{name}")
+def get_profile(name: str):
+    path = profiler.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+@app.get("/models")
+def list_models():
+    return {"models": models.status()}
 
 @app.get("/settings")
 def get_settings():
@@ -202,14 +636,24 @@ async def update_settings(
     telegram_alert_interval: int = Form(...),
     emergency_call_interval: int = Form(...),
     video_save_path: str = Form(...),
+    batch_size: Optional[int] = Form(None),
+    batch_wait_ms: Optional[float] = Form(None),
 ):
     if telegram_alert_interval < 1 or emergency_call_interval < 1:
         return JSONResponse({"error": "Interval must be >= 1"}, status_code=400)
+    try:
+        scheduler.configure(batch_size, batch_wait_ms)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
+    if video_save_path != app_state.settings["video_save_path"]:
+        retention.move_root(video_save_path)     # clipes existentes vão junto
     app_state.settings.update({
         "telegram_alert_interval": telegram_alert_interval,
         "emergency_call_interval": emergency_call_interval,
         "video_save_path": video_save_path,
+        "batch_size": scheduler.max_batch,
+        "batch_wait_ms": scheduler.max_wait_ms,
     })
     os.makedirs(video_save_path, exist_ok=True)
     return {"success": True, "settings": app_state.settings}
@@ -0,0 +1,173 @@
+# tests/test_dispatch.py
+
+import os
+import time
+import asyncio
+import threading
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import app.dispatch as dispatch
+import app.telegram_alert as telegram_alert
+from app.dispatch import AlertDispatcher, RateLimiter, parse_retry_after
+from app.incident import Incident
+
+class MockProvider:
+    """aiohttp test server on its own loop; answers each request from a script, 200 when it runs out."""
+
+    def __init__(self):
+        self.script: list = []       # (status, body, headers)
+        self.hits: list = []         # (t, path)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        app = web.Application()
+        app.router.add_route("POST", "/{tail:.*}", self._handle)
+        self.server = TestServer(app)
+        self._run(self.server.start_server())
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(10)
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url("")).rstrip("/")
+
+    async def _handle(self, request):
+        await request.read()
+        self.hits.append((time.monotonic(), request.path))
+        status, body, headers = self.script.pop(0) if self.script else (200, {"ok": True}, {})
+        return web.json_response(body, status=status, headers=headers)
+
+    def close(self):
+        self._run(self.server.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+@pytest.fixture
+def provider(monkeypatch):
+    mock = MockProvider()
+    monkeypatch.setattr(telegram_alert, "TELEGRAM_API_URL", mock.url)
+    monkeypatch.setattr(dispatch, "MILLIS_API_URL", mock.url + "/call")
+    monkeypatch.setattr(dispatch, "BACKOFF_BASE", 0.1)
+    yield mock
+    mock.close()
+
+def make_dispatcher(outbox) -> AlertDispatcher:
+    d = AlertDispatcher(outbox_dir=str(outbox))
+    for ch in d.channels.values():
+        ch.limiter = RateLimiter(1000, 100)
+    return d
+
+def payload() -> dict:
+    return Incident("cam1", "HIGH", 0.9, 3).to_dict()
+
+def wait_for(cond, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+def pending(outbox, dead: bool = False) -> list:
+    path = os.path.join(outbox, "dead") if dead else str(outbox)
+    return [n for n in os.listdir(path) if n.endswith(".json")]
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(2) == 2.0
+    assert parse_retry_after("-5") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("inf") is None
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= parse_retry_after(future) <= 30
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+@pytest.mark.parametrize("headers, body", [
+    ({"Retry-After": "0.3"}, {"ok": False}),
+    ({}, {"ok": False, "parameters": {"retry_after": 0.3}}),
+])
+def test_429_waits_retry_after(provider, monkeypatch, tmp_path, headers, body):
+    # backoff longo: só o Retry-After explica a nova tentativa rápida
+    monkeypatch.setattr(dispatch, "BACKOFF_BASE", 30.0)
+    provider.script = [(429, body, headers)]
+    d = make_dispatcher(tmp_path)
+    try:
+        d.submit("telegram", "HIGH", payload())
+        ch = d.channels["telegram"]
+        assert wait_for(lambda: ch.sent == 1)
+        assert ch.retries == 1 and ch.dead == 0
+        (t0, _), (t1, path) = provider.hits
+        assert t1 - t0 >= 0.25
+        assert path.endswith("/sendMessage")
+        assert pending(tmp_path) == []
+    finally:
+        d.stop()
+
+def test_429_http_date(provider, monkeypatch, tmp_path):
+    monkeypatch.setattr(dispatch, "BACKOFF_BASE", 30.0)
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=2), usegmt=True)
+    provider.script = [(429, {"ok": False}, {"Retry-After": when})]
+    d = make_dispatcher(tmp_path)
+    try:
+        d.submit("telegram", "HIGH", payload())
+        assert wait_for(lambda: d.channels["telegram"].sent == 1)
+        assert len(provider.hits) == 2
+    finally:
+        d.stop()
+
+def test_5xx_retries_with_backoff(provider, tmp_path):
+    provider.script = [(500, {}, {}), (503, {}, {})]
+    d = make_dispatcher(tmp_path)
+    try:
+        d.submit("call", "HIGH", payload())
+        ch = d.channels["call"]
+        assert wait_for(lambda: ch.sent == 1)
+        assert ch.retries == 2 and ch.dead == 0
+        t = [hit[0] for hit in provider.hits]
+        assert len(t) == 3
+        # BACKOFF_BASE = 0.1: 0.1 s e depois 0.2 s
+        assert t[1] - t[0] >= 0.09
+        assert t[2] - t[1] >= 0.19
+        assert pending(tmp_path) == []
+    finally:
+        d.stop()
+
+def test_4xx_goes_dead(provider, tmp_path):
+    provider.script = [(400, {"ok": False, "description": "chat not found"}, {})]
+    d = make_dispatcher(tmp_path)
+    try:
+        job_id = d.submit("telegram", "MILD", payload())
+        ch = d.channels["telegram"]
+        assert wait_for(lambda: ch.dead == 1)
+        time.sleep(0.3)
+        assert len(provider.hits) == 1
+        assert ch.sent == 0 and ch.retries == 0
+        assert pending(tmp_path) == []
+        assert pending(tmp_path, dead=True) == [f"{job_id}.json"]
+    finally:
+        d.stop()
+
+def test_outbox_replayed_on_restart(provider, monkeypatch, tmp_path):
+    monkeypatch.setattr(dispatch, "BACKOFF_BASE", 30.0)
+    provider.script = [(502, {}, {})]
+    first = make_dispatcher(tmp_path)
+    job_id = first.submit("telegram", "HIGH", payload())
+    assert wait_for(lambda: first.channels["telegram"].retries == 1)
+    first.stop()
+    assert pending(tmp_path) == [f"{job_id}.json"]
+
+    second = make_dispatcher(tmp_path)
+    try:
+        second.start()
+        assert wait_for(lambda: second.channels["telegram"].sent == 1)
+        assert len(provider.hits) == 2
+        assert pending(tmp_path) == []
+    finally:
+        second.stop()
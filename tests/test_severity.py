@@ -0,0 +1,39 @@
+# tests/test_severity.py
+
+import numpy as np
+
+from app.severity import LEVELS, SeverityBank, SeverityTracker
+
+def test_bank_matches_tracker_at_high_fps():
+    """120 fps x 5 s needs 600 frames per window: more than the initial ring."""
+    streams, fps, window, n = 4, 120, 5.0, 2400
+    rng = np.random.default_rng(0)
+    bank = SeverityBank(streams, window, capacity=64)
+    trackers = [SeverityTracker(window) for _ in range(streams)]
+
+    for i in range(n):
+        t = np.full(streams, i / fps)
+        # rajadas: alguns frames sem detecção, outros com várias
+        counts = rng.integers(0, 4, streams) * (rng.random(streams) < 0.3)
+        confs = [rng.uniform(0.3, 0.95, c) for c in counts]
+        peaks = np.array([c.max() if len(c) else 0.0 for c in confs])
+        active = rng.random(streams) < 0.9
+
+        out = bank.update(t, counts, peaks, active)
+        for s, tracker in enumerate(trackers):
+            if active[s]:
+                tracker.add_frame(confs[s].tolist(), t[s])
+            expected = tracker.severity(t[s])
+            assert LEVELS[out["level"][s]] == expected["level"], (i, s)
+            assert out["count"][s] == expected["count"], (i, s)
+            assert out["max_confidence"][s] == expected["max_confidence"], (i, s)
+
+    assert bank.capacity >= window * fps
+
+def test_bank_grow_keeps_window_order():
+    bank = SeverityBank(2, window_sec=10.0, capacity=4)
+    for i in range(9):
+        bank.update(np.full(2, float(i)), np.ones(2, dtype=int), np.full(2, 0.5))
+    assert bank.capacity == 16
+    out = bank.update(np.full(2, 9.0), np.ones(2, dtype=int), np.full(2, 0.5))
+    assert out["count"].tolist() == [10, 10]